@@ -1,19 +1,69 @@
-from flask import Flask, request, render_template, redirect, session, jsonify
+import os
+
+# Server mode. The default 'threading' mode holds one OS thread per request
+# and socket, so every slow upstream call pins a thread. Setting
+# SOCKETIO_ASYNC_MODE=gevent (or eventlet) runs requests and sockets as green
+# threads instead, and monkey patching makes requests, urllib3 and PyMySQL
+# I/O cooperative. Patching must happen before anything imports socket, ssl
+# or threading, hence this block comes first.
+ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+from flask import Flask, request, render_template, redirect, session, jsonify, url_for, g, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO, emit,join_room,leave_room,send
+from socketio import PubSubManager
 from flask_migrate import Migrate
+import click
+import secrets
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import func, or_, and_, case, event, text, bindparam, inspect as sa_inspect
+from sqlalchemy.exc import DataError, IntegrityError
+from markupsafe import escape
 import uuid
+import platform
+import base64
+import hashlib
+import sys
 import bcrypt
 import requests
+import requests.adapters
+import urllib3
 
 # Disable transformers for now to avoid loading issues - using basic sentiment analysis instead
 pipeline = None
 
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, OrderedDict, deque
+from functools import lru_cache
 import random
-import os
-import ollama
+import re
+import math
+import json
+import io
+import csv
+import sqlite3
+import gzip
+import bz2
+from xml.etree import ElementTree
+import bisect
+import threading
+import atexit
+import signal
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import numpy as np
+import password_worker
 
 
 
@@ -23,11 +73,21 @@ YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 # Note: Using requests library directly instead of google-api-python-client for better firewall compatibility
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 # MySQL Database Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'mysql+pymysql://root@localhost:3306/mindcare_db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Green-thread servers run many more concurrent requests than OS threads, so
+# the connection pool is sized from the environment
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_pre_ping': True
+    }
 app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+# Batch sentiment analysis limits
+app.config['ANALYSIS_BATCH_MAX_TEXTS'] = int(os.getenv('ANALYSIS_BATCH_MAX_TEXTS', 5000))
+app.config['ANALYSIS_BATCH_MAX_TOKENS'] = int(os.getenv('ANALYSIS_BATCH_MAX_TOKENS', 200000))
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)  # Add this line
@@ -36,7 +96,724 @@ migrate = Migrate(app, db)  # Add this line
 # === end init ===
 
 #websocket connection
-active_users = defaultdict(dict)  # {room_id: {sid: username}}
+# Chat fan-out. A single worker keeps rooms and presence in process memory.
+# To run several workers or nodes, point SOCKETIO_MESSAGE_QUEUE at a broker
+# (redis://, amqp://, kafka://) so room emits reach clients on every worker,
+# and presence moves to Redis as well. sqlite:///path is a stand-in for one
+# host (local multi-worker runs and tests) that needs no extra service.
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+CHAT_PRESENCE_URL = os.getenv('CHAT_PRESENCE_URL', SOCKETIO_MESSAGE_QUEUE or 'memory://')
+# Shared presence entries belong to the worker that added them. A worker that
+# hasn't sent a heartbeat for CHAT_PRESENCE_TTL seconds is taken for dead and
+# its entries are removed. A worker restarted under the same CHAT_WORKER_ID
+# clears its previous entries straight away.
+CHAT_WORKER_ID = os.getenv('CHAT_WORKER_ID', f'{platform.node()}:{os.getpid()}')
+CHAT_PRESENCE_TTL = float(os.getenv('CHAT_PRESENCE_TTL', 60))
+
+
+class SQLiteQueueManager(PubSubManager):
+    """Socket.IO pub/sub backend on a shared SQLite file: publishers append
+    rows, every worker polls for rows newer than the last one it saw"""
+    name = 'sqlite'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None,
+                 poll_interval=0.05, retention=60):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('sqlite:///'):]
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.published = 0
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS socketio_queue ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+            'payload TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+        connection.commit()
+        return connection
+
+    def _publish(self, data):
+        now = time.time()
+        with self.lock:
+            if self.connection is None:
+                self.connection = self._connect()
+            self.connection.execute(
+                'INSERT INTO socketio_queue (channel, payload, created_at) VALUES (?, ?, ?)',
+                (self.channel, json.dumps(data), now)
+            )
+            self.published += 1
+            if self.published % 500 == 0:
+                self.connection.execute('DELETE FROM socketio_queue WHERE created_at < ?', (now - self.retention,))
+            self.connection.commit()
+
+    def _listen(self):
+        connection = self._connect()
+        # AUTOINCREMENT ids are never reused, so "newer than last seen" is exact
+        last_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_queue').fetchone()[0]
+        while True:
+            rows = connection.execute(
+                'SELECT id, payload FROM socketio_queue WHERE id > ? AND channel = ? ORDER BY id',
+                (last_id, self.channel)
+            ).fetchall()
+            for last_id, payload in rows:
+                yield payload
+            if not rows:
+                self.server.sleep(self.poll_interval)
+
+
+class MemoryPresence:
+    """Who is in which chat room, for a single worker. The reverse sid -> rooms
+    index lets a disconnect touch only the rooms that socket joined, rather
+    than every live room (one per /join_room call)."""
+    def __init__(self):
+        self.rooms = defaultdict(dict)  # {room_id: {sid: username}}
+        self.sid_rooms = defaultdict(set)  # {sid: {room_id}}
+        self.lock = threading.Lock()
+
+    def join(self, room, sid, username):
+        """Add sid to room and return the room's new user count"""
+        with self.lock:
+            users = self.rooms[room]
+            users[sid] = username
+            self.sid_rooms[sid].add(room)
+            return len(users)
+
+    def username(self, room, sid, default='Anonymous'):
+        users = self.rooms.get(room)
+        return users.get(sid, default) if users else default
+
+    def count(self, room):
+        return len(self.rooms.get(room, ()))
+
+    def leave_all(self, sid):
+        """Remove sid everywhere; returns [(room, username, remaining_count)]"""
+        left = []
+        with self.lock:
+            for room in self.sid_rooms.pop(sid, ()):
+                users = self.rooms[room]
+                username = users.pop(sid, None)
+                if username:
+                    left.append((room, username, len(users)))
+                if not users:
+                    del self.rooms[room]
+        return left
+
+    # Nothing outlives the process, so there is nothing to expire
+    def ensure_heartbeat(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SharedPresence:
+    """Heartbeat for presence stores shared between workers. The first join
+    registers the worker, clearing entries left by an earlier process with
+    the same worker_id, then a background task beats every ttl / 3 seconds
+    and removes the entries of workers that have stopped beating."""
+    def __init__(self, worker_id, ttl):
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.heartbeat_task = None
+        self.heartbeat_lock = threading.Lock()
+
+    def ensure_heartbeat(self):
+        if self.heartbeat_task is None:
+            with self.heartbeat_lock:
+                if self.heartbeat_task is None:
+                    self.purge(self.worker_id)
+                    self.heartbeat()
+                    self.heartbeat_task = socketio.start_background_task(self._heartbeat_loop)
+
+    def _heartbeat_loop(self):
+        while True:
+            socketio.sleep(self.ttl / 3)
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"Chat presence heartbeat error: {str(e)}")
+
+    def close(self):
+        """Remove this worker's entries, on a clean shutdown"""
+        if self.heartbeat_task is not None:
+            self.purge(self.worker_id)
+
+
+class SQLitePresence(SharedPresence):
+    """Presence shared by the workers on one host through a SQLite file"""
+    def __init__(self, path, worker_id=CHAT_WORKER_ID, ttl=CHAT_PRESENCE_TTL):
+        super().__init__(worker_id, ttl)
+        self.path = path
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(chat_presence)')]
+            if columns and 'worker' not in columns:
+                # Written before entries had an owner; nothing there is worth keeping
+                self.connection.execute('DROP TABLE chat_presence')
+                self.connection.execute('DROP TABLE IF EXISTS chat_room')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS chat_presence ('
+                'room TEXT NOT NULL, sid TEXT NOT NULL, username TEXT NOT NULL, worker TEXT NOT NULL, '
+                'PRIMARY KEY (room, sid))'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS ix_chat_presence_sid ON chat_presence (sid)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS ix_chat_presence_worker ON chat_presence (worker)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS chat_room (room TEXT PRIMARY KEY, user_count INTEGER NOT NULL)'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS chat_worker (worker TEXT PRIMARY KEY, heartbeat REAL NOT NULL)'
+            )
+            self.connection.commit()
+        return self.connection
+
+    def join(self, room, sid, username):
+        with self.lock:
+            connection = self._connect()
+            updated = connection.execute(
+                'UPDATE chat_presence SET username = ? WHERE room = ? AND sid = ?', (username, room, sid)
+            ).rowcount
+            if not updated:
+                connection.execute(
+                    'INSERT INTO chat_presence (room, sid, username, worker) VALUES (?, ?, ?, ?)',
+                    (room, sid, username, self.worker_id)
+                )
+                connection.execute(
+                    'INSERT INTO chat_room (room, user_count) VALUES (?, 1) '
+                    'ON CONFLICT (room) DO UPDATE SET user_count = user_count + 1',
+                    (room,)
+                )
+            connection.commit()
+            return self._count(connection, room)
+
+    @staticmethod
+    def _count(connection, room):
+        row = connection.execute('SELECT user_count FROM chat_room WHERE room = ?', (room,)).fetchone()
+        return row[0] if row else 0
+
+    def username(self, room, sid, default='Anonymous'):
+        with self.lock:
+            row = self._connect().execute(
+                'SELECT username FROM chat_presence WHERE room = ? AND sid = ?', (room, sid)
+            ).fetchone()
+        return row[0] if row else default
+
+    def count(self, room):
+        with self.lock:
+            return self._count(self._connect(), room)
+
+    def leave_all(self, sid):
+        left = []
+        with self.lock:
+            connection = self._connect()
+            rows = connection.execute('SELECT room, username FROM chat_presence WHERE sid = ?', (sid,)).fetchall()
+            connection.execute('DELETE FROM chat_presence WHERE sid = ?', (sid,))
+            for room, username in rows:
+                connection.execute('UPDATE chat_room SET user_count = user_count - 1 WHERE room = ?', (room,))
+                connection.execute('DELETE FROM chat_room WHERE room = ? AND user_count <= 0', (room,))
+                left.append((room, username, self._count(connection, room)))
+            connection.commit()
+        return left
+
+    def heartbeat(self):
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            connection.execute('INSERT OR REPLACE INTO chat_worker (worker, heartbeat) VALUES (?, ?)',
+                               (self.worker_id, now))
+            stale = [row[0] for row in connection.execute(
+                'SELECT worker FROM chat_worker WHERE heartbeat < ?', (now - self.ttl,)
+            )]
+            connection.commit()
+        for worker in stale:
+            print(f"Chat presence: removing entries of worker {worker}, no heartbeat for {self.ttl:.0f}s")
+            self.purge(worker)
+
+    def purge(self, worker):
+        """Remove every entry added by worker"""
+        with self.lock:
+            connection = self._connect()
+            connection.execute(
+                'UPDATE chat_room SET user_count = user_count - ('
+                'SELECT COUNT(*) FROM chat_presence WHERE chat_presence.room = chat_room.room AND worker = ?) '
+                'WHERE room IN (SELECT room FROM chat_presence WHERE worker = ?)',
+                (worker, worker)
+            )
+            connection.execute('DELETE FROM chat_room WHERE user_count <= 0')
+            connection.execute('DELETE FROM chat_presence WHERE worker = ?', (worker,))
+            connection.execute('DELETE FROM chat_worker WHERE worker = ?', (worker,))
+            connection.commit()
+
+
+class RedisPresence(SharedPresence):
+    """Presence shared across nodes: a hash of sid -> username per room, a
+    set of rooms per sid and a set of sids per worker. A worker is alive
+    while its heartbeat key, which expires after ttl, exists."""
+    def __init__(self, url, worker_id=CHAT_WORKER_ID, ttl=CHAT_PRESENCE_TTL):
+        super().__init__(worker_id, ttl)
+        import redis  # only needed when chat presence lives in Redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def join(self, room, sid, username):
+        pipe = self.redis.pipeline()
+        pipe.hset(f'chat:room:{room}', sid, username)
+        pipe.sadd(f'chat:sid:{sid}', room)
+        pipe.sadd(f'chat:worker:{self.worker_id}:sids', sid)
+        pipe.hlen(f'chat:room:{room}')
+        return pipe.execute()[-1]
+
+    def username(self, room, sid, default='Anonymous'):
+        return self.redis.hget(f'chat:room:{room}', sid) or default
+
+    def count(self, room):
+        return self.redis.hlen(f'chat:room:{room}')
+
+    def leave_all(self, sid):
+        rooms = self.redis.smembers(f'chat:sid:{sid}')
+        left = []
+        for room in rooms:
+            pipe = self.redis.pipeline()
+            pipe.hget(f'chat:room:{room}', sid)
+            pipe.hdel(f'chat:room:{room}', sid)
+            pipe.hlen(f'chat:room:{room}')
+            username, _, count = pipe.execute()
+            if username:
+                left.append((room, username, count))
+        self.redis.delete(f'chat:sid:{sid}')
+        self.redis.srem(f'chat:worker:{self.worker_id}:sids', sid)
+        return left
+
+    def heartbeat(self):
+        pipe = self.redis.pipeline()
+        pipe.set(f'chat:worker:{self.worker_id}', time.time(), ex=max(1, math.ceil(self.ttl)))
+        pipe.sadd('chat:workers', self.worker_id)
+        pipe.smembers('chat:workers')
+        workers = pipe.execute()[-1]
+        for worker in workers:
+            if worker != self.worker_id and not self.redis.exists(f'chat:worker:{worker}'):
+                print(f"Chat presence: removing entries of worker {worker}, no heartbeat for {self.ttl:.0f}s")
+                self.purge(worker)
+
+    def purge(self, worker):
+        """Remove every entry added by worker"""
+        for sid in self.redis.smembers(f'chat:worker:{worker}:sids'):
+            for room in self.redis.smembers(f'chat:sid:{sid}'):
+                self.redis.hdel(f'chat:room:{room}', sid)
+            self.redis.delete(f'chat:sid:{sid}')
+        pipe = self.redis.pipeline()
+        pipe.delete(f'chat:worker:{worker}:sids', f'chat:worker:{worker}')
+        pipe.srem('chat:workers', worker)
+        pipe.execute()
+
+
+def make_presence(url):
+    if url.startswith('memory://'):
+        return MemoryPresence()
+    if url.startswith('sqlite:///'):
+        return SQLitePresence(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisPresence(url)
+    raise ValueError(f'Unsupported CHAT_PRESENCE_URL: {url}')
+
+
+# Largest inbound Engine.IO payload; chat messages are capped well below this
+CHAT_MAX_PACKET_BYTES = int(os.getenv('CHAT_MAX_PACKET_BYTES', 64 * 1024))
+# chat_message.room and chat_message.username are String(100)
+CHAT_NAME_MAX_LENGTH = 100
+
+
+def chat_name(value, default):
+    """A client-supplied room or display name, stripped; default if missing"""
+    if not isinstance(value, str) or not value.strip():
+        return default
+    return value.strip()
+if SOCKETIO_MESSAGE_QUEUE and SOCKETIO_MESSAGE_QUEUE.startswith('sqlite:///'):
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE,
+                        max_http_buffer_size=CHAT_MAX_PACKET_BYTES,
+                        client_manager=SQLiteQueueManager(SOCKETIO_MESSAGE_QUEUE))
+else:
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE,
+                        max_http_buffer_size=CHAT_MAX_PACKET_BYTES,
+                        message_queue=SOCKETIO_MESSAGE_QUEUE)
+presence = make_presence(CHAT_PRESENCE_URL)
+atexit.register(presence.close)
+
+
+class TypingTracker:
+    """Debounced typing state per (room, sid). Keystroke events only refresh
+    an expiry; rooms whose set of typists actually changed are reported once
+    per interval as a snapshot of who is typing. Each worker reports its own
+    sockets, tagged with worker_id so clients can merge snapshots."""
+    def __init__(self, interval, ttl):
+        self.interval = interval
+        self.ttl = ttl
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.typing = defaultdict(dict)  # {room_id: {sid: (username, expires_at)}}
+        self.dirty = set()
+        self.reported = {}  # {room_id: usernames in the last snapshot sent}
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def start(self, room, sid, username):
+        with self.lock:
+            self.counters['events'] += 1
+            users = self.typing[room]
+            current = users.get(sid)
+            if current is None or current[0] != username:
+                self.dirty.add(room)
+            users[sid] = (username, time.monotonic() + self.ttl)
+
+    def stop(self, room, sid):
+        with self.lock:
+            self.counters['events'] += 1
+            users = self.typing.get(room)
+            if users and users.pop(sid, None):
+                self.dirty.add(room)
+                if not users:
+                    del self.typing[room]
+
+    def collect(self):
+        """Expire stale typists, then return [(room, usernames)] for every room
+        whose typists differ from its last snapshot"""
+        now = time.monotonic()
+        with self.lock:
+            for room, users in list(self.typing.items()):
+                expired = [sid for sid, (_, expires_at) in users.items() if expires_at <= now]
+                for sid in expired:
+                    del users[sid]
+                if expired:
+                    self.dirty.add(room)
+                if not users:
+                    del self.typing[room]
+            snapshots = []
+            for room in self.dirty:
+                users = self.typing.get(room, {})
+                usernames = sorted({username for username, _ in users.values()})
+                # A start and stop within one interval cancel out
+                if usernames == self.reported.get(room, []):
+                    continue
+                if usernames:
+                    self.reported[room] = usernames
+                else:
+                    self.reported.pop(room, None)
+                snapshots.append((room, usernames))
+            self.dirty.clear()
+            self.counters['snapshots'] += len(snapshots)
+        return snapshots
+
+    def ensure_flusher(self):
+        # Started lazily so forking servers start it in the worker, not the master
+        if self.flusher is None:
+            with self.lock:
+                if self.flusher is None:
+                    self.flusher = socketio.start_background_task(self._flush_loop)
+
+    def _flush_loop(self):
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                for room, usernames in self.collect():
+                    socketio.emit('typing_users', {
+                        'room': room, 'users': usernames, 'worker': self.worker_id
+                    }, room=room)
+            except Exception as e:
+                print(f"Typing snapshot error: {str(e)}")
+
+
+typing_tracker = TypingTracker(
+    interval=float(os.getenv('TYPING_SNAPSHOT_INTERVAL', 0.5)),
+    ttl=float(os.getenv('TYPING_TTL', 5))
+)
+
+
+class ChatHistory:
+    """Recent chat messages per room, replayed to users when they join.
+
+    Each room keeps a bounded ring buffer in memory. Messages are written to
+    the chat_message table behind the broadcast, in batches of up to
+    flush_size every flush_interval seconds, one commit per batch.
+
+    Durability: a message is broadcast before it is stored. A crash loses at
+    most the unflushed batch (flush_interval seconds, or flush_size messages)
+    from history, never from the live room. Unflushed messages are also
+    written on clean shutdown. If the database is down, pending messages are
+    retried on the next flush, up to max_pending, then the oldest are dropped.
+    A batch rejected for its content (an integrity or data error) is written
+    row by row instead, and the rows rejected again are dropped and counted,
+    so one bad row can't hold up the rest of the queue.
+    With several workers each ring only sees its own traffic, so replay reads
+    the table (plus this worker's pending messages) instead.
+    """
+    def __init__(self, capacity, max_rooms, flush_interval, flush_size, max_pending, shared=False):
+        self.capacity = capacity
+        self.max_rooms = max_rooms
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.shared = shared
+        self.rooms = OrderedDict()  # {room_id: deque of message payloads}, LRU
+        self.pending = []  # [(room_id, payload)] not yet written
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flusher = None
+
+    def add(self, room, payload):
+        with self.lock:
+            buffer = self.rooms.get(room)
+            if buffer is not None:
+                buffer.append(payload)
+                self.rooms.move_to_end(room)
+            self.pending.append((room, payload))
+            if len(self.pending) > self.max_pending:
+                dropped = len(self.pending) - self.max_pending
+                del self.pending[:dropped]
+                self.counters['dropped'] += dropped
+            flush_now = len(self.pending) >= self.flush_size
+        if flush_now:
+            background_executor.submit(self.flush)
+
+    def recent(self, room):
+        """The last `capacity` messages in room, oldest first"""
+        if self.shared:
+            return self._merge(self._load(room), room)
+        with self.lock:
+            buffer = self.rooms.get(room)
+            if buffer is not None:
+                self.rooms.move_to_end(room)
+                return list(buffer)
+        # Cold room (first join since start): seed the ring from the table
+        buffer = deque(self._merge(self._load(room), room), maxlen=self.capacity)
+        with self.lock:
+            buffer = self.rooms.setdefault(room, buffer)
+            self.rooms.move_to_end(room)
+            while len(self.rooms) > self.max_rooms:
+                self.rooms.popitem(last=False)
+            return list(buffer)
+
+    def _merge(self, stored, room):
+        with self.lock:
+            unflushed = [payload for pending_room, payload in self.pending if pending_room == room]
+        return (stored + unflushed)[-self.capacity:]
+
+    def _load(self, room):
+        self.counters['loads'] += 1
+        with app.app_context():
+            rows = ChatMessage.query.filter_by(room=room) \
+                .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()) \
+                .limit(self.capacity).all()
+            return [row.to_payload() for row in reversed(rows)]
+
+    def flush(self):
+        """Write pending messages in one batch; returns how many were written"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+            rows = [
+                {
+                    'room': room,
+                    'username': payload['username'],
+                    'message': payload['message'],
+                    'created_at': datetime.fromisoformat(payload['timestamp'])
+                }
+                for room, payload in batch
+            ]
+            try:
+                with app.app_context():
+                    db.session.execute(ChatMessage.__table__.insert(), rows)
+                    db.session.commit()
+            except (IntegrityError, DataError) as e:
+                print(f"Chat history flush error: {str(e)}")
+                return self._flush_rows(batch, rows)
+            except Exception as e:
+                print(f"Chat history flush error: {str(e)}")
+                self._requeue(batch)
+                return 0
+            self.counters['flushes'] += 1
+            self.counters['written'] += len(batch)
+            return len(batch)
+
+    def _requeue(self, batch):
+        """Put an unwritten batch back in front of the messages sent since"""
+        with self.lock:
+            self.pending[:0] = batch
+            dropped = max(0, len(self.pending) - self.max_pending)
+            del self.pending[:dropped]
+            self.counters['dropped'] += dropped
+            self.counters['retries'] += 1
+
+    def _flush_rows(self, batch, rows):
+        """Write rows one commit each, dropping the ones the database rejects.
+        If it goes away part way, the rest are requeued."""
+        written = rejected = 0
+        with app.app_context():
+            for i, row in enumerate(rows):
+                try:
+                    db.session.execute(ChatMessage.__table__.insert(), row)
+                    db.session.commit()
+                    written += 1
+                except (IntegrityError, DataError):
+                    db.session.rollback()
+                    rejected += 1
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Chat history flush error: {str(e)}")
+                    self._requeue(batch[i:])
+                    break
+        if rejected:
+            print(f"Chat history: dropped {rejected} of {len(rows)} messages that could not be stored")
+        self.counters['failed'] += rejected
+        self.counters['flushes'] += 1
+        self.counters['written'] += written
+        return written
+
+    def ensure_flusher(self):
+        if self.flusher is None:
+            with self.lock:
+                if self.flusher is None:
+                    self.flusher = socketio.start_background_task(self._flush_loop)
+
+    def _flush_loop(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            self.flush()
+
+
+chat_history = ChatHistory(
+    capacity=int(os.getenv('ROOM_HISTORY_SIZE', 50)),
+    max_rooms=int(os.getenv('ROOM_HISTORY_MAX_ROOMS', 1000)),
+    flush_interval=float(os.getenv('ROOM_HISTORY_FLUSH_INTERVAL', 2)),
+    flush_size=int(os.getenv('ROOM_HISTORY_FLUSH_SIZE', 200)),
+    max_pending=int(os.getenv('ROOM_HISTORY_MAX_PENDING', 20000)),
+    shared=bool(SOCKETIO_MESSAGE_QUEUE)
+)
+atexit.register(chat_history.flush)
+
+
+class TokenBuckets:
+    """A token bucket per key: `rate` tokens a second, holding up to `burst`.
+    Least recently used keys are evicted past max_keys."""
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # {key: (tokens, updated_at)}
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed
+
+    def discard(self, key):
+        with self.lock:
+            self.buckets.pop(key, None)
+
+
+class ChatLimits:
+    """Inbound limits for chat messages: maximum length, then per-sid and
+    per-room token buckets. Buckets are per worker, so with N workers a
+    room can take up to N times its rate."""
+    def __init__(self, max_length, sid_rate, sid_burst, room_rate, room_burst):
+        self.max_length = max_length
+        self.sid_buckets = TokenBuckets(sid_rate, sid_burst)
+        self.room_buckets = TokenBuckets(room_rate, room_burst)
+        self.counters = defaultdict(int)
+
+    def check(self, sid, room, message):
+        """None if the message may be broadcast, else the reason it may not"""
+        if len(message) > self.max_length:
+            reason = 'too_long'
+        elif not self.sid_buckets.allow(sid):
+            reason = 'rate_limited'
+        elif not self.room_buckets.allow(room):
+            reason = 'room_busy'
+        else:
+            return None
+        self.counters[reason] += 1
+        return reason
+
+    def forget(self, sid):
+        self.sid_buckets.discard(sid)
+
+
+class OutboundLimiter:
+    """Caps the packets queued for each connection. Engine.IO buffers outbound
+    packets without bound, so a client that stops reading would otherwise
+    grow its queue with every room broadcast. Past max_queue, packets to that
+    client are dropped and, with policy 'disconnect', the client is closed
+    (it gets the room history again when it rejoins)."""
+    def __init__(self, eio, max_queue, policy, counters):
+        self.eio = eio
+        self.max_queue = max_queue
+        self.policy = policy
+        self.counters = counters
+        self.evicting = set()
+        # Every emit, local or from the message queue, ends up here. This is
+        # python-engineio's Server.send_packet, which python-socketio calls
+        # for every packet; requirements.txt pins both to the major versions
+        # that do. Fail at start-up rather than stop limiting quietly.
+        if not callable(getattr(eio, 'send_packet', None)):
+            raise RuntimeError('OutboundLimiter needs engineio.Server.send_packet (python-engineio 4.x)')
+        self._send_packet = eio.send_packet
+        eio.send_packet = self.send_packet
+
+    def send_packet(self, sid, pkt):
+        client = self.eio.sockets.get(sid)
+        if client is None or client.queue.qsize() < self.max_queue:
+            return self._send_packet(sid, pkt)
+        self.counters['outbound_dropped'] += 1
+        if self.policy == 'disconnect' and sid not in self.evicting:
+            self.evicting.add(sid)
+            self.counters['slow_consumers_disconnected'] += 1
+            # Not inline: we may be in the middle of iterating a room
+            self.eio.start_background_task(self._evict, sid, client)
+
+    def _evict(self, sid, client):
+        try:
+            # Don't wait for the backlog to drain; that is the problem
+            client.close(wait=False, abort=True)
+            self.eio.sockets.pop(sid, None)
+        finally:
+            self.evicting.discard(sid)
+
+
+chat_limits = ChatLimits(
+    max_length=int(os.getenv('CHAT_MAX_MESSAGE_LENGTH', 2000)),
+    sid_rate=float(os.getenv('CHAT_SID_RATE', 1)),
+    sid_burst=float(os.getenv('CHAT_SID_BURST', 5)),
+    room_rate=float(os.getenv('CHAT_ROOM_RATE', 20)),
+    room_burst=float(os.getenv('CHAT_ROOM_BURST', 50))
+)
+outbound_limiter = OutboundLimiter(
+    socketio.server.eio,
+    max_queue=int(os.getenv('CHAT_MAX_OUTBOUND_QUEUE', 500)),
+    policy=os.getenv('CHAT_SLOW_CONSUMER_POLICY', 'disconnect'),
+    counters=chat_limits.counters
+)
 
 @socketio.on('connect')
 def handle_connect():
@@ -44,64 +821,197 @@ def handle_connect():
 
 @socketio.on('join')
 def handle_join(data):
-    room = data.get('room', 'peer-support')
-    username = data.get('username', 'Anonymous')
+    room = chat_name(data.get('room'), 'peer-support')
+    username = chat_name(data.get('username'), 'Anonymous')[:CHAT_NAME_MAX_LENGTH]
+    if len(room) > CHAT_NAME_MAX_LENGTH:
+        emit('join_rejected', {'reason': 'invalid_room', 'max_length': CHAT_NAME_MAX_LENGTH})
+        return
     
     join_room(room)
-    active_users[room][request.sid] = username
+    presence.ensure_heartbeat()
+    user_count = presence.join(room, request.sid, username)
     
     # Notify others
     emit('user_joined', {
         'username': username,
-        'user_count': len(active_users[room])
+        'user_count': user_count
     }, room=room, skip_sid=request.sid)
     
-    # Send user count to the new user
-    emit('user_count', len(active_users[room]))
+    # Send user count and recent messages to the new user
+    emit('user_count', user_count)
+    emit('history', {'room': room, 'messages': chat_history.recent(room)})
     
     print(f'{username} joined room {room}')
 
 @socketio.on('message')
 def handle_message(data):
-    room = data.get('room', 'peer-support')
-    message = (data.get('message') or '').strip()
+    room = chat_name(data.get('room'), 'peer-support')
+    message = data.get('message')
+    message = message.strip() if isinstance(message, str) else ''
     if not message:
         return
+    if len(room) > CHAT_NAME_MAX_LENGTH:
+        emit('message_rejected', {'reason': 'invalid_room', 'max_length': CHAT_NAME_MAX_LENGTH})
+        return
+
+    rejected = chat_limits.check(request.sid, room, message)
+    if rejected:
+        emit('message_rejected', {'reason': rejected, 'max_length': chat_limits.max_length})
+        return
 
-    username = data.get('username') or active_users[room].get(request.sid, 'Anonymous')
+    username = chat_name(data.get('username'), None) or presence.username(room, request.sid)
     payload = {
-        'username': username,
+        'username': username[:CHAT_NAME_MAX_LENGTH],
         'message': message,
         'timestamp': datetime.utcnow().isoformat()
     }
+    # Sending a message ends the sender's typing state
+    typing_tracker.stop(room, request.sid)
     emit('message', payload, room=room)
+    chat_history.add(room, payload)
+    chat_history.ensure_flusher()
 
 
 @socketio.on('typing')
 def handle_typing(data):
-    room = data.get('room', 'peer-support')
-    username = data.get('username') or active_users[room].get(request.sid, 'Anonymous')
-    emit('user_typing', {'username': username}, room=room, skip_sid=request.sid)
+    room = chat_name(data.get('room'), 'peer-support')
+    if len(room) > CHAT_NAME_MAX_LENGTH:
+        return
+    username = chat_name(data.get('username'), None) or presence.username(room, request.sid)
+    typing_tracker.start(room, request.sid, username[:CHAT_NAME_MAX_LENGTH])
+    typing_tracker.ensure_flusher()
 
 
 @socketio.on('stop_typing')
 def handle_stop_typing(data):
-    room = data.get('room', 'peer-support')
-    username = data.get('username') or active_users[room].get(request.sid, 'Anonymous')
-    emit('user_stopped_typing', {'username': username}, room=room, skip_sid=request.sid)
+    room = chat_name(data.get('room'), 'peer-support')
+    if len(room) > CHAT_NAME_MAX_LENGTH:
+        return
+    typing_tracker.stop(room, request.sid)
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    for room, users in list(active_users.items()):
-        username = users.pop(request.sid, None)
-        if username:
-            emit('user_left', {'username': username, 'user_count': len(users)}, room=room)
-            emit('user_count', len(users), room=room)
-        if not users:
-            active_users.pop(room, None)
+    for room, username, user_count in presence.leave_all(request.sid):
+        typing_tracker.stop(room, request.sid)
+        emit('user_left', {'username': username, 'user_count': user_count}, room=room)
+        emit('user_count', user_count, room=room)
+    chat_limits.forget(request.sid)
     print(f'Client disconnected: {request.sid}')
 
+# Password hashing. bcrypt is slow on purpose, so on the request thread a
+# burst of logins eats every worker (and under gevent stalls the whole event
+# loop). Hashing runs in a small pool of lower-priority processes instead; a
+# login storm then only makes logins slower.
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, rounds, workers, max_pending, max_wait, nice):
+        self.rounds = rounds
+        # The pool starts its workers from a forkserver: forking the server
+        # itself isn't safe once it runs threads, and the forkserver only
+        # preloads bcrypt, so children never re-import app.py. Where there's
+        # no forkserver (Windows) hash inline instead, bcrypt releases the GIL.
+        # Workers exit with the app: on shutdown() or atexit, on SIGTERM
+        # (which skips atexit), and when it is killed outright, through
+        # the parent_alive pipe (see password_worker.py)
+        if workers > 0 and 'forkserver' not in multiprocessing.get_all_start_methods():
+            print("Password hashing runs inline: no forkserver start method on this platform")
+            workers = 0
+        self.workers = workers
+        self.max_wait = max_wait
+        self.nice = nice
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pool = None
+        self.parent_alive = None
+        self.lock = threading.Lock()
+        if workers > 0:
+            atexit.register(self.shutdown)
+            self._handle_sigterm()
+
+    def _pool(self):
+        # Created on first use so forking servers create it in each worker
+        with self.lock:
+            if self.pool is None:
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['bcrypt', 'password_worker'])
+                # Workers get the read end; the write end never leaves this process
+                self.parent_alive = context.Pipe(duplex=False)
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context,
+                    initializer=password_worker.init_worker, initargs=(self.nice, self.parent_alive[0])
+                )
+            return self.pool
+
+    def shutdown(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+            parent_alive, self.parent_alive = self.parent_alive, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if parent_alive is not None:
+            for connection in parent_alive:
+                connection.close()
+
+    def _handle_sigterm(self):
+        """Stop the pool on SIGTERM too, which skips atexit, then hand the
+        signal on to whatever handled it before"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handler(signum, frame):
+            self.shutdown()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                signal.signal(signum, signal.SIG_DFL)
+                os.kill(os.getpid(), signum)
+
+        signal.signal(signal.SIGTERM, handler)
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self.slots.acquire(timeout=self.max_wait):
+            raise PasswordHasherBusy()
+        try:
+            pool = self._pool()
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A worker died (OOM killer, etc.); start a fresh pool once
+                with self.lock:
+                    if self.pool is pool:
+                        self.pool = None
+                        for connection in self.parent_alive:
+                            connection.close()
+                return self._pool().submit(fn, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash(self, password):
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+
+    def verify(self, password, hashed):
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def needs_rehash(self, hashed):
+        """True if hashed was made with a different work factor: $2b$<rounds>$..."""
+        return int(hashed.split(b'$')[2]) != self.rounds
+
+
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv('BCRYPT_ROUNDS', 12)),
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2))),
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64)),
+    max_wait=float(os.getenv('PASSWORD_HASH_MAX_WAIT', 10)),
+    nice=int(os.getenv('PASSWORD_HASH_NICE', 5))
+)
+
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True, nullable=False)
@@ -112,11 +1022,13 @@ class User(db.Model):
     gender = db.Column(db.String(50), nullable=False)
     residence = db.Column(db.String(100), nullable=False)
     field = db.Column(db.String(100), nullable=False)
+    # Bumped with every write to the user's mood entries, see MoodAggregateStore
+    mood_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def __init__(self, username, email, password, name, age, gender, residence, field):
         self.username = username
         self.email = email
-        self.password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        self.password = password_hasher.hash(password)
         self.name = name
         self.age = age
         self.gender = gender
@@ -124,23 +1036,127 @@ class User(db.Model):
         self.field = field
 
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password)
+        return password_hasher.verify(password, self.password)
 
 
-# Create the database tables
-with app.app_context():
-    db.create_all()
+# Current user. Login stores the user id in the session, so routes that only
+# need the id never touch the database; routes that need the row get it from
+# a short-lived per-process cache, at most once per request.
+class IdentityCache:
+    """Detached User rows by id, expiring after ttl seconds"""
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # {user_id: (loaded_at, user)}
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.entries.get(user_id)
+            if cached and now - cached[0] < self.ttl:
+                self.entries.move_to_end(user_id)
+                self.counters['hits'] += 1
+                return cached[1]
+        self.counters['misses'] += 1
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        # Detach it so commits in other requests never expire or refresh it
+        db.session.expunge(user)
+        with self.lock:
+            self.entries[user_id] = (now, user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+
+identity_cache = IdentityCache(
+    ttl=float(os.getenv('IDENTITY_CACHE_TTL', 30)),
+    max_entries=int(os.getenv('IDENTITY_CACHE_MAX_ENTRIES', 10000))
+)
+
+
+# ORM updates and deletes invalidate this process; other workers' copies
+# expire within IDENTITY_CACHE_TTL
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def forget_cached_user(mapper, connection, target):
+    identity_cache.invalidate(target.id)
+
+
+def current_user_id():
+    """Id of the logged-in user, or None. Sessions from before the id was
+    stored in them are upgraded on first use."""
+    if 'email' not in session:
+        return None
+    user_id = session.get('user_id')
+    if user_id is None:
+        user_id = db.session.query(User.id).filter_by(email=session['email']).scalar()
+        if user_id is None:
+            return None
+        session['user_id'] = user_id
+    return user_id
+
+
+def current_user():
+    """The logged-in User (detached, read-only), loaded once per request"""
+    if 'current_user' not in g:
+        user_id = current_user_id()
+        g.current_user = identity_cache.get(user_id) if user_id is not None else None
+    return g.current_user
+
 
 # Add new GratitudeEntry model
 class GratitudeEntry(db.Model):
+    # Every history query is per user over a date range, newest first; the
+    # mood filter adds an equality on mood in between
+    __table_args__ = (
+        db.Index('ix_gratitude_entry_user_id_date_created', 'user_id', 'date_created'),
+        db.Index('ix_gratitude_entry_user_id_mood_date_created', 'user_id', 'mood', 'date_created'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     date_created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     last_modified = db.Column(db.DateTime, onupdate=datetime.utcnow)
     mood = db.Column(db.String(50))
+    # Analyzer output, stored on write so trends are column aggregates. Rows
+    # stored under another ANALYZER_VERSION are redone by sentiment_backfill.
+    sentiment = db.Column(db.String(3))
+    stress_level = db.Column(db.String(10))
+    positive_score = db.Column(db.Float)
+    negative_score = db.Column(db.Float)
+    stress_score = db.Column(db.Float)
+    analyzer_version = db.Column(db.String(32))
+
+    def analyze(self):
+        for column, value in analysis_cache.analyze(self.content).items():
+            setattr(self, column, value)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'content': self.content,
+            'mood': self.mood,
+            'date': self.date_created.strftime('%Y-%m-%d'),
+            'last_modified': self.last_modified.strftime('%Y-%m-%d %H:%M:%S') if self.last_modified else None,
+            'sentiment': self.sentiment,
+            'stress_level': self.stress_level
+        }
 
 class MoodEntry(db.Model):
+    __table_args__ = (
+        db.Index('ix_mood_entry_user_id_date_created', 'user_id', 'date_created'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     mood_score = db.Column(db.Integer, nullable=False)  # 1-10 scale
@@ -164,11 +1180,346 @@ class MoodEntry(db.Model):
         }
 
 class Room(db.Model):
+    __table_args__ = (
+        db.Index('ix_room_user_id_created_at', 'user_id', 'created_at'),
+    )
+
     id=db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.String(100), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+
+class ChatMessage(db.Model):
+    __table_args__ = (
+        db.Index('ix_chat_message_room_created_at', 'room', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    room = db.Column(db.String(100), nullable=False)
+    username = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_payload(self):
+        return {
+            'username': self.username,
+            'message': self.message,
+            'timestamp': self.created_at.isoformat()
+        }
+
+
+# Create the database tables, once every model above is defined
+with app.app_context():
+    db.create_all()
+
+
+# History endpoints page newest-first with keyset pagination on
+# (date_created, id); the opaque cursor is the last row of the previous page.
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(entry):
+    raw = f"{entry.date_created.isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """Return (date_created, id) for a cursor token, or None if it is invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+        date_part, id_part = raw.split('|')
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def history_page_args():
+    """Parse ?cursor=&limit= into (cursor, limit); cursor is False if malformed"""
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    token = request.args.get('cursor')
+    if not token:
+        return None, limit
+    return decode_cursor(token) or False, limit
+
+
+def paginate_history(query, model, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """One newest-first page of query, plus the cursor for the next page"""
+    if cursor:
+        date_created, entry_id = cursor
+        query = query.filter(or_(model.date_created < date_created,
+                                 and_(model.date_created == date_created, model.id < entry_id)))
+    rows = query.order_by(model.date_created.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+# Server-side sessions. The cookie only carries a signed random session id;
+# the data lives in a shared store (SQLite on one host, Redis across nodes)
+# with a short-lived in-process LRU in front, so a typical request checks an
+# HMAC and a dict instead of a store round-trip. Deleting a session in the
+# store revokes it everywhere within SESSION_LOCAL_TTL seconds.
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, touch=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.touch = touch  # only the expiry needs pushing back
+        self.rotate = False
+        self.modified = False
+
+    def regenerate(self):
+        """Move the data to a fresh id on the next save (call on login)"""
+        self.rotate = True
+        self.modified = True
+
+
+class SQLiteSessionStore:
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'sid TEXT PRIMARY KEY, user_id INTEGER, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS ix_sessions_user_id ON sessions (user_id)')
+            self.connection.commit()
+        return self.connection
+
+    def load(self, sid):
+        """(data, expires_at) or None"""
+        with self.lock:
+            row = self._connect().execute(
+                'SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?', (sid, time.time())
+            ).fetchone()
+        return row
+
+    def save(self, sid, data, user_id, expires_at):
+        with self.lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO sessions (sid, user_id, data, expires_at) VALUES (?, ?, ?, ?)',
+                (sid, user_id, data, expires_at)
+            )
+            connection.commit()
+
+    def touch(self, sid, expires_at):
+        with self.lock:
+            connection = self._connect()
+            connection.execute('UPDATE sessions SET expires_at = ? WHERE sid = ?', (expires_at, sid))
+            connection.commit()
+
+    def delete(self, sid):
+        with self.lock:
+            connection = self._connect()
+            connection.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+            connection.commit()
+
+    def revoke_user(self, user_id):
+        """Delete every session of user_id; returns their ids"""
+        with self.lock:
+            connection = self._connect()
+            sids = [sid for sid, in connection.execute('SELECT sid FROM sessions WHERE user_id = ?', (user_id,))]
+            connection.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+            connection.commit()
+        return sids
+
+    def reap(self):
+        """Delete expired sessions in one statement; returns how many"""
+        with self.lock:
+            connection = self._connect()
+            removed = connection.execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),)).rowcount
+            connection.commit()
+        return removed
+
+
+class RedisSessionStore:
+    """Sessions as Redis keys with native expiry, plus a set of ids per user"""
+    def __init__(self, url):
+        import redis  # only needed when sessions live in Redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def load(self, sid):
+        pipe = self.redis.pipeline()
+        pipe.get(f'session:{sid}')
+        pipe.ttl(f'session:{sid}')
+        data, ttl = pipe.execute()
+        return (data, time.time() + ttl) if data is not None else None
+
+    def save(self, sid, data, user_id, expires_at):
+        pipe = self.redis.pipeline()
+        pipe.set(f'session:{sid}', data, exat=int(expires_at))
+        if user_id is not None:
+            pipe.sadd(f'user_sessions:{user_id}', sid)
+            pipe.expireat(f'user_sessions:{user_id}', int(expires_at))
+        pipe.execute()
+
+    def touch(self, sid, expires_at):
+        self.redis.expireat(f'session:{sid}', int(expires_at))
+
+    def delete(self, sid):
+        self.redis.delete(f'session:{sid}')
+
+    def revoke_user(self, user_id):
+        sids = list(self.redis.smembers(f'user_sessions:{user_id}'))
+        if sids:
+            self.redis.delete(*[f'session:{sid}' for sid in sids])
+        self.redis.delete(f'user_sessions:{user_id}')
+        return sids
+
+    def reap(self):
+        return 0  # Redis expires keys itself
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, ttl, local_ttl, local_max_entries, reap_interval):
+        self.store = store
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local_max_entries = local_max_entries
+        self.reap_interval = reap_interval
+        self.local = OrderedDict()  # {sid: (cached_at, data, expires_at)}
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+        self.reaper = None
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='mindcare-session')
+
+    def _load(self, sid):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.local.get(sid)
+            if cached and now - cached[0] < self.local_ttl and cached[2] > time.time():
+                self.local.move_to_end(sid)
+                self.counters['local_hits'] += 1
+                return cached[1], cached[2]
+        self.counters['store_loads'] += 1
+        row = self.store.load(sid)
+        if row is None:
+            self._forget(sid)
+            return None
+        data, expires_at = self.serializer.loads(row[0]), row[1]
+        self._remember(sid, data, expires_at)
+        return data, expires_at
+
+    def _remember(self, sid, data, expires_at):
+        with self.lock:
+            self.local[sid] = (time.monotonic(), data, expires_at)
+            self.local.move_to_end(sid)
+            while len(self.local) > self.local_max_entries:
+                self.local.popitem(last=False)
+
+    def _forget(self, sid):
+        with self.lock:
+            self.local.pop(sid, None)
+
+    def open_session(self, app, request):
+        self._ensure_reaper()
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                self.counters['bad_cookies'] += 1
+                sid = None
+            loaded = self._load(sid) if sid else None
+            if loaded:
+                data, expires_at = loaded
+                # Sliding expiry, written at most once per half lifetime
+                return ServerSession(dict(data), sid, touch=expires_at - time.time() < self.ttl / 2)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.sid and session.modified:
+                # Cleared (logout): drop it from the store and the browser
+                self.store.delete(session.sid)
+                self._forget(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.rotate and session.sid:
+            self.store.delete(session.sid)
+            self._forget(session.sid)
+            session.sid = None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+            session.modified = True
+        expires_at = time.time() + self.ttl
+        if session.modified:
+            data = dict(session)
+            self.store.save(session.sid, self.serializer.dumps(data), data.get('user_id'), expires_at)
+            self._remember(session.sid, data, expires_at)
+            self.counters['saves'] += 1
+        elif session.touch:
+            self.store.touch(session.sid, expires_at)
+            self._remember(session.sid, dict(session), expires_at)
+            return
+        else:
+            return
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session), httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path, secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+    def revoke_user(self, user_id):
+        sids = self.store.revoke_user(user_id)
+        for sid in sids:
+            self._forget(sid)
+        return len(sids)
+
+    def _ensure_reaper(self):
+        if self.reaper is None:
+            with self.lock:
+                if self.reaper is None:
+                    self.reaper = socketio.start_background_task(self._reap_loop)
+
+    def _reap_loop(self):
+        while True:
+            socketio.sleep(self.reap_interval)
+            try:
+                self.counters['reaped'] += self.store.reap()
+            except Exception as e:
+                print(f"Session reaper error: {str(e)}")
+
+
+# SESSION_STORE: sqlite:///path (default, under instance/), redis://... or
+# 'cookie' for Flask's signed-cookie sessions
+SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite:///' + os.path.join(app.instance_path, 'sessions.db'))
+if SESSION_STORE != 'cookie':
+    if SESSION_STORE.startswith(('redis://', 'rediss://')):
+        session_store = RedisSessionStore(SESSION_STORE)
+    elif SESSION_STORE.startswith('sqlite:///'):
+        session_store = SQLiteSessionStore(SESSION_STORE[len('sqlite:///'):])
+    else:
+        raise ValueError(f'Unsupported SESSION_STORE: {SESSION_STORE}')
+    app.session_interface = ServerSessionInterface(
+        session_store,
+        ttl=app.permanent_session_lifetime.total_seconds(),
+        local_ttl=float(os.getenv('SESSION_LOCAL_TTL', 5)),
+        local_max_entries=int(os.getenv('SESSION_LOCAL_MAX_ENTRIES', 10000)),
+        reap_interval=float(os.getenv('SESSION_REAP_INTERVAL', 600))
+    )
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -194,7 +1545,10 @@ def register():
         residence = request.form['residence']
         field = request.form['field']
 
-        new_user = User(username, email, password, name, age, gender, residence, field)
+        try:
+            new_user = User(username, email, password, name, age, gender, residence, field)
+        except PasswordHasherBusy:
+            return render_template('register.html', error='We are very busy right now, please try again in a moment'), 503
         db.session.add(new_user)
         db.session.commit()
         return redirect('/login')
@@ -209,8 +1563,21 @@ def login():
 
         user = User.query.filter_by(email=email).first()
 
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+            # Upgrade the stored hash when BCRYPT_ROUNDS has changed
+            if valid and password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+        except PasswordHasherBusy:
+            return render_template('login.html', error='We are very busy right now, please try again in a moment'), 503
+
+        if valid:
+            # New id on login so a session id planted before it is useless
+            if isinstance(session, ServerSession):
+                session.regenerate()
             session['email'] = user.email
+            session['user_id'] = user.id
             return redirect('/dashboard')
         else:
             return render_template('login.html', error='Invalid User')
@@ -223,18 +1590,23 @@ def dashboard():
     if 'email' not in session:
         return redirect('/login')
     
-    user = User.query.filter_by(email=session['email']).first()
+    user = current_user()
     default_query = "mental health tips"
-    videos = get_recommended_videos(default_query)
+    # Never wait on YouTube here; on a cold cache the page loads the videos
+    # from /youtube_recommendations/videos once it has rendered
+    videos = get_recommended_videos(default_query, block=False)
     
-    # Add this line to fetch gratitude entries
-    entries = GratitudeEntry.query.filter_by(user_id=user.id).order_by(GratitudeEntry.date_created.desc()).all()
+    # First page of gratitude entries; older ones are paged in from /gratitude
+    entries, next_cursor = paginate_history(
+        GratitudeEntry.query.filter_by(user_id=user.id), GratitudeEntry
+    )
     
     return render_template('dashboard.html', 
                          user=user,
                          videos=videos,
                          query=default_query,
                          entries=entries,  # Add this line
+                         older_entries_url=url_for('gratitude', cursor=next_cursor) if next_cursor else None,
                          active_tab='support_chat')
 
 
@@ -245,99 +1617,367 @@ def dashboard():
 @app.route('/logout')
 def logout():
     session.pop('email', None)
+    session.pop('user_id', None)
     return redirect('/login')
 
 
-# Function to get recommended videos based on a search query
-def get_recommended_videos(query, max_results=6):
-    try:
-        print(f"Fetching videos for query: {query}")  # Debug print
-        
-        # If query is general mental health term, enhance it
-        mental_health_keywords = ['mental health', 'anxiety', 'depression', 'stress', 'meditation', 
-                                 'mindfulness', 'therapy', 'wellness', 'self care', 'coping']
-        
-        is_mental_health_query = any(keyword in query.lower() for keyword in mental_health_keywords)
-        
-        if is_mental_health_query:
-            search_query = f"{query}"
-        else:
-            search_query = f"{query} mental health wellness"
-        
-        # Use requests library instead of google-api-python-client for better firewall compatibility
-        import urllib.parse
-        encoded_query = urllib.parse.quote(search_query)
-        api_url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&q={encoded_query}&type=video&maxResults={max_results}&relevanceLanguage=en&safeSearch=strict&videoEmbeddable=true&order=relevance&key={YOUTUBE_API_KEY}"
-        
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        print(f"Found {len(data.get('items', []))} videos")  # Debug print
-        
-        videos = []
-        for item in data.get('items', []):
-            # Get video ID based on response structure
-            video_id = item['id'].get('videoId', '')
-            if not video_id:
-                continue
-                
-            # Get best available thumbnail
-            thumbnails = item['snippet'].get('thumbnails', {})
-            thumbnail_url = (thumbnails.get('high', {}).get('url') or 
-                           thumbnails.get('medium', {}).get('url') or 
-                           thumbnails.get('default', {}).get('url', ''))
-            
-            video_data = {
-                'title': item['snippet'].get('title', 'Untitled'),
-                'description': item['snippet'].get('description', 'No description available'),
-                'thumbnail': thumbnail_url,
-                'video_id': video_id
-            }
-            videos.append(video_data)
-        
-        return videos
-    except requests.exceptions.RequestException as e:
-        print(f"Network error fetching videos: {str(e)}")  # Debug print
-        return []
-    except Exception as e:
-        print(f"Error fetching videos: {str(e)}")  # Debug print
-        import traceback
-        traceback.print_exc()
-        return []
+# Outbound HTTP. Every third-party integration goes through an UpstreamClient:
+# one pooled keep-alive session per upstream, explicit connect/read timeouts,
+# a few jittered retries and a circuit breaker, so a hung upstream fails fast
+# instead of tying up request threads.
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised without contacting the upstream while its circuit is open"""
 
-# Route to display recommendations on the dashboard
-@app.route('/youtube_recommendations', methods=['GET', 'POST'])
-def youtube_recommendations():
-    if 'email' not in session:
-        return redirect('/login')
-    
-    user = User.query.filter_by(email=session['email']).first()
-    
-    # Get search query from POST or use default
-    if request.method == 'POST':
-        query = request.form.get('query', '').strip()
-        if not query:
-            query = "mental health tips"
-    else:
-        query = "mental health tips"
 
-    # Fetch videos
-    videos = get_recommended_videos(query)
-    
-    # Pass empty list if no videos found
-    if not videos:
-        videos = []
-    
-    return render_template('dashboard.html', 
-                         user=user,
-                         videos=videos,
-                         query=query,
-                         active_tab='youtube')
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
 
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            # Half-open: after the cool-down let a single trial request through
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
 
-# Initialize sentiment analyzer with error handling
-try:
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+
+class UpstreamClient:
+    RETRY_STATUSES = {429, 502, 503, 504}
+
+    def __init__(self, name, connect_timeout=3.05, read_timeout=10, retries=2,
+                 backoff=0.5, max_backoff=4, pool_maxsize=10, headers=None):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """Send a request, retrying transient failures.
+
+        Connection failures are always retried since the request never
+        reached the upstream. Read timeouts and 429/5xx responses are only
+        retried for idempotent requests (GET by default).
+        """
+        if idempotent is None:
+            idempotent = method.upper() in ('GET', 'HEAD')
+        kwargs.setdefault('timeout', self.timeout)
+
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+                retryable = idempotent and response.status_code in self.RETRY_STATUSES
+                if not retryable or attempt >= self.retries:
+                    if response.status_code >= 500 or response.status_code == 429:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    return response
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.retries or not (idempotent or self._never_sent(e)):
+                    self.breaker.record_failure()
+                    raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+
+            attempt += 1
+            # Full jitter keeps retries from a burst of callers from lining up
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    @staticmethod
+    def _never_sent(error):
+        """True when the request failed before any bytes reached the upstream"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+USER_AGENT = 'MindCare-TherapistFinder/1.0'
+
+youtube_client = UpstreamClient('youtube', read_timeout=10)
+voiceflow_client = UpstreamClient('voiceflow', read_timeout=15)
+nominatim_client = UpstreamClient('nominatim', read_timeout=10, headers={'User-Agent': USER_AGENT})
+overpass_client = UpstreamClient('overpass', read_timeout=30, retries=1, headers={'User-Agent': USER_AGENT})
+
+
+# Shared pool for work that must not hold up a request (cache refreshes,
+# warming slow upstream calls before the browser asks for them)
+background_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('BACKGROUND_WORKERS', 4)),
+    thread_name_prefix='background'
+)
+
+
+class TTLCache:
+    """Bounded LRU cache with TTL expiry, stale-while-revalidate and
+    single-flight loading.
+
+    get(key, loader) returns a fresh value straight from the cache. A value
+    past its TTL but within stale_ttl is still returned while one background
+    thread refreshes it. On a miss, only the first caller runs loader();
+    concurrent callers for the same key wait for that result instead of
+    issuing their own upstream request. Loader errors are never cached.
+    With block=False a miss starts the load in the background and returns
+    None immediately.
+    """
+
+    def __init__(self, max_entries=256, ttl=900, stale_ttl=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.entries = OrderedDict()  # key -> (value, stored_at)
+        self.inflight = {}            # key -> Future of the running load
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def get(self, key, loader, block=True):
+        refresh = None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age < self.ttl + self.stale_ttl:
+                    self.entries.move_to_end(key)
+                    if age < self.ttl:
+                        self.counters['hits'] += 1
+                        return value
+                    # Serve the stale value; start a refresh unless one is
+                    # already running
+                    self.counters['stale_hits'] += 1
+                    if key in self.inflight:
+                        return value
+                    refresh = self.inflight[key] = Future()
+            if refresh is None:
+                future = self.inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self.inflight[key] = Future()
+                    self.counters['misses'] += 1
+                else:
+                    self.counters['coalesced'] += 1
+
+        if refresh is not None:
+            background_executor.submit(self._load, key, loader, refresh)
+            return value
+        if not block:
+            if leader:
+                background_executor.submit(self._load, key, loader, future)
+            return None
+        if leader:
+            self._load(key, loader, future)
+        return future.result()
+
+    def _load(self, key, loader, future):
+        try:
+            value = loader()
+        except Exception as e:
+            with self.lock:
+                self.inflight.pop(key, None)
+                self.counters['errors'] += 1
+            future.set_exception(e)
+            return
+
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+            self.inflight.pop(key, None)
+        future.set_result(value)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self.entries)
+        lookups = stats.get('hits', 0) + stats.get('stale_hits', 0) + stats.get('misses', 0) + stats.get('coalesced', 0)
+        stats['hit_ratio'] = round((stats.get('hits', 0) + stats.get('stale_hits', 0)) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+video_cache = TTLCache(
+    max_entries=int(os.getenv('VIDEO_CACHE_MAX_ENTRIES', 256)),
+    ttl=int(os.getenv('VIDEO_CACHE_TTL', 900)),
+    stale_ttl=int(os.getenv('VIDEO_CACHE_STALE_TTL', 3600))
+)
+
+
+# Function to get recommended videos based on a search query
+def get_recommended_videos(query, max_results=6, block=True):
+    """Cached wrapper around fetch_recommended_videos; returns [] on failure.
+
+    With block=False, returns None instead of waiting when nothing is cached
+    yet; the fetch continues in the background.
+    """
+    # Queries differing only in case or spacing share a cache entry
+    normalized_query = ' '.join(query.lower().split())
+    try:
+        return video_cache.get(
+            (normalized_query, max_results),
+            lambda: fetch_recommended_videos(normalized_query, max_results),
+            block=block
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Network error fetching videos: {str(e)}")  # Debug print
+        return []
+    except Exception as e:
+        print(f"Error fetching videos: {str(e)}")  # Debug print
+        import traceback
+        traceback.print_exc()
+        return []
+
+
+def fetch_recommended_videos(query, max_results=6):
+    """Query the YouTube Data API directly; raises on network or API errors"""
+    print(f"Fetching videos for query: {query}")  # Debug print
+    
+    # If query is general mental health term, enhance it
+    mental_health_keywords = ['mental health', 'anxiety', 'depression', 'stress', 'meditation', 
+                             'mindfulness', 'therapy', 'wellness', 'self care', 'coping']
+    
+    is_mental_health_query = any(keyword in query.lower() for keyword in mental_health_keywords)
+    
+    if is_mental_health_query:
+        search_query = f"{query}"
+    else:
+        search_query = f"{query} mental health wellness"
+    
+    # Use requests library instead of google-api-python-client for better firewall compatibility
+    import urllib.parse
+    encoded_query = urllib.parse.quote(search_query)
+    api_url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&q={encoded_query}&type=video&maxResults={max_results}&relevanceLanguage=en&safeSearch=strict&videoEmbeddable=true&order=relevance&key={YOUTUBE_API_KEY}"
+    
+    response = youtube_client.get(api_url)
+    response.raise_for_status()
+    
+    data = response.json()
+    print(f"Found {len(data.get('items', []))} videos")  # Debug print
+    
+    videos = []
+    for item in data.get('items', []):
+        # Get video ID based on response structure
+        video_id = item['id'].get('videoId', '')
+        if not video_id:
+            continue
+            
+        # Get best available thumbnail
+        thumbnails = item['snippet'].get('thumbnails', {})
+        thumbnail_url = (thumbnails.get('high', {}).get('url') or 
+                       thumbnails.get('medium', {}).get('url') or 
+                       thumbnails.get('default', {}).get('url', ''))
+        
+        video_data = {
+            'title': item['snippet'].get('title', 'Untitled'),
+            'description': item['snippet'].get('description', 'No description available'),
+            'thumbnail': thumbnail_url,
+            'video_id': video_id
+        }
+        videos.append(video_data)
+    
+    return videos
+
+
+@app.route('/youtube_recommendations/videos')
+def youtube_videos():
+    """Videos for a query as JSON; pages render first and load these afterwards"""
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    query = request.args.get('query', '').strip() or "mental health tips"
+    return jsonify({'query': query, 'videos': get_recommended_videos(query)})
+
+
+@app.route('/youtube_recommendations/cache_stats')
+def youtube_cache_stats():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(video_cache.stats())
+
+# Route to display recommendations on the dashboard
+@app.route('/youtube_recommendations', methods=['GET', 'POST'])
+def youtube_recommendations():
+    if 'email' not in session:
+        return redirect('/login')
+    
+    user = current_user()
+    
+    # Get search query from POST or use default
+    if request.method == 'POST':
+        query = request.form.get('query', '').strip()
+        if not query:
+            query = "mental health tips"
+    else:
+        query = "mental health tips"
+
+    # Fetch videos (in the background if they aren't cached yet)
+    videos = get_recommended_videos(query, block=False)
+    
+    # Pass empty list if no videos found
+    if not videos:
+        videos = []
+    
+    return render_template('dashboard.html', 
+                         user=user,
+                         videos=videos,
+                         query=query,
+                         active_tab='youtube')
+
+
+# Initialize sentiment analyzer with error handling
+try:
     if pipeline is not None:
         sentiment_analyzer = pipeline("text-classification", 
                                     model="finiteautomata/bertweet-base-sentiment-analysis")
@@ -350,6 +1990,246 @@ except Exception as e:
 
 # Enhanced sentiment analysis functions
 
+# Keyword lists shared by the sentiment and stress analyzers. Matching is by
+# substring against each whitespace-separated token, so 'happy' also counts
+# inside 'unhappy' and 'no' inside 'know' - the analyzers have always worked
+# this way and the scores depend on it.
+POSITIVE_WORDS = ['happy', 'joy', 'joyful', 'great', 'excellent', 'wonderful', 'amazing', 'good',
+                  'blessed', 'grateful', 'love', 'loving', 'excited', 'pleased', 'delighted',
+                  'content', 'peaceful', 'calm', 'relaxed', 'fantastic', 'awesome', 'brilliant',
+                  'perfect', 'beautiful', 'lovely', 'cheerful', 'optimistic', 'hopeful', 'proud']
+
+NEGATIVE_WORDS = ['sad', 'angry', 'terrible', 'horrible', 'awful', 'depressed', 'depression',
+                  'anxious', 'anxiety', 'worried', 'worry', 'stressed', 'stress', 'upset',
+                  'frustrated', 'frustration', 'overwhelmed', 'hopeless', 'afraid', 'fearful',
+                  'panic', 'exhausted', 'tired', 'bad', 'worst', 'miserable', 'lonely', 'alone',
+                  'crying', 'hurt', 'pain', 'suffering', 'scared', 'fear', 'nervous', 'down',
+                  'unhappy', 'disappointed', 'failure', 'failed', 'worthless', 'helpless']
+
+# Negation words that flip sentiment
+NEGATION_WORDS = ['not', 'no', 'never', 'neither', "n't", 'hardly', 'barely', 'cannot', "can't",
+                  "won't", "wouldn't", "shouldn't", "couldn't", "don't", "doesn't", "didn't"]
+
+# Direct negation phrases, matched against the whole text
+NEGATION_PHRASES = ['not feeling good', 'not feeling well', 'not doing well', 'not okay',
+                    'not fine', 'not great', 'not happy', 'not feeling happy', 'feeling down',
+                    'feel bad', 'feeling bad', 'not good', 'not well', "don't feel okay"]
+
+STRESS_INDICATORS = {
+    'high': ['anxiety', 'panic', 'overwhelmed', 'depressed', 'depression', 'stressed',
+             'worried', 'worry', 'fear', 'terrible', 'horrible', 'awful', 'sad', 'angry',
+             'upset', 'exhausted', 'hopeless', 'crying', 'suffering', 'miserable',
+             'desperate', 'scared', 'help me', 'can\'t cope', 'breakdown', 'crisis',
+             'suicidal', 'worthless', 'pain', 'hurt', 'alone', 'isolated', 'failing'],
+    'moderate': ['concerned', 'uneasy', 'nervous', 'tired', 'frustrated', 'uncertain',
+                 'busy', 'confused', 'bothered', 'unsure', 'annoyed', 'restless',
+                 'uncomfortable', 'difficult', 'challenging', 'tough', 'hard', 'struggle'],
+    'low': ['calm', 'happy', 'peaceful', 'relaxed', 'good', 'great', 'blessed', 'grateful',
+            'content', 'joy', 'joyful', 'excited', 'pleased', 'delighted', 'wonderful',
+            'amazing', 'fantastic', 'excellent', 'perfect', 'beautiful', 'cheerful']
+}
+
+# Negation phrases that indicate distress, matched against the whole text
+DISTRESS_PHRASES = ['not feeling good', 'not feeling well', 'not okay', 'not fine',
+                    'feeling bad', 'feeling down', 'not doing well', 'feel terrible',
+                    'feel awful', 'feel sad', 'feel depressed']
+
+# Category bits for the token lexicon
+LEX_POSITIVE = 1
+LEX_NEGATIVE = 2
+LEX_NEGATION = 4
+LEX_STRESS_HIGH = 8
+LEX_STRESS_MODERATE = 16
+LEX_STRESS_LOW = 32
+
+# Category bits for the phrase lexicon
+LEX_NEGATION_PHRASE = 1
+LEX_DISTRESS_PHRASE = 2
+
+
+def build_lexicon(groups):
+    """Compile {keyword: category bits} into one overlapping alternation regex.
+
+    The pattern is a zero-width lookahead, so it reports the longest keyword
+    starting at every position of the input. Each keyword's bits are widened
+    to include every other keyword it contains, which makes the union over
+    all matches equal to the union over every keyword that is a substring of
+    the input - the same answer the old any(kw in word ...) scans gave.
+    """
+    bits = defaultdict(int)
+    for bit, keywords in groups:
+        for keyword in keywords:
+            bits[keyword] |= bit
+
+    closure = {}
+    for keyword in bits:
+        closure[keyword] = 0
+        for other, other_bits in bits.items():
+            if other in keyword:
+                closure[keyword] |= other_bits
+
+    alternation = '|'.join(re.escape(k) for k in sorted(bits, key=len, reverse=True))
+    return re.compile(f'(?=({alternation}))'), closure
+
+
+TOKEN_LEXICON, TOKEN_LEXICON_BITS = build_lexicon([
+    (LEX_POSITIVE, POSITIVE_WORDS),
+    (LEX_NEGATIVE, NEGATIVE_WORDS),
+    (LEX_NEGATION, NEGATION_WORDS),
+    (LEX_STRESS_HIGH, STRESS_INDICATORS['high']),
+    (LEX_STRESS_MODERATE, STRESS_INDICATORS['moderate']),
+    (LEX_STRESS_LOW, STRESS_INDICATORS['low']),
+])
+
+PHRASE_LEXICON, PHRASE_LEXICON_BITS = build_lexicon([
+    (LEX_NEGATION_PHRASE, NEGATION_PHRASES),
+    (LEX_DISTRESS_PHRASE, DISTRESS_PHRASES),
+])
+
+
+# Longer tokens (URLs, pasted blobs) are classified but not memoized, so the
+# cache stays small however large the inputs are
+MAX_CACHED_TOKEN_LENGTH = 64
+
+
+def classify_token(token):
+    """Category bits for one lowercased token"""
+    mask = 0
+    for match in TOKEN_LEXICON.finditer(token):
+        mask |= TOKEN_LEXICON_BITS[match.group(1)]
+    return mask
+
+
+@lru_cache(maxsize=50000)
+def cached_token_categories(token):
+    # Journal vocabulary repeats a lot
+    return classify_token(token)
+
+
+def token_categories(token):
+    if len(token) > MAX_CACHED_TOKEN_LENGTH:
+        return classify_token(token)
+    return cached_token_categories(token)
+
+
+def scan_lexicon(text):
+    """Score text against every lexicon in a single pass.
+
+    Returns the raw counts both analyzers work from, so callers that need
+    sentiment and stress for the same text only tokenize it once.
+    """
+    text_lower = text.lower()
+    words = text_lower.split()
+
+    positive_score = 0
+    negative_score = 0
+    high_count = 0
+    moderate_count = 0
+    low_count = 0
+    previous = 0
+
+    for word in words:
+        mask = token_categories(word)
+        # Check if previous word is a negation
+        has_negation = previous & LEX_NEGATION
+
+        if mask & LEX_POSITIVE:
+            if has_negation:
+                negative_score += 2  # "not happy" = negative
+            else:
+                positive_score += 1
+
+        if mask & LEX_NEGATIVE:
+            if has_negation:
+                positive_score += 0.5  # "not sad" = somewhat positive
+            else:
+                negative_score += 1
+
+        if mask & LEX_STRESS_HIGH:
+            high_count += 1
+        if mask & LEX_STRESS_MODERATE:
+            moderate_count += 1
+        if mask & LEX_STRESS_LOW:
+            low_count += 1
+
+        previous = mask
+
+    negation_phrases, distress_phrases = count_phrases(text_lower)
+
+    return {
+        'word_count': len(words),
+        'positive_score': positive_score,
+        'negative_score': negative_score + 2 * negation_phrases,
+        'high_count': high_count,
+        'moderate_count': moderate_count,
+        'low_count': low_count,
+        'negation_boost': 2 * distress_phrases
+    }
+
+
+def count_phrases(text_lower):
+    """Number of distinct negation and distress phrases present in the text"""
+    # Each phrase counts once, however often it appears
+    phrases = {match.group(1) for match in PHRASE_LEXICON.finditer(text_lower)}
+    negation_phrases = set()
+    distress_phrases = set()
+    for phrase in phrases:
+        for other, other_bits in PHRASE_LEXICON_BITS.items():
+            if other in phrase:
+                if other_bits & LEX_NEGATION_PHRASE:
+                    negation_phrases.add(other)
+                if other_bits & LEX_DISTRESS_PHRASE:
+                    distress_phrases.add(other)
+    return len(negation_phrases), len(distress_phrases)
+
+
+def sentiment_from_scan(scan):
+    """Map lexicon scores to a POS/NEG/NEU label"""
+    if scan['negative_score'] > scan['positive_score']:
+        return 'NEG'
+    elif scan['positive_score'] > scan['negative_score']:
+        return 'POS'
+    else:
+        return 'NEU'
+
+
+def stress_score_from_scan(scan):
+    """Weighted stress indicator count per word"""
+    if scan['word_count'] == 0:
+        return 0.0
+    # Add negation boost to high count
+    high_count = scan['high_count'] + scan['negation_boost']
+
+    # Calculate weighted score
+    total_score = (high_count * 3) + (scan['moderate_count'] * 1.5) - (scan['low_count'] * 2)
+
+    # Normalize by word count to handle different text lengths
+    return total_score / scan['word_count']
+
+
+def stress_from_scan(scan):
+    """Map lexicon counts to a High/Moderate/Low stress level"""
+    if scan['word_count'] == 0:
+        return 'Low'
+
+    moderate_count = scan['moderate_count']
+    low_count = scan['low_count']
+    high_count = scan['high_count'] + scan['negation_boost']
+    normalized_score = stress_score_from_scan(scan)
+
+    # Determine stress level with improved thresholds
+    if high_count >= 2 or normalized_score > 0.4:
+        return 'High'
+    elif high_count >= 1 or moderate_count >= 2 or normalized_score > 0.15:
+        return 'Moderate'
+    elif low_count >= 1 and high_count == 0:
+        return 'Low'
+    elif high_count == 0 and moderate_count == 0 and low_count == 0:
+        return 'Moderate'  # Neutral text
+    else:
+        return 'Moderate'  # Default to moderate if unclear
+
+
 @app.route('/analyze_text', methods=['POST'])
 def analyze_text():
     if 'email' not in session:
@@ -360,26 +2240,16 @@ def analyze_text():
         return {'error': 'No text provided'}, 400
 
     try:
-        # Check if sentiment analyzer is available
-        if sentiment_analyzer is None:
-            # Fallback to basic sentiment analysis using keyword matching
-            sentiment_label = perform_basic_sentiment_analysis(text)
-        else:
-            # Get sentiment analysis from transformers
-            sentiment_result = sentiment_analyzer(text)[0]
-            # Map transformer labels (POSITIVE, NEGATIVE, NEUTRAL) to our format
-            label_map = {
-                'POSITIVE': 'POS',
-                'NEGATIVE': 'NEG',
-                'NEUTRAL': 'NEU'
-            }
-            sentiment_label = label_map.get(sentiment_result['label'], 'NEU')
+        # Sentiment and stress come from one lexicon pass, or from the
+        # cache when the same text was analyzed before
+        cached = analysis_cache.analyze(text)
         
         # Get user data
-        user = User.query.filter_by(email=session['email']).first()
+        user = current_user()
         
         # Generate comprehensive analysis
-        analysis = generate_analysis_response(sentiment_label, text, user)
+        analysis = generate_analysis_response(cached['sentiment'], text, user,
+                                              stress_level=cached['stress_level'])
         
         return jsonify(analysis)
     except Exception as e:
@@ -387,99 +2257,131 @@ def analyze_text():
         return {'error': 'Analysis failed'}, 500
 
 
-def perform_basic_sentiment_analysis(text):
-    """Fallback sentiment analysis using keyword matching with negation handling"""
-    text_lower = text.lower()
-    
-    # Expanded keyword lists
-    positive_words = ['happy', 'joy', 'joyful', 'great', 'excellent', 'wonderful', 'amazing', 'good', 
-                     'blessed', 'grateful', 'love', 'loving', 'excited', 'pleased', 'delighted', 
-                     'content', 'peaceful', 'calm', 'relaxed', 'fantastic', 'awesome', 'brilliant',
-                     'perfect', 'beautiful', 'lovely', 'cheerful', 'optimistic', 'hopeful', 'proud']
-    
-    negative_words = ['sad', 'angry', 'terrible', 'horrible', 'awful', 'depressed', 'depression',
-                     'anxious', 'anxiety', 'worried', 'worry', 'stressed', 'stress', 'upset', 
-                     'frustrated', 'frustration', 'overwhelmed', 'hopeless', 'afraid', 'fearful', 
-                     'panic', 'exhausted', 'tired', 'bad', 'worst', 'miserable', 'lonely', 'alone',
-                     'crying', 'hurt', 'pain', 'suffering', 'scared', 'fear', 'nervous', 'down',
-                     'unhappy', 'disappointed', 'failure', 'failed', 'worthless', 'helpless']
-    
-    # Negation words that flip sentiment
-    negations = ['not', 'no', 'never', 'neither', "n't", 'hardly', 'barely', 'cannot', "can't", 
-                 "won't", "wouldn't", "shouldn't", "couldn't", "don't", "doesn't", "didn't"]
-    
-    # Split into words for better analysis
-    words = text_lower.split()
-    
-    positive_score = 0
-    negative_score = 0
-    
-    # Check for negations and adjust scores
-    for i, word in enumerate(words):
-        # Check if previous word is a negation
-        has_negation = i > 0 and any(neg in words[i-1] for neg in negations)
-        
-        # Check for positive words
-        if any(pos_word in word for pos_word in positive_words):
-            if has_negation:
-                negative_score += 2  # "not happy" = negative
-            else:
-                positive_score += 1
-        
-        # Check for negative words
-        if any(neg_word in word for neg_word in negative_words):
-            if has_negation:
-                positive_score += 0.5  # "not sad" = somewhat positive
-            else:
-                negative_score += 1
-    
-    # Also check for direct negation phrases
-    negation_phrases = ['not feeling good', 'not feeling well', 'not doing well', 'not okay', 
-                       'not fine', 'not great', 'not happy', 'not feeling happy', 'feeling down',
-                       'feel bad', 'feeling bad', 'not good', 'not well', "don't feel okay"]
-    for phrase in negation_phrases:
-        if phrase in text_lower:
-            negative_score += 2
-    
-    # Determine sentiment
-    if negative_score > positive_score:
-        return 'NEG'
-    elif positive_score > negative_score:
-        return 'POS'
-    else:
-        return 'NEU'
+# Map transformer labels (POSITIVE, NEGATIVE, NEUTRAL) to our format
+TRANSFORMER_LABELS = {'POSITIVE': 'POS', 'NEGATIVE': 'NEG', 'NEUTRAL': 'NEU'}
 
+# Stored with every analyzed journal entry. Bump the number whenever the
+# lexicons or scoring rules change so sentiment_backfill redoes old rows.
+ANALYZER_VERSION = ('transformers' if sentiment_analyzer is not None else 'lexicon') + '-1'
 
-def generate_analysis_response(sentiment, text, user):
-    # Emotion mapping adjusted to match UI expectations
-    emotion_map = {
-        'NEG': ['Anxiety', 'Sadness', 'Stress', 'Frustration', 'Depression'],
-        'NEU': ['Neutral', 'Calm', 'Contemplative', 'Reflective', 'Balanced'],
-        'POS': ['Joy', 'Gratitude', 'Contentment', 'Happiness', 'Excitement']
+
+def sentiment_for_text(text, scan):
+    """POS/NEG/NEU from the transformer model if loaded, else from the lexicon scan"""
+    if sentiment_analyzer is None:
+        # Fallback to basic sentiment analysis using keyword matching
+        return perform_basic_sentiment_analysis(text, scan)
+    return TRANSFORMER_LABELS.get(sentiment_analyzer(text)[0]['label'], 'NEU')
+
+
+def entry_analysis(scan, sentiment):
+    """Column values GratitudeEntry stores for one analyzed text"""
+    return {
+        'sentiment': sentiment,
+        'stress_level': stress_from_scan(scan),
+        'positive_score': float(scan['positive_score']),
+        'negative_score': float(scan['negative_score']),
+        'stress_score': stress_score_from_scan(scan),
+        'analyzer_version': ANALYZER_VERSION
     }
-    
+
+
+def analyze_entry_text(text):
+    scan = scan_lexicon(text)
+    return entry_analysis(scan, sentiment_for_text(text, scan))
+
+
+def normalize_analysis_text(text):
+    # The lexicon scan lowercases and splits on whitespace, so case and
+    # surrounding whitespace never change its result; the transformer
+    # model is case-sensitive
+    text = text.strip()
+    return text if sentiment_analyzer is not None else text.lower()
+
+
+def analysis_key(text):
+    """16-byte digest of the normalized text under the current analyzer"""
+    data = ANALYZER_VERSION + '\0' + normalize_analysis_text(text)
+    return hashlib.blake2b(data.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def text_seed(text):
+    """Stable per-text seed, so the randomly picked emotion is too"""
+    return int.from_bytes(analysis_key(text)[:8], 'big')
+
+
+class AnalysisCache:
+    """LRU of analyze_entry_text() results keyed by analysis_key(), bounded
+    by an estimate of its size in bytes. Only the deterministic parts are
+    cached; the dicts are shared between callers, so treat them as read-only."""
+
+    # OrderedDict slot, its link node and the (analysis, size) tuple
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (analysis, size)
+        self.bytes = 0
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def analyze(self, text):
+        key = analysis_key(text)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry[0]
+            self.counters['misses'] += 1
+
+        # Analyze outside the lock; two threads missing on the same text
+        # both compute it, which is cheaper than making one wait
+        analysis = analyze_entry_text(text)
+        size = (self.ENTRY_OVERHEAD + sys.getsizeof(key) + sys.getsizeof(analysis)
+                + sum(sys.getsizeof(value) for value in analysis.values()))
+        with self.lock:
+            if key not in self.entries and size <= self.max_bytes:
+                self.entries[key] = (analysis, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted_size) = self.entries.popitem(last=False)
+                    self.bytes -= evicted_size
+                    self.counters['evictions'] += 1
+        return analysis
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self.entries)
+            stats['bytes'] = self.bytes
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_ratio'] = round(stats.get('hits', 0) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+analysis_cache = AnalysisCache(int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', 8 * 1024 * 1024)))
+
+
+def perform_basic_sentiment_analysis(text, scan=None):
+    """Fallback sentiment analysis using keyword matching with negation handling"""
+    if scan is None:
+        if sentiment_analyzer is None:
+            return analysis_cache.analyze(text)['sentiment']
+        scan = scan_lexicon(text)
+    return sentiment_from_scan(scan)
+
+
+def generate_analysis_response(sentiment, text, user, scan=None, stress_level=None):
     # Calculate stress level first as it affects emotion selection
-    stress_level = calculate_stress_level(text)
-    
-    # Select emotion based on both sentiment and stress level with better logic
-    if stress_level == 'High':
-        # High stress overrides sentiment - always negative emotions
-        specific_emotion = random.choice(emotion_map['NEG'])
-    elif stress_level == 'Low' and sentiment == 'POS':
-        # Low stress + positive sentiment = positive emotions
-        specific_emotion = random.choice(emotion_map['POS'])
-    elif stress_level == 'Low' and sentiment == 'NEG':
-        # Low stress but negative sentiment = mild negative emotions
-        specific_emotion = random.choice(['Contemplative', 'Reflective', 'Calm'])
-    elif stress_level == 'Moderate' and sentiment == 'NEG':
-        # Moderate stress + negative sentiment = negative emotions
-        specific_emotion = random.choice(emotion_map['NEG'])
-    elif stress_level == 'Moderate' and sentiment == 'POS':
-        # Moderate stress + positive sentiment = neutral/positive emotions
-        specific_emotion = random.choice(emotion_map['NEU'] + ['Contentment', 'Hopeful'])
-    else:
-        # Default: use sentiment-based emotion
-        specific_emotion = random.choice(emotion_map.get(sentiment, emotion_map['NEU']))
+    if stress_level is None:
+        stress_level = calculate_stress_level(text, scan)
+    specific_emotion = select_emotion(sentiment, stress_level, text_seed(text))
 
     # Suggestions based on emotion and stress level
     suggestions = []
@@ -529,60 +2431,319 @@ def generate_analysis_response(sentiment, text, user):
     }
 
 
-def calculate_stress_level(text):
-    # Enhanced stress keywords with weights
-    stress_indicators = {
-        'high': ['anxiety', 'panic', 'overwhelmed', 'depressed', 'depression', 'stressed', 
-                'worried', 'worry', 'fear', 'terrible', 'horrible', 'awful', 'sad', 'angry', 
-                'upset', 'exhausted', 'hopeless', 'crying', 'suffering', 'miserable', 
-                'desperate', 'scared', 'help me', 'can\'t cope', 'breakdown', 'crisis',
-                'suicidal', 'worthless', 'pain', 'hurt', 'alone', 'isolated', 'failing'],
-        'moderate': ['concerned', 'uneasy', 'nervous', 'tired', 'frustrated', 'uncertain', 
-                    'busy', 'confused', 'bothered', 'unsure', 'annoyed', 'restless', 
-                    'uncomfortable', 'difficult', 'challenging', 'tough', 'hard', 'struggle'],
-        'low': ['calm', 'happy', 'peaceful', 'relaxed', 'good', 'great', 'blessed', 'grateful', 
-                'content', 'joy', 'joyful', 'excited', 'pleased', 'delighted', 'wonderful',
-                'amazing', 'fantastic', 'excellent', 'perfect', 'beautiful', 'cheerful']
+def select_emotion(sentiment, stress_level, seed=None):
+    # A seed (see text_seed) makes the pick repeatable for the same text
+    rng = random.Random(seed) if seed is not None else random
+
+    # Emotion mapping adjusted to match UI expectations
+    emotion_map = {
+        'NEG': ['Anxiety', 'Sadness', 'Stress', 'Frustration', 'Depression'],
+        'NEU': ['Neutral', 'Calm', 'Contemplative', 'Reflective', 'Balanced'],
+        'POS': ['Joy', 'Gratitude', 'Contentment', 'Happiness', 'Excitement']
     }
-    
-    text_lower = text.lower()
-    words = text_lower.split()
-    
-    if len(words) == 0:
-        return 'Low'
-    
-    # Check for negation phrases that indicate distress
-    distress_phrases = ['not feeling good', 'not feeling well', 'not okay', 'not fine', 
-                       'feeling bad', 'feeling down', 'not doing well', 'feel terrible',
-                       'feel awful', 'feel sad', 'feel depressed']
-    
-    negation_boost = sum(2 for phrase in distress_phrases if phrase in text_lower)
-    
-    # Count occurrences of stress indicators
-    high_count = sum(1 for word in words if any(indicator in word for indicator in stress_indicators['high']))
-    moderate_count = sum(1 for word in words if any(indicator in word for indicator in stress_indicators['moderate']))
-    low_count = sum(1 for word in words if any(indicator in word for indicator in stress_indicators['low']))
-    
-    # Add negation boost to high count
-    high_count += negation_boost
-    
-    # Calculate weighted score
-    total_score = (high_count * 3) + (moderate_count * 1.5) - (low_count * 2)
-    
-    # Normalize by word count to handle different text lengths
-    normalized_score = total_score / len(words)
-    
-    # Determine stress level with improved thresholds
-    if high_count >= 2 or normalized_score > 0.4:
-        return 'High'
-    elif high_count >= 1 or moderate_count >= 2 or normalized_score > 0.15:
-        return 'Moderate'
-    elif low_count >= 1 and high_count == 0:
-        return 'Low'
-    elif high_count == 0 and moderate_count == 0 and low_count == 0:
-        return 'Moderate'  # Neutral text
+
+    # Select emotion based on both sentiment and stress level with better logic
+    if stress_level == 'High':
+        # High stress overrides sentiment - always negative emotions
+        specific_emotion = rng.choice(emotion_map['NEG'])
+    elif stress_level == 'Low' and sentiment == 'POS':
+        # Low stress + positive sentiment = positive emotions
+        specific_emotion = rng.choice(emotion_map['POS'])
+    elif stress_level == 'Low' and sentiment == 'NEG':
+        # Low stress but negative sentiment = mild negative emotions
+        specific_emotion = rng.choice(['Contemplative', 'Reflective', 'Calm'])
+    elif stress_level == 'Moderate' and sentiment == 'NEG':
+        # Moderate stress + negative sentiment = negative emotions
+        specific_emotion = rng.choice(emotion_map['NEG'])
+    elif stress_level == 'Moderate' and sentiment == 'POS':
+        # Moderate stress + positive sentiment = neutral/positive emotions
+        specific_emotion = rng.choice(emotion_map['NEU'] + ['Contentment', 'Hopeful'])
     else:
-        return 'Moderate'  # Default to moderate if unclear
+        # Default: use sentiment-based emotion
+        specific_emotion = rng.choice(emotion_map.get(sentiment, emotion_map['NEU']))
+
+    return specific_emotion
+
+
+def calculate_stress_level(text, scan=None):
+    if scan is None:
+        return analysis_cache.analyze(text)['stress_level']
+    return stress_from_scan(scan)
+
+
+# Batch analysis: texts are tokenized together and scored with NumPy count
+# matrices, chunked so very large batches never hold more than
+# ANALYSIS_BATCH_MAX_TOKENS tokens in memory at once.
+LEX_CATEGORY_BITS = [LEX_POSITIVE, LEX_NEGATIVE, LEX_STRESS_HIGH, LEX_STRESS_MODERATE, LEX_STRESS_LOW]
+
+
+def iter_text_chunks(texts, max_tokens):
+    """Yield lists of (text, lowercased tokens) holding at most max_tokens tokens"""
+    chunk = []
+    chunk_tokens = 0
+    for body in texts:
+        words = (body or '').lower().split()
+        if chunk and chunk_tokens + len(words) > max_tokens:
+            yield chunk
+            chunk = []
+            chunk_tokens = 0
+        chunk.append((body or '', words))
+        chunk_tokens += len(words)
+    if chunk:
+        yield chunk
+
+
+def scan_lexicon_batch(chunk):
+    """scan_lexicon() for a whole chunk of (text, tokens) pairs at once"""
+    lengths = np.fromiter((len(words) for _, words in chunk), dtype=np.int64, count=len(chunk))
+    total = int(lengths.sum())
+
+    # Classify each distinct token once. A dict keeps this proportional to
+    # the text; a NumPy string array would pad every token to the longest one
+    vocab = {}
+
+    def categories(word):
+        mask = vocab.get(word)
+        if mask is None:
+            mask = vocab[word] = token_categories(word)
+        return mask
+
+    bits = np.fromiter((categories(word) for _, words in chunk for word in words), dtype=np.int64, count=total)
+
+    # Negation looks at the previous token of the same text only
+    previous = np.zeros_like(bits)
+    previous[1:] = bits[:-1]
+    starts = np.cumsum(lengths) - lengths
+    previous[starts[(lengths > 0) & (starts < total)]] = 0
+    negated = (previous & LEX_NEGATION) != 0
+
+    # One row per token, one column per category
+    counts = np.stack([(bits & bit) != 0 for bit in LEX_CATEGORY_BITS], axis=1)
+    positive, negative = counts[:, 0], counts[:, 1]
+    text_index = np.repeat(np.arange(len(chunk)), lengths)
+
+    def per_text(weights):
+        return np.bincount(text_index, weights=weights, minlength=len(chunk))
+
+    positive_score = per_text(positive * np.where(negated, 0, 1) + negative * np.where(negated, 0.5, 0))
+    negative_score = per_text(positive * np.where(negated, 2, 0) + negative * np.where(negated, 0, 1))
+    high_count = per_text(counts[:, 2])
+    moderate_count = per_text(counts[:, 3])
+    low_count = per_text(counts[:, 4])
+
+    # Phrases: one regex pass over the whole chunk, NUL-separated so no
+    # phrase can span two texts
+    negation_phrases = np.zeros(len(chunk), dtype=np.int64)
+    distress_phrases = np.zeros(len(chunk), dtype=np.int64)
+    joined = '\0'.join(text.lower() for text, _ in chunk)
+    offsets = np.cumsum([0] + [len(text) + 1 for text, _ in chunk[:-1]])
+    found = set()
+    for match in PHRASE_LEXICON.finditer(joined):
+        owner = int(np.searchsorted(offsets, match.start(), side='right')) - 1
+        for other, other_bits in PHRASE_LEXICON_BITS.items():
+            if other in match.group(1) and (owner, other) not in found:
+                found.add((owner, other))
+                if other_bits & LEX_NEGATION_PHRASE:
+                    negation_phrases[owner] += 1
+                if other_bits & LEX_DISTRESS_PHRASE:
+                    distress_phrases[owner] += 1
+
+    negative_score = negative_score + 2 * negation_phrases
+    negation_boost = 2 * distress_phrases
+    return [
+        {
+            'word_count': word_count,
+            'positive_score': pos,
+            'negative_score': neg,
+            'high_count': high,
+            'moderate_count': moderate,
+            'low_count': low,
+            'negation_boost': boost
+        }
+        for word_count, pos, neg, high, moderate, low, boost in zip(
+            lengths.tolist(), positive_score.tolist(), negative_score.tolist(),
+            high_count.astype(np.int64).tolist(), moderate_count.astype(np.int64).tolist(),
+            low_count.astype(np.int64).tolist(), negation_boost.tolist())
+    ]
+
+
+def iter_scan_texts(texts, max_tokens=None):
+    """Stream (text, lexicon scan, sentiment label) for each text, in input order"""
+    if max_tokens is None:
+        max_tokens = app.config['ANALYSIS_BATCH_MAX_TOKENS']
+
+    for chunk in iter_text_chunks(texts, max_tokens):
+        scans = scan_lexicon_batch(chunk)
+        if sentiment_analyzer is None:
+            sentiments = [sentiment_from_scan(scan) for scan in scans]
+        else:
+            results = sentiment_analyzer([body for body, _ in chunk])
+            sentiments = [TRANSFORMER_LABELS.get(result['label'], 'NEU') for result in results]
+        for (body, _), scan, sentiment in zip(chunk, scans, sentiments):
+            yield body, scan, sentiment
+
+
+def iter_analyze_texts(texts, max_tokens=None):
+    """Stream emotion, stress_level and sentiment for each text, in input order"""
+    for body, scan, sentiment in iter_scan_texts(texts, max_tokens):
+        stress_level = stress_from_scan(scan)
+        yield {
+            'emotion': select_emotion(sentiment, stress_level, text_seed(body)),
+            'stress_level': stress_level,
+            'sentiment': sentiment
+        }
+
+
+def analyze_texts(texts, max_tokens=None):
+    """Batch counterpart of /analyze_text for jobs that re-analyze stored entries"""
+    return list(iter_analyze_texts(texts, max_tokens))
+
+
+@app.route('/analyze_text/batch', methods=['POST'])
+def analyze_text_batch():
+    if 'email' not in session:
+        return {'error': 'Unauthorized'}, 401
+
+    texts = (request.json or {}).get('texts')
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return {'error': 'texts must be a list of strings'}, 400
+    if len(texts) > app.config['ANALYSIS_BATCH_MAX_TEXTS']:
+        return {'error': f"At most {app.config['ANALYSIS_BATCH_MAX_TEXTS']} texts per batch"}, 413
+
+    try:
+        return jsonify({'results': analyze_texts(texts)})
+    except Exception as e:
+        print(f"Error in batch analysis: {str(e)}")
+        return {'error': 'Analysis failed'}, 500
+
+
+class SentimentBackfill:
+    """Analyzes gratitude entries stored without, or under an older,
+    ANALYZER_VERSION in the background, one id-ordered batch at a time.
+
+    A batch that fails is retried row by row. Rows that still fail are
+    marked '<ANALYZER_VERSION>!failed' and skipped until the version changes,
+    so one bad entry can't stall every row after it."""
+
+    FAILED_SUFFIX = '!failed'
+
+    def __init__(self, batch_size=500, pause=0.1):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lock = threading.Lock()
+        self.worker = None
+        self.wanted = False
+        self.started = False
+        self.counters = {'runs': 0, 'batches': 0, 'updated': 0, 'failed': 0, 'errors': 0}
+
+    def stale(self):
+        return or_(GratitudeEntry.analyzer_version.is_(None),
+                   and_(GratitudeEntry.analyzer_version != ANALYZER_VERSION,
+                        GratitudeEntry.analyzer_version != ANALYZER_VERSION + self.FAILED_SUFFIX))
+
+    def run_batch(self, after_id=0):
+        """Analyze the next batch of stale entries with id > after_id.
+        Returns the last id looked at, or None when there are none left."""
+        rows = db.session.query(GratitudeEntry.id, GratitudeEntry.content) \
+            .filter(GratitudeEntry.id > after_id, self.stale()) \
+            .order_by(GratitudeEntry.id) \
+            .limit(self.batch_size) \
+            .all()
+        if not rows:
+            return None
+
+        try:
+            updates = [dict(analysis, entry_id=id)
+                       for (id, _), analysis in zip(rows, (entry_analysis(scan, sentiment) for _, scan, sentiment
+                                                           in iter_scan_texts(content for _, content in rows)))]
+            self._write(updates)
+            updated = len(updates)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Sentiment backfill: batch after id {after_id} failed ({str(e)}), retrying row by row")
+            updated = self._run_rows(rows)
+        self.counters['batches'] += 1
+        self.counters['updated'] += updated
+        return rows[-1][0]
+
+    def _write(self, updates):
+        table = GratitudeEntry.__table__
+        # Skip rows an edit re-analyzed since the SELECT, and keep
+        # last_modified, which means "last edited by the user"
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam('entry_id'), self.stale())
+            .values(last_modified=table.c.last_modified),
+            updates
+        )
+        db.session.commit()
+
+    def _run_rows(self, rows):
+        updated = 0
+        for id, content in rows:
+            try:
+                self._write([dict(analyze_entry_text(content), entry_id=id)])
+                updated += 1
+            except Exception as e:
+                db.session.rollback()
+                self.counters['failed'] += 1
+                print(f"Sentiment backfill: entry {id} failed ({str(e)}), skipping it")
+                self._write([{'entry_id': id, 'analyzer_version': ANALYZER_VERSION + self.FAILED_SUFFIX}])
+        return updated
+
+    def run(self):
+        """Backfill until no stale entries are left; returns how many were analyzed"""
+        self.counters['runs'] += 1
+        updated = self.counters['updated']
+        after_id = 0
+        while after_id is not None:
+            after_id = self.run_batch(after_id)
+            if after_id is not None and self.pause:
+                socketio.sleep(self.pause)
+        return self.counters['updated'] - updated
+
+    def request(self):
+        """Start a background run, or queue another pass if one is going"""
+        with self.lock:
+            self.wanted = True
+            if self.worker is None:
+                self.worker = socketio.start_background_task(self._loop)
+
+    def ensure_started(self):
+        # Once per process, so rows written before an upgrade get picked up
+        if not self.started:
+            self.started = True
+            self.request()
+
+    def _loop(self):
+        while True:
+            with self.lock:
+                if not self.wanted:
+                    self.worker = None
+                    return
+                self.wanted = False
+            with app.app_context():
+                try:
+                    updated = self.run()
+                    if updated:
+                        print(f"Sentiment backfill: analyzed {updated} entries ({ANALYZER_VERSION})")
+                except Exception as e:
+                    db.session.rollback()
+                    self.counters['errors'] += 1
+                    print(f"Sentiment backfill error: {str(e)}")
+
+
+sentiment_backfill = SentimentBackfill(
+    batch_size=int(os.getenv('SENTIMENT_BACKFILL_BATCH_SIZE', 500)),
+    pause=float(os.getenv('SENTIMENT_BACKFILL_PAUSE', 0.1))
+)
+
+
+@app.route('/analyze_text/cache_stats')
+def analysis_cache_stats():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(analysis_cache.stats())
 
 
 def select_personalized_suggestions(text, suggestions_list, stress_level):
@@ -654,34 +2815,299 @@ def get_motivational_quote(sentiment):
     
     return random.choice(quotes[sentiment])
     
+# Bulk export and import of journal history, as NDJSON or CSV. Exports
+# stream rows off a server-side cursor in fixed-size batches, so memory is
+# flat however long the history is. Imports parse the upload as a stream and
+# insert executemany batches in a single transaction.
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+GRATITUDE_EXPORT_FIELDS = ['id', 'date_created', 'last_modified', 'mood', 'content']
+MOOD_EXPORT_FIELDS = ['id', 'date_created', 'mood_score', 'energy_level', 'sleep_quality',
+                      'stress_level', 'activities', 'notes']
+
+
+def iter_export(model, fields, user_id, fmt):
+    """Yield one user's rows of model, oldest first, as NDJSON or CSV text chunks"""
+    rows = db.session.query(*[getattr(model, field) for field in fields]) \
+        .filter(model.user_id == user_id) \
+        .order_by(model.date_created, model.id) \
+        .yield_per(EXPORT_BATCH_SIZE)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(fields)
+    for count, row in enumerate(rows, 1):
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(fields, values))) + '\n')
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_response(model, fields, name):
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(iter_export(model, fields, current_user_id(), fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'}
+    )
+
+
+def iter_import_records():
+    """Parse the uploaded file (or raw request body) as NDJSON or CSV, one
+    record at a time"""
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    filename = upload.filename if upload else ''
+    fmt = request.args.get('format') or ('csv' if filename.endswith('.csv') else 'ndjson')
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        yield from csv.DictReader(text)
+    else:
+        for number, line in enumerate(text, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f'Line {number}: {e}')
+
+
+def parse_import_date(value, default=None):
+    return datetime.fromisoformat(value) if value else default
+
+
+def gratitude_import_row(record, user_id):
+    content = (record.get('content') or '').strip()
+    if not content:
+        raise ValueError('content is required')
+    return {
+        'user_id': user_id,
+        'content': content,
+        'mood': record.get('mood') or None,
+        'date_created': parse_import_date(record.get('date_created'), datetime.utcnow()),
+        'last_modified': parse_import_date(record.get('last_modified'))
+    }
+
+
+def mood_import_row(record, user_id):
+    return {
+        'user_id': user_id,
+        'mood_score': int(record['mood_score']),
+        'energy_level': int(record['energy_level']),
+        'sleep_quality': int(record['sleep_quality']),
+        'stress_level': int(record['stress_level']),
+        'activities': record.get('activities') or '',
+        'notes': record.get('notes') or '',
+        'date_created': parse_import_date(record.get('date_created'), datetime.utcnow())
+    }
+
+
+def import_records(model, make_row, user_id, records, before_commit=None):
+    """Insert records for user_id in executemany batches, all or nothing.
+    Returns the row count; raises ValueError naming the first bad record.
+    before_commit(), if given, runs in the same transaction."""
+    table = model.__table__
+    batch = []
+    count = 0
+    try:
+        for count, record in enumerate(records, 1):
+            try:
+                batch.append(make_row(record, user_id))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f'Record {count}: {e}')
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                db.session.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(table.insert(), batch)
+        if before_commit is not None:
+            before_commit()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
+
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MAX_TERMS = 8
+SNIPPET_WORDS = 16
+# Control characters cannot appear in form input, so they are safe markers to
+# carry match positions through escaping
+MATCH_OPEN, MATCH_CLOSE = '\x02', '\x03'
+
+
+def parse_search_terms(query):
+    """Split a search box string into (word, is_prefix) pairs; 'walk*' is a prefix"""
+    terms = re.findall(r'(\w+)(\*?)', (query or '').lower())
+    return [(word, bool(star)) for word, star in terms[:SEARCH_MAX_TERMS]]
+
+
+def highlight(snippet):
+    return str(escape(snippet)).replace(MATCH_OPEN, '<mark>').replace(MATCH_CLOSE, '</mark>')
+
+
+def make_snippet(content, terms):
+    """Window of SNIPPET_WORDS words around the first match, matches marked"""
+    def matches(word):
+        return any(token.startswith(term) if prefix else token == term
+                   for token in re.findall(r'\w+', word.lower()) for term, prefix in terms)
+
+    words = content.split()
+    first = next((i for i, word in enumerate(words) if matches(word)), 0)
+    start = max(0, min(first - SNIPPET_WORDS // 4, len(words) - SNIPPET_WORDS))
+    window = words[start:start + SNIPPET_WORDS]
+    snippet = ' '.join(MATCH_OPEN + word + MATCH_CLOSE if matches(word) else word for word in window)
+    return ('…' if start > 0 else '') + snippet + ('…' if start + SNIPPET_WORDS < len(words) else '')
+
+
+class SQLiteGratitudeSearch:
+    """FTS5 index over gratitude_entry.content kept in sync by triggers.
+
+    The index reads through a view that adds an owner token ('u<user_id>') to
+    every row, so a query ANDs it in and only ranks that user's postings
+    instead of every match in the table."""
+
+    DDL = [
+        "CREATE VIEW IF NOT EXISTS gratitude_fts_source AS "
+        "SELECT id, content, 'u' || user_id AS owner FROM gratitude_entry",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS gratitude_fts USING fts5("
+        "content, owner, content='gratitude_fts_source', content_rowid='id', "
+        "tokenize='porter unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS gratitude_fts_ai AFTER INSERT ON gratitude_entry BEGIN "
+        "INSERT INTO gratitude_fts(rowid, content, owner) VALUES (new.id, new.content, 'u' || new.user_id); END",
+        "CREATE TRIGGER IF NOT EXISTS gratitude_fts_ad AFTER DELETE ON gratitude_entry BEGIN "
+        "INSERT INTO gratitude_fts(gratitude_fts, rowid, content, owner) "
+        "VALUES ('delete', old.id, old.content, 'u' || old.user_id); END",
+        "CREATE TRIGGER IF NOT EXISTS gratitude_fts_au AFTER UPDATE OF content, user_id ON gratitude_entry BEGIN "
+        "INSERT INTO gratitude_fts(gratitude_fts, rowid, content, owner) "
+        "VALUES ('delete', old.id, old.content, 'u' || old.user_id); "
+        "INSERT INTO gratitude_fts(rowid, content, owner) VALUES (new.id, new.content, 'u' || new.user_id); END",
+    ]
+
+    def __init__(self):
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def ensure(self):
+        """Create the index and triggers on first use, indexing existing rows"""
+        if self.ready:
+            return
+        with self.lock:
+            if self.ready:
+                return
+            with db.engine.begin() as conn:
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'gratitude_fts'")).first()
+                for statement in self.DDL:
+                    conn.execute(text(statement))
+                if not exists:
+                    conn.execute(text("INSERT INTO gratitude_fts(gratitude_fts) VALUES ('rebuild')"))
+            self.ready = True
+
+    def search(self, user_id, terms, offset, limit):
+        self.ensure()
+        match = ' AND '.join([f'owner:u{int(user_id)}'] +
+                             [f'content:"{word}"' + ('*' if prefix else '') for word, prefix in terms])
+        rows = db.session.execute(text(
+            "SELECT e.id, e.date_created, e.mood, "
+            "snippet(gratitude_fts, 0, :open, :close, '…', :words) AS snippet, "
+            "bm25(gratitude_fts, 1.0, 0.0) AS score "
+            "FROM gratitude_fts JOIN gratitude_entry e ON e.id = gratitude_fts.rowid "
+            "WHERE gratitude_fts MATCH :match ORDER BY score, e.id DESC LIMIT :limit OFFSET :offset"
+        ).columns(date_created=db.DateTime), {'open': MATCH_OPEN, 'close': MATCH_CLOSE, 'words': SNIPPET_WORDS,
+            'match': match, 'limit': limit, 'offset': offset})
+        # bm25() is lower-is-better; flip it so clients see higher-is-better
+        return [(id, date_created, mood, snippet, -score) for id, date_created, mood, snippet, score in rows]
+
+
+class MySQLGratitudeSearch:
+    """InnoDB FULLTEXT index on gratitude_entry.content; MySQL maintains it on
+    every write, so nothing extra runs on create, edit or delete."""
+
+    def __init__(self):
+        self.ready = False
+
+    def ensure(self):
+        # The migration normally creates it; this covers db.create_all() setups
+        if self.ready:
+            return
+        indexes = sa_inspect(db.engine).get_indexes('gratitude_entry')
+        if not any(index['name'] == 'ft_gratitude_entry_content' for index in indexes):
+            print("Building FULLTEXT index on gratitude_entry.content")
+            with db.engine.begin() as conn:
+                conn.execute(text("ALTER TABLE gratitude_entry ADD FULLTEXT INDEX ft_gratitude_entry_content (content)"))
+        self.ready = True
+
+    def search(self, user_id, terms, offset, limit):
+        self.ensure()
+        match = ' '.join('+' + word + ('*' if prefix else '') for word, prefix in terms)
+        rows = db.session.execute(text(
+            "SELECT id, date_created, mood, content, "
+            "MATCH (content) AGAINST (:match IN BOOLEAN MODE) AS score "
+            "FROM gratitude_entry WHERE user_id = :user_id "
+            "AND MATCH (content) AGAINST (:match IN BOOLEAN MODE) "
+            "ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"
+        ).columns(date_created=db.DateTime), {'match': match, 'user_id': user_id, 'limit': limit, 'offset': offset})
+        return [(id, date_created, mood, make_snippet(content, terms), score)
+                for id, date_created, mood, content, score in rows]
+
+
+def make_gratitude_search(uri):
+    if uri.startswith('mysql'):
+        return MySQLGratitudeSearch()
+    return SQLiteGratitudeSearch()
+
+
+gratitude_search = make_gratitude_search(app.config['SQLALCHEMY_DATABASE_URI'])
+
+
 # Add new route to handle journal entries
 @app.route('/gratitude', methods=['GET', 'POST'])
 def gratitude():
     if 'email' not in session:
         return redirect('/login')
     
-    user = User.query.filter_by(email=session['email']).first()
+    user_id = current_user_id()
     
     if request.method == 'POST':
         content = request.form.get('content')
         mood = request.form.get('mood')
         if content:
             entry = GratitudeEntry(
-                user_id=user.id,
+                user_id=user_id,
                 content=content,
                 mood=mood
             )
+            entry.analyze()
             db.session.add(entry)
             db.session.commit()
             return redirect('/gratitude')
+
+    sentiment_backfill.ensure_started()
     
     # Get filter parameters
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     mood_filter = request.args.get('mood')
+    cursor, limit = history_page_args()
+    wants_json = request.args.get('format') == 'json'
+    if cursor is False:
+        if wants_json:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        cursor = None
     
     # Base query
-    query = GratitudeEntry.query.filter_by(user_id=user.id)
+    query = GratitudeEntry.query.filter_by(user_id=user_id)
     
     # Apply filters
     if start_date:
@@ -691,11 +3117,26 @@ def gratitude():
     if mood_filter:
         query = query.filter(GratitudeEntry.mood == mood_filter)
     
-    entries = query.order_by(GratitudeEntry.date_created.desc()).all()
+    entries, next_cursor = paginate_history(query, GratitudeEntry, cursor, limit)
+    
+    if wants_json:
+        mood_counts = query.with_entities(GratitudeEntry.mood, func.count(GratitudeEntry.id)) \
+            .group_by(GratitudeEntry.mood).all()
+        return jsonify({
+            'entries': [e.to_dict() for e in entries],
+            'next_cursor': next_cursor,
+            'total_entries': sum(count for _, count in mood_counts),
+            'mood_counts': {mood or 'None': count for mood, count in mood_counts}
+        })
+    
+    older_entries_url = None
+    if next_cursor:
+        older_entries_url = url_for('gratitude', **{**request.args.to_dict(), 'cursor': next_cursor})
     
     return render_template('dashboard.html', 
-                         user=user, 
+                         user=current_user(), 
                          entries=entries,
+                         older_entries_url=older_entries_url,
                          active_tab='gratitude')
 
 @app.route('/gratitude/edit/<int:entry_id>', methods=['POST'])
@@ -704,16 +3145,18 @@ def edit_gratitude(entry_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     entry = GratitudeEntry.query.get_or_404(entry_id)
-    user = User.query.filter_by(email=session['email']).first()
+    user_id = current_user_id()
     
-    if entry.user_id != user.id:
+    if entry.user_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
     content = request.json.get('content')
     mood = request.json.get('mood')
     
     if content:
-        entry.content = content
+        if content != entry.content or entry.analyzer_version != ANALYZER_VERSION:
+            entry.content = content
+            entry.analyze()
         entry.mood = mood
         db.session.commit()
         return jsonify({
@@ -731,26 +3174,122 @@ def delete_gratitude(entry_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     entry = GratitudeEntry.query.get_or_404(entry_id)
-    user = User.query.filter_by(email=session['email']).first()
+    user_id = current_user_id()
     
-    if entry.user_id != user.id:
+    if entry.user_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
     db.session.delete(entry)
     db.session.commit()
     return jsonify({'message': 'Entry deleted successfully'})
 
+@app.route('/gratitude/export')
+def export_gratitude():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return export_response(GratitudeEntry, GRATITUDE_EXPORT_FIELDS, 'gratitude')
+
+@app.route('/gratitude/import', methods=['POST'])
+def import_gratitude():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        count = import_records(GratitudeEntry, gratitude_import_row, current_user_id(), iter_import_records())
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    # Imported rows are inserted unanalyzed; the backfill catches them up
+    sentiment_backfill.request()
+    return jsonify({'imported': count})
+
+
+@app.route('/gratitude/trends')
+def gratitude_trends():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        days = min(max(1, int(request.args.get('days', 30))), 3650)
+    except ValueError:
+        return jsonify({'error': 'Invalid days'}), 400
+    sentiment_backfill.ensure_started()
+
+    def count_where(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    day = func.date(GratitudeEntry.date_created)
+    rows = db.session.query(
+        day,
+        func.count(GratitudeEntry.id),
+        # Rows the backfill gave up on aren't waiting for it
+        count_where(GratitudeEntry.analyzer_version.in_([ANALYZER_VERSION, ANALYZER_VERSION + SentimentBackfill.FAILED_SUFFIX])),
+        count_where(GratitudeEntry.sentiment == 'POS'),
+        count_where(GratitudeEntry.sentiment == 'NEU'),
+        count_where(GratitudeEntry.sentiment == 'NEG'),
+        count_where(GratitudeEntry.stress_level == 'Low'),
+        count_where(GratitudeEntry.stress_level == 'Moderate'),
+        count_where(GratitudeEntry.stress_level == 'High'),
+        func.avg(GratitudeEntry.positive_score),
+        func.avg(GratitudeEntry.negative_score),
+        func.avg(GratitudeEntry.stress_score)
+    ).filter(
+        GratitudeEntry.user_id == current_user_id(),
+        GratitudeEntry.date_created >= datetime.utcnow() - timedelta(days=days)
+    ).group_by(day).order_by(day).all()
+
+    trend = [{
+        'date': str(date),
+        'entries': entries,
+        'sentiment': {'POS': int(pos or 0), 'NEU': int(neu or 0), 'NEG': int(neg or 0)},
+        'stress_level': {'Low': int(low or 0), 'Moderate': int(moderate or 0), 'High': int(high or 0)},
+        'avg_positive_score': round(avg_positive, 3) if avg_positive is not None else None,
+        'avg_negative_score': round(avg_negative, 3) if avg_negative is not None else None,
+        'avg_stress_score': round(avg_stress, 3) if avg_stress is not None else None
+    } for date, entries, current, pos, neu, neg, low, moderate, high, avg_positive, avg_negative, avg_stress in rows]
+
+    return jsonify({
+        'days': trend,
+        'analyzer_version': ANALYZER_VERSION,
+        # Entries still waiting for the backfill (missing or older analysis)
+        'pending': sum(entries - int(current or 0) for _, entries, current, *_ in rows)
+    })
+
+@app.route('/gratitude/search')
+def search_gratitude():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    terms = parse_search_terms(request.args.get('q'))
+    if not terms:
+        return jsonify({'error': 'Missing search terms'}), 400
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        limit = min(max(1, int(request.args.get('limit', SEARCH_PAGE_SIZE))), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'Invalid page'}), 400
+
+    # One extra row tells us whether another page exists without a COUNT
+    rows = gratitude_search.search(current_user_id(), terms, (page - 1) * limit, limit + 1)
+    return jsonify({
+        'results': [{
+            'id': id,
+            'date_created': date_created.strftime('%Y-%m-%d %H:%M:%S'),
+            'mood': mood,
+            'snippet': highlight(snippet),
+            'score': round(score, 4)
+        } for id, date_created, mood, snippet, score in rows[:limit]],
+        'page': page,
+        'next_page': page + 1 if len(rows) > limit else None
+    })
+
 @app.route('/join_room', methods=['POST'])
 def join_support_chat():
     if 'email' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.filter_by(email=session['email']).first()
+    user_id = current_user_id()
     
     # Generate a unique room ID
     room_id = str(uuid.uuid4())
     
-    new_room = Room(room_id=room_id, user_id=user.id)
+    new_room = Room(room_id=room_id, user_id=user_id)
     db.session.add(new_room)
     db.session.commit()
     
@@ -759,14 +3298,15 @@ def join_support_chat():
 
 # Add VoiceFlow configuration after other configurations
 VOICEFLOW_API_KEY = os.getenv("VOICEFLOW_API_KEY")
-VOICEFLOW_BASE_URL = "https://general-runtime.voiceflow.com/state/user"
+VOICEFLOW_BASE_URL = os.getenv("VOICEFLOW_BASE_URL", "https://general-runtime.voiceflow.com/state/user")
 
 # Add VoiceFlow helper class before routes
 class VoiceFlowAgent:
     @staticmethod
     def interact(user_id: str, request_data: dict) -> str:
         try:
-            response = requests.post(
+            # Not idempotent: a replayed turn would advance the conversation twice
+            response = voiceflow_client.post(
                 f'{VOICEFLOW_BASE_URL}/{user_id}/interact',
                 json={'request': request_data},
                 headers={
@@ -792,13 +3332,12 @@ def mood_journal_interact():
     if 'email' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.filter_by(email=session['email']).first()
     message = request.json.get('message')
     
     if not message:
         return jsonify({'error': 'No message provided'}), 400
     
-    user_id = user.email
+    user_id = session['email']
     is_first = request.json.get('is_first_interaction', False)
     
     request_data = {"type": "launch"} if is_first else {"type": "text", "payload": message}
@@ -813,13 +3352,12 @@ def mood_journal_voice_interact():
     if 'email' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.filter_by(email=session['email']).first()
     transcribed_text = request.json.get('transcribed_text')
     
     if not transcribed_text:
         return jsonify({'error': 'No voice input provided'}), 400
     
-    user_id = user.email
+    user_id = session['email']
     is_first = request.json.get('is_first_interaction', False)
     
     request_data = {"type": "launch"} if is_first else {"type": "text", "payload": transcribed_text}
@@ -830,12 +3368,214 @@ def mood_journal_voice_interact():
         'transcribed_text': transcribed_text
     })
 
+# Per-user mood analytics cache. Each user's entries are kept sorted by
+# (date_created, id) with running sums and streak run-lengths, so insights for
+# any "last N days" window are a bisect plus a few array lookups instead of a
+# scan over the rows. Every write to a user's MoodEntry rows must call
+# mood_aggregates.bump(user_id) in the same transaction, which increments
+# user.mood_version. Each use compares that one column with the version the
+# cached copy was built at, so writes made by other workers are caught
+# without reading the user's rows. progress_tracker() and
+# delete_progress_entry() also update this worker's copy in place.
+MOOD_METRICS = ('mood_score', 'energy_level', 'sleep_quality', 'stress_level')
+
+
+class UserMoodAggregates:
+    def __init__(self, rows):
+        # rows are (id, date_created, mood_score, energy_level, sleep_quality, stress_level)
+        rows = sorted(rows, key=lambda row: (row[1], row[0]))
+        self.keys = [(row[1], row[0]) for row in rows]    # (date_created, id), ascending
+        self.metrics = [tuple(row[2:]) for row in rows]
+        self.version = None  # user.mood_version these rows were read at
+        self.prefix = [(0, 0, 0, 0)]  # prefix[i] = metric sums over metrics[:i]
+        self.runs = []     # runs[i] = consecutive-day streak ending at entry i
+        self._recompute(0)
+
+    def _recompute(self, start):
+        """Refresh prefix sums and streak runs from position start onwards"""
+        del self.prefix[start + 1:]
+        del self.runs[start:]
+        for i in range(start, len(self.metrics)):
+            last = self.prefix[-1]
+            self.prefix.append(tuple(total + value for total, value in zip(last, self.metrics[i])))
+            if i > 0 and (self.keys[i][0].date() - self.keys[i - 1][0].date()).days == 1:
+                self.runs.append(self.runs[-1] + 1)
+            else:
+                self.runs.append(1)
+
+    def add(self, entry):
+        key = (entry.date_created, entry.id)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return  # already loaded from the table by a concurrent get()
+        self.keys.insert(position, key)
+        self.metrics.insert(position, tuple(getattr(entry, metric) for metric in MOOD_METRICS))
+        # New entries are almost always the newest, so this is usually O(1)
+        self._recompute(position)
+
+    def remove(self, entry_id, date_created):
+        key = (date_created, entry_id)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+            del self.metrics[position]
+            self._recompute(position)
+
+    def insights(self, start_date):
+        """Same insights get_progress_data used to compute, for entries since start_date"""
+        first = bisect.bisect_left(self.keys, (start_date,))
+        last = len(self.keys) - 1
+        count = len(self.keys) - first
+
+        if count == 0:
+            return {
+                'averages': {'mood': 0, 'energy': 0, 'sleep': 0, 'stress': 0},
+                'trend': 'none',
+                'total_entries': 0,
+                'streak': 0
+            }
+
+        sums = [total - before for total, before in zip(self.prefix[-1], self.prefix[first])]
+
+        # Trend analysis (simple linear trend)
+        recent_first = max(first, len(self.keys) - 7)
+        trend = "improving" if self.metrics[last][0] > self.metrics[recent_first][0] else "declining"
+
+        return {
+            'averages': {
+                'mood': round(sums[0] / count, 1),
+                'energy': round(sums[1] / count, 1),
+                'sleep': round(sums[2] / count, 1),
+                'stress': round(sums[3] / count, 1)
+            },
+            'trend': trend,
+            'total_entries': count,
+            'streak': min(self.runs[last], count)
+        }
+
+    def summary(self):
+        """Raw aggregates, used by the consistency check"""
+        return {
+            'count': len(self.keys),
+            'sums': list(self.prefix[-1]),
+            'last_entry': self.keys[-1][0].isoformat() if self.keys else None,
+            'streak': self.runs[-1] if self.runs else 0
+        }
+
+
+class MoodAggregateStore:
+    def __init__(self, max_users=1000):
+        self.max_users = max_users
+        self.users = OrderedDict()
+        self.lock = threading.Lock()
+
+    def version(self, user_id):
+        # A primary key lookup, however many entries the user has
+        return db.session.query(User.mood_version).filter(User.id == user_id).scalar()
+
+    def bump(self, user_id):
+        """Increment user_id's mood version inside the caller's transaction;
+        returns the new version. The UPDATE holds the row until commit, so
+        the version read back is the one this write produces."""
+        db.session.execute(
+            User.__table__.update().where(User.id == user_id).values(mood_version=User.mood_version + 1)
+        )
+        return self.version(user_id)
+
+    def _load(self, user_id):
+        # The version is read first: a write landing in between leaves the
+        # copy labelled older than it is, so it is only rebuilt once more
+        version = self.version(user_id)
+        columns = [getattr(MoodEntry, metric) for metric in MOOD_METRICS]
+        aggregates = UserMoodAggregates(
+            db.session.query(MoodEntry.id, MoodEntry.date_created, *columns)
+            .filter(MoodEntry.user_id == user_id)
+            .all()
+        )
+        aggregates.version = version
+        return aggregates
+
+    def _store(self, user_id, aggregates):
+        with self.lock:
+            cached = self.users.get(user_id)
+            if cached is not None and cached.version > aggregates.version:
+                return cached
+            self.users[user_id] = aggregates
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+            return aggregates
+
+    def get(self, user_id):
+        version = self.version(user_id)
+        with self.lock:
+            aggregates = self.users.get(user_id)
+            if aggregates is not None and aggregates.version == version:
+                self.users.move_to_end(user_id)
+                return aggregates
+        # Missing, or another worker wrote to this user's entries; rebuild
+        # outside the lock
+        return self._store(user_id, self._load(user_id))
+
+    def _apply(self, user_id, version, update):
+        """Apply a committed write at version to the cached copy if it is the
+        version just before; drop the copy if it fell further behind"""
+        with self.lock:
+            aggregates = self.users.get(user_id)
+            if aggregates is None or aggregates.version >= version:
+                return
+            if aggregates.version == version - 1:
+                update(aggregates)
+                aggregates.version = version
+            else:
+                del self.users[user_id]
+
+    def add(self, entry, version):
+        user_id = entry.user_id  # reloads the committed row outside the lock
+        self._apply(user_id, version, lambda aggregates: aggregates.add(entry))
+
+    def remove(self, user_id, entry_id, date_created, version):
+        self._apply(user_id, version, lambda aggregates: aggregates.remove(entry_id, date_created))
+
+    def insights(self, user_id, start_date):
+        aggregates = self.get(user_id)
+        with self.lock:
+            return aggregates.insights(start_date)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+    def verify(self, user_id):
+        """Rebuild a user's aggregates from the MoodEntry table.
+
+        Returns whether the cached copy had drifted from the database, along
+        with both summaries. The rebuilt copy replaces the cached one.
+        """
+        rebuilt = self._load(user_id)
+        with self.lock:
+            cached = self.users.get(user_id)
+            # A copy at another version is expected to differ, and is replaced anyway
+            cached_summary = cached.summary() if cached is not None and cached.version == rebuilt.version else None
+            self.users[user_id] = rebuilt
+            self.users.move_to_end(user_id)
+        rebuilt_summary = rebuilt.summary()
+        return {
+            'consistent': cached_summary is None or cached_summary == rebuilt_summary,
+            'cached': cached_summary,
+            'rebuilt': rebuilt_summary
+        }
+
+
+mood_aggregates = MoodAggregateStore(int(os.getenv('MOOD_AGGREGATE_MAX_USERS', 1000)))
+
+
 @app.route('/progress_tracker', methods=['GET', 'POST'])
 def progress_tracker():
     if 'email' not in session:
         return redirect('/login')
     
-    user = User.query.filter_by(email=session['email']).first()
+    user_id = current_user_id()
     
     if request.method == 'POST':
         mood_score = int(request.form.get('mood_score'))
@@ -846,7 +3586,7 @@ def progress_tracker():
         notes = request.form.get('notes', '')
         
         entry = MoodEntry(
-            user_id=user.id,
+            user_id=user_id,
             mood_score=mood_score,
             energy_level=energy_level,
             sleep_quality=sleep_quality,
@@ -855,107 +3595,322 @@ def progress_tracker():
             notes=notes
         )
         db.session.add(entry)
+        version = mood_aggregates.bump(user_id)
         db.session.commit()
+        mood_aggregates.add(entry, version)
         
         return jsonify({'success': True, 'message': 'Entry saved successfully'})
     
-    return render_template('dashboard.html', user=user, active_tab='progress_tracker')
+    return render_template('dashboard.html', user=current_user(), active_tab='progress_tracker')
 
 @app.route('/progress_tracker/data', methods=['GET'])
 def get_progress_data():
     if 'email' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.filter_by(email=session['email']).first()
+    user_id = current_user_id()
     days = request.args.get('days', 30, type=int)
     
+    cursor, limit = history_page_args()
+    if cursor is False:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
     start_date = datetime.utcnow() - timedelta(days=days)
-    entries = MoodEntry.query.filter(
-        MoodEntry.user_id == user.id,
+    insights = mood_aggregates.insights(user_id, start_date)
+    
+    # Daily buckets are aggregated by the database rather than in Python
+    day = func.date(MoodEntry.date_created)
+    daily = db.session.query(
+        day,
+        func.count(MoodEntry.id),
+        func.avg(MoodEntry.mood_score),
+        func.avg(MoodEntry.energy_level),
+        func.avg(MoodEntry.sleep_quality),
+        func.avg(MoodEntry.stress_level)
+    ).filter(
+        MoodEntry.user_id == user_id,
         MoodEntry.date_created >= start_date
-    ).order_by(MoodEntry.date_created.asc()).all()
-    
-    # Calculate insights
-    if entries:
-        avg_mood = sum(e.mood_score for e in entries) / len(entries)
-        avg_energy = sum(e.energy_level for e in entries) / len(entries)
-        avg_sleep = sum(e.sleep_quality for e in entries) / len(entries)
-        avg_stress = sum(e.stress_level for e in entries) / len(entries)
-        
-        # Trend analysis (simple linear trend)
-        recent_entries = entries[-7:] if len(entries) >= 7 else entries
-        trend = "improving" if recent_entries[-1].mood_score > recent_entries[0].mood_score else "declining"
-        
-        insights = {
-            'averages': {
-                'mood': round(avg_mood, 1),
-                'energy': round(avg_energy, 1),
-                'sleep': round(avg_sleep, 1),
-                'stress': round(avg_stress, 1)
-            },
-            'trend': trend,
-            'total_entries': len(entries),
-            'streak': calculate_streak(entries)
-        }
-    else:
-        insights = {
-            'averages': {'mood': 0, 'energy': 0, 'sleep': 0, 'stress': 0},
-            'trend': 'none',
-            'total_entries': 0,
-            'streak': 0
-        }
+    ).group_by(day).order_by(day).all()
+    
+    entries, next_cursor = paginate_history(
+        MoodEntry.query.filter(MoodEntry.user_id == user_id, MoodEntry.date_created >= start_date),
+        MoodEntry, cursor, limit
+    )
     
     return jsonify({
         'entries': [e.to_dict() for e in entries],
+        'next_cursor': next_cursor,
+        'daily': [
+            {
+                'date': str(date),
+                'count': count,
+                'mood': round(float(mood), 1),
+                'energy': round(float(energy), 1),
+                'sleep': round(float(sleep), 1),
+                'stress': round(float(stress), 1)
+            }
+            for date, count, mood, energy, sleep, stress in daily
+        ],
         'insights': insights
     })
 
-def calculate_streak(entries):
-    if not entries:
-        return 0
-    
-    streak = 1
-    entries_sorted = sorted(entries, key=lambda x: x.date_created, reverse=True)
-    
-    for i in range(len(entries_sorted) - 1):
-        current_date = entries_sorted[i].date_created.date()
-        next_date = entries_sorted[i + 1].date_created.date()
-        
-        if (current_date - next_date).days == 1:
-            streak += 1
-        else:
-            break
+
+@app.route('/progress_tracker/data/verify', methods=['POST'])
+def verify_progress_data():
+    """Rebuild the cached mood aggregates from the database and report drift"""
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
     
-    return streak
+    user_id = current_user_id()
+    return jsonify(mood_aggregates.verify(user_id))
 
 @app.route('/progress_tracker/delete/<int:entry_id>', methods=['POST'])
 def delete_progress_entry(entry_id):
     if 'email' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    user = User.query.filter_by(email=session['email']).first()
+    user_id = current_user_id()
     entry = MoodEntry.query.get_or_404(entry_id)
     
-    if entry.user_id != user.id:
+    if entry.user_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
+    entry_id, date_created = entry.id, entry.date_created
     db.session.delete(entry)
+    version = mood_aggregates.bump(user_id)
     db.session.commit()
+    mood_aggregates.remove(user_id, entry_id, date_created, version)
     
     return jsonify({'success': True})
 
 
+@app.route('/progress_tracker/export')
+def export_progress():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return export_response(MoodEntry, MOOD_EXPORT_FIELDS, 'progress')
+
+
+@app.route('/progress_tracker/import', methods=['POST'])
+def import_progress():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    user_id = current_user_id()
+    try:
+        count = import_records(MoodEntry, mood_import_row, user_id, iter_import_records(),
+                               before_commit=lambda: mood_aggregates.bump(user_id))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    mood_aggregates.invalidate(user_id)
+    return jsonify({'imported': count})
+
+
 @app.route('/therapist_finder')
 def therapist_finder():
     if 'email' not in session:
         return redirect('/login')
     
-    user = User.query.filter_by(email=session['email']).first()
+    user = current_user()
     return render_template('dashboard.html', 
                          user=user,
                          active_tab='therapist_finder')
 
 
+# Geocoding. Nominatim allows about one request per second, so results are
+# kept in a small SQLite file under instance/ (it survives restarts and is
+# shared by every worker on the host) and cache misses go through a rate
+# limiter that never exceeds the upstream quota.
+class RateLimiter:
+    """Spaces calls at least min_interval seconds apart across all threads and
+    every worker process sharing the SQLite file at path"""
+
+    def __init__(self, path, name, min_interval, max_wait):
+        self.path = path
+        self.name = name
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit mode, so the slot is claimed in an explicit BEGIN IMMEDIATE
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10,
+                                              isolation_level=None)
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit (name TEXT PRIMARY KEY, next_slot REAL NOT NULL)'
+            )
+        return self.connection
+
+    def acquire(self):
+        """Wait for the next slot; returns False if that would exceed max_wait"""
+        with self.lock:
+            connection = self._connect()
+            # Wall-clock time, since the slot is compared across processes
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                row = connection.execute('SELECT next_slot FROM rate_limit WHERE name = ?',
+                                         (self.name,)).fetchone()
+                slot = max(now, row[0] if row else 0.0)
+                wait = slot - now
+                if wait > self.max_wait:
+                    connection.execute('ROLLBACK')
+                    return False
+                connection.execute('INSERT OR REPLACE INTO rate_limit (name, next_slot) VALUES (?, ?)',
+                                   (self.name, slot + self.min_interval))
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class GeocodeBusyError(Exception):
+    pass
+
+
+class GeocodeCache:
+    # Hits only read; their accessed_at (used for LRU eviction) is written
+    # back in one batch at most this often, or with the next put()
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counters = defaultdict(int)
+        self.connection = None
+        self.touched = {}  # query -> last hit time, not yet written
+        self.touched_at = time.time()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize(location):
+        """Fold case, punctuation and whitespace: ' New-York,  NY ' -> 'new york ny'"""
+        return ' '.join(re.sub(r'[^\w\s]', ' ', location.casefold()).split())
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS geocode_cache ('
+                'query TEXT PRIMARY KEY, result TEXT, created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS ix_geocode_cache_accessed_at ON geocode_cache (accessed_at)'
+            )
+        return self.connection
+
+    def get(self, key):
+        """Return (found, result); result is None for cached 'not found' answers"""
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT result FROM geocode_cache WHERE query = ? AND created_at > ?',
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.counters['misses'] += 1
+                return False, None
+            self.counters['hits'] += 1
+            self.touched[key] = now
+            if now - self.touched_at >= self.TOUCH_INTERVAL:
+                self._write_touched(connection, now)
+                connection.commit()
+        return True, json.loads(row[0])
+
+    def _write_touched(self, connection, now):
+        if self.touched:
+            connection.executemany('UPDATE geocode_cache SET accessed_at = ? WHERE query = ?',
+                                   [(accessed_at, query) for query, accessed_at in self.touched.items()])
+            self.touched.clear()
+        self.touched_at = now
+
+    def put(self, key, result):
+        now = time.time()
+        with self.lock:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO geocode_cache (query, result, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(result), now, now)
+            )
+            self._write_touched(connection, now)
+            # Drop expired rows, then least recently used ones past the cap
+            connection.execute('DELETE FROM geocode_cache WHERE created_at <= ?', (now - self.ttl,))
+            connection.execute(
+                'DELETE FROM geocode_cache WHERE query IN ('
+                'SELECT query FROM geocode_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            connection.commit()
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['size'] = self._connect().execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_ratio'] = round(stats.get('hits', 0) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+geocode_cache = GeocodeCache(
+    os.getenv('GEOCODE_CACHE_PATH', os.path.join(app.instance_path, 'geocode_cache.db')),
+    ttl=int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600)),
+    max_entries=int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', 10000))
+)
+nominatim_limiter = RateLimiter(
+    geocode_cache.path, 'nominatim',
+    min_interval=float(os.getenv('NOMINATIM_MIN_INTERVAL', 1.0)),
+    max_wait=float(os.getenv('NOMINATIM_MAX_WAIT', 10))
+)
+
+
+def geocode(location):
+    """Look up a location, from the cache when possible.
+
+    Returns a {'lat', 'lon', 'display_name'} dict, or None if Nominatim has no
+    match. Raises GeocodeBusyError when the upstream quota is exhausted.
+    """
+    key = GeocodeCache.normalize(location)
+    found, result = geocode_cache.get(key)
+    if found:
+        return result
+
+    if not nominatim_limiter.acquire():
+        geocode_cache.count('rate_limited')
+        raise GeocodeBusyError('Geocoding quota exhausted, try again shortly')
+
+    geocode_cache.count('upstream_calls')
+    # Use Nominatim API (free OpenStreetMap geocoding)
+    response = nominatim_client.get(
+        'https://nominatim.openstreetmap.org/search',
+        params={'q': location, 'format': 'json', 'limit': 1}
+    )
+    response.raise_for_status()
+    results = response.json()
+
+    result = None
+    if results:
+        result = {
+            'lat': float(results[0]['lat']),
+            'lon': float(results[0]['lon']),
+            'display_name': results[0]['display_name']
+        }
+    # "Not found" answers are cached too, so repeated typos don't burn quota
+    geocode_cache.put(key, result)
+    return result
+
+
 @app.route('/api/geocode', methods=['POST'])
 def geocode_location():
     """Geocode an address using Nominatim (OpenStreetMap) API"""
@@ -969,37 +3924,484 @@ def geocode_location():
         if not location:
             return jsonify({'error': 'Location is required'}), 400
         
-        # Use Nominatim API (free OpenStreetMap geocoding)
-        import urllib.parse
-        import urllib.request
-        import json
-        
-        encoded_location = urllib.parse.quote(location)
-        url = f'https://nominatim.openstreetmap.org/search?q={encoded_location}&format=json&limit=1'
-        
-        req = urllib.request.Request(
-            url,
-            headers={'User-Agent': 'MindCare-TherapistFinder/1.0'}
-        )
-        
-        with urllib.request.urlopen(req) as response:
-            results = json.loads(response.read())
+        result = geocode(location)
         
-        if not results:
+        if result is None:
             return jsonify({'error': 'Location not found'}), 404
         
-        result = results[0]
-        return jsonify({
-            'lat': float(result['lat']),
-            'lon': float(result['lon']),
-            'display_name': result['display_name']
-        })
+        return jsonify(result)
     
+    except GeocodeBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print(f"Geocoding error: {str(e)}")
         return jsonify({'error': 'Failed to geocode location'}), 500
 
 
+@app.route('/api/chat/stats')
+def chat_stats():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({
+        'limits': dict(chat_limits.counters),
+        'typing': dict(typing_tracker.counters),
+        'history': dict(chat_history.counters)
+    })
+
+
+@app.route('/api/find_therapists/stats')
+def find_therapists_stats():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(overpass_tiles.stats())
+
+
+@app.route('/api/geocode/stats')
+def geocode_stats():
+    if 'email' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(geocode_cache.stats())
+
+
+# Therapist search. The OSM tags we treat as mental health / healthcare
+# providers, as (element type, tag key, tag value).
+OVERPASS_FILTERS = [
+    ('node', 'amenity', 'doctors'),
+    ('node', 'amenity', 'clinic'),
+    ('node', 'amenity', 'hospital'),
+    ('node', 'healthcare', 'psychologist'),
+    ('node', 'healthcare', 'therapist'),
+    ('node', 'healthcare', 'counselling'),
+    ('way', 'amenity', 'doctors'),
+    ('way', 'amenity', 'clinic'),
+    ('way', 'healthcare', 'psychologist'),
+    ('way', 'healthcare', 'therapist'),
+]
+OVERPASS_URL = 'https://overpass-api.de/api/interpreter'
+
+
+def build_overpass_query(area):
+    """Overpass QL for every OVERPASS_FILTERS clause restricted to area,
+    e.g. 'around:5000,52.5,13.4' or a 'south,west,north,east' bbox"""
+    clauses = '\n'.join(
+        f'          {kind}["{key}"="{value}"]({area});' for kind, key, value in OVERPASS_FILTERS
+    )
+    return f"""
+        [out:json][timeout:25];
+        (
+{clauses}
+        );
+        out center;
+        """
+
+
+def run_overpass_query(overpass_query):
+    # Overpass queries are read-only, so they are safe to retry
+    response = overpass_client.post(OVERPASS_URL, data=overpass_query.encode('utf-8'), idempotent=True)
+    response.raise_for_status()
+    return response.json().get('elements', [])
+
+
+def radius_degrees(lat, radius):
+    """Half-height and half-width in degrees of a box around a radius in metres"""
+    return radius / 111320, radius / (111320 * max(math.cos(math.radians(lat)), 0.01))
+
+
+def element_coordinates(element):
+    """(lat, lon) of a node, or of a way's center; None if it has neither"""
+    if 'lat' in element and 'lon' in element:
+        return element['lat'], element['lon']
+    if 'center' in element:
+        return element['center']['lat'], element['center']['lon']
+    return None
+
+
+class OverpassTileCache:
+    """Overpass results cached per fixed-size lat/lon tile.
+
+    A search is answered from the tiles its circle overlaps, and only the
+    tiles not already cached are fetched, with one bbox query covering them.
+    Each element is stored in the tile containing its coordinates, so the
+    union over tiles holds every element at most once. Tiles expire after
+    ttl seconds and the least recently used are evicted past max_tiles.
+    """
+
+    def __init__(self, tile_degrees, max_tiles, ttl, max_tiles_per_search):
+        self.tile_degrees = tile_degrees
+        self.max_tiles = max_tiles
+        self.ttl = ttl
+        self.max_tiles_per_search = max_tiles_per_search
+        self.tiles = OrderedDict()  # (row, col) -> (elements, fetched_at)
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def tile_of(self, lat, lon):
+        return math.floor(lat / self.tile_degrees), math.floor(lon / self.tile_degrees)
+
+    def tiles_covering(self, lat, lon, radius):
+        """Tiles intersecting the circle of radius metres around (lat, lon)"""
+        dlat, dlon = radius_degrees(lat, radius)
+        south, west = self.tile_of(lat - dlat, lon - dlon)
+        north, east = self.tile_of(lat + dlat, lon + dlon)
+        tiles = []
+        for row in range(south, north + 1):
+            for col in range(west, east + 1):
+                # Nearest point of the tile to the centre, in degrees
+                near_lat = min(max(lat, row * self.tile_degrees), (row + 1) * self.tile_degrees)
+                near_lon = min(max(lon, col * self.tile_degrees), (col + 1) * self.tile_degrees)
+                if ((near_lat - lat) / dlat) ** 2 + ((near_lon - lon) / dlon) ** 2 <= 1:
+                    tiles.append((row, col))
+        return tiles
+
+    def search(self, lat, lon, radius):
+        """Elements near (lat, lon), deduplicated by OSM type and id"""
+        tiles = self.tiles_covering(lat, lon, radius)
+        if len(tiles) > self.max_tiles_per_search:
+            # Very large radius: a single around query beats fetching the tiles
+            self._count('bypassed')
+            return run_overpass_query(build_overpass_query(f'around:{radius},{lat},{lon}'))
+
+        cached = {}
+        now = time.monotonic()
+        with self.lock:
+            for tile in tiles:
+                entry = self.tiles.get(tile)
+                if entry is not None and now - entry[1] < self.ttl:
+                    self.tiles.move_to_end(tile)
+                    cached[tile] = entry[0]
+            self.counters['tile_hits'] += len(cached)
+            self.counters['tile_misses'] += len(tiles) - len(cached)
+
+        missing = [tile for tile in tiles if tile not in cached]
+        if missing:
+            cached.update(self._fetch(missing))
+
+        elements = {}
+        for tile in tiles:
+            for element in cached.get(tile, []):
+                elements[(element.get('type'), element.get('id'))] = element
+        return list(elements.values())
+
+    def _fetch(self, missing):
+        size = self.tile_degrees
+        south = min(row for row, _ in missing) * size
+        north = (max(row for row, _ in missing) + 1) * size
+        west = min(col for _, col in missing) * size
+        east = (max(col for _, col in missing) + 1) * size
+        self._count('upstream_queries')
+        found = run_overpass_query(build_overpass_query(f'{south},{west},{north},{east}'))
+
+        fetched = {tile: [] for tile in missing}
+        for element in found:
+            coordinates = element_coordinates(element)
+            if coordinates is None:
+                continue
+            tile = self.tile_of(*coordinates)
+            # The bbox also covers tiles we already have; keep those as they are
+            if tile in fetched:
+                fetched[tile].append(element)
+
+        now = time.monotonic()
+        with self.lock:
+            for tile, elements in fetched.items():
+                self.tiles[tile] = (elements, now)
+                self.tiles.move_to_end(tile)
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+                self.counters['evictions'] += 1
+        return fetched
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self.tiles)
+        lookups = stats.get('tile_hits', 0) + stats.get('tile_misses', 0)
+        stats['tile_hit_ratio'] = round(stats.get('tile_hits', 0) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+# 0.05 degrees is about 5.5 km north-south
+overpass_tiles = OverpassTileCache(
+    tile_degrees=float(os.getenv('OVERPASS_TILE_DEGREES', 0.05)),
+    max_tiles=int(os.getenv('OVERPASS_TILE_CACHE_MAX_TILES', 5000)),
+    ttl=int(os.getenv('OVERPASS_TILE_CACHE_TTL', 7 * 24 * 3600)),
+    max_tiles_per_search=int(os.getenv('OVERPASS_MAX_TILES_PER_SEARCH', 64))
+)
+
+
+# Offline facility index. `flask import-facilities` loads the same POIs the
+# Overpass query asks for from a local OSM extract into a SQLite table with an
+# R*Tree index, and find_therapists() can answer radius searches from it
+# (THERAPIST_FINDER_SOURCE=local, or auto to use it whenever it has data).
+OVERPASS_FILTER_SET = set(OVERPASS_FILTERS)
+
+
+def is_facility(kind, tags):
+    return any((kind, key, value) in OVERPASS_FILTER_SET for key, value in tags.items())
+
+
+def open_extract(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_osm_xml(path):
+    """Yield top-level node/way/relation elements, discarding each after use"""
+    with open_extract(path) as extract:
+        context = ElementTree.iterparse(extract, events=('start', 'end'))
+        _, root = next(context)
+        for parse_event, element in context:
+            if parse_event == 'end' and element.tag in ('node', 'way', 'relation'):
+                yield element
+                root.clear()
+
+
+def read_osm_xml(path):
+    """Yield facility nodes and ways from an OSM XML extract, Overpass-style.
+
+    Streams the file with iterparse. Ways need their nodes' coordinates for
+    a centre point, so a second pass picks up just the nodes they reference.
+    """
+    ways = []
+    needed = set()
+    for element in iter_osm_xml(path):
+        if element.tag == 'relation':
+            continue
+        tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+        if not is_facility(element.tag, tags):
+            continue
+        if element.tag == 'node':
+            yield {'type': 'node', 'id': int(element.get('id')),
+                   'lat': float(element.get('lat')), 'lon': float(element.get('lon')),
+                   'tags': tags}
+        else:
+            refs = [int(nd.get('ref')) for nd in element.iter('nd')]
+            ways.append((int(element.get('id')), tags, refs))
+            needed.update(refs)
+
+    if not ways:
+        return
+
+    locations = {}
+    for element in iter_osm_xml(path):
+        if element.tag != 'node':
+            break  # nodes always come first in OSM files
+        node_id = int(element.get('id'))
+        if node_id in needed:
+            locations[node_id] = (float(element.get('lat')), float(element.get('lon')))
+
+    for way_id, tags, refs in ways:
+        points = [locations[ref] for ref in refs if ref in locations]
+        if not points:
+            continue
+        # Centre of the bounding box, like Overpass "out center"
+        lats = [point[0] for point in points]
+        lons = [point[1] for point in points]
+        yield {'type': 'way', 'id': way_id,
+               'center': {'lat': (min(lats) + max(lats)) / 2, 'lon': (min(lons) + max(lons)) / 2},
+               'tags': tags}
+
+
+def read_overpass_json(path):
+    """Yield facility elements from a saved Overpass JSON response"""
+    with open_extract(path) as extract:
+        for element in json.load(extract).get('elements', []):
+            if is_facility(element.get('type'), element.get('tags', {})):
+                yield element
+
+
+class FacilityIndex:
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self.connection.executescript(
+                'CREATE TABLE IF NOT EXISTS facility ('
+                '  id INTEGER PRIMARY KEY,'
+                '  osm_type TEXT NOT NULL, osm_id INTEGER NOT NULL,'
+                '  lat REAL NOT NULL, lon REAL NOT NULL, tags TEXT NOT NULL,'
+                '  source TEXT NOT NULL, import_run REAL NOT NULL,'
+                '  UNIQUE (osm_type, osm_id));'
+                'CREATE INDEX IF NOT EXISTS ix_facility_source_import_run ON facility (source, import_run);'
+                'CREATE VIRTUAL TABLE IF NOT EXISTS facility_rtree USING rtree('
+                '  id, min_lat, max_lat, min_lon, max_lon);'
+            )
+        return self.connection
+
+    def import_elements(self, elements, source):
+        """Upsert elements and drop ones this source no longer contains.
+
+        Re-importing a refreshed extract only rewrites rows whose position or
+        tags changed. Returns inserted/updated/unchanged/removed counts.
+        """
+        counts = defaultdict(int)
+        run = time.time()
+        with self.lock:
+            connection = self._connect()
+            for element in elements:
+                coordinates = element_coordinates(element)
+                if coordinates is None:
+                    continue
+                lat, lon = coordinates
+                tags = json.dumps(element.get('tags', {}), sort_keys=True)
+                row = connection.execute(
+                    'SELECT id, lat, lon, tags FROM facility WHERE osm_type = ? AND osm_id = ?',
+                    (element['type'], element['id'])
+                ).fetchone()
+
+                if row is None:
+                    cursor = connection.execute(
+                        'INSERT INTO facility (osm_type, osm_id, lat, lon, tags, source, import_run) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (element['type'], element['id'], lat, lon, tags, source, run)
+                    )
+                    connection.execute('INSERT INTO facility_rtree VALUES (?, ?, ?, ?, ?)',
+                                       (cursor.lastrowid, lat, lat, lon, lon))
+                    counts['inserted'] += 1
+                    continue
+
+                if (row[1], row[2], row[3]) != (lat, lon, tags):
+                    connection.execute('UPDATE facility SET lat = ?, lon = ?, tags = ? WHERE id = ?',
+                                       (lat, lon, tags, row[0]))
+                    connection.execute(
+                        'UPDATE facility_rtree SET min_lat = ?, max_lat = ?, min_lon = ?, max_lon = ? WHERE id = ?',
+                        (lat, lat, lon, lon, row[0])
+                    )
+                    counts['updated'] += 1
+                else:
+                    counts['unchanged'] += 1
+                connection.execute('UPDATE facility SET source = ?, import_run = ? WHERE id = ?',
+                                   (source, run, row[0]))
+
+            stale = [row[0] for row in connection.execute(
+                'SELECT id FROM facility WHERE source = ? AND import_run < ?', (source, run))]
+            connection.executemany('DELETE FROM facility WHERE id = ?', [(i,) for i in stale])
+            connection.executemany('DELETE FROM facility_rtree WHERE id = ?', [(i,) for i in stale])
+            counts['removed'] = len(stale)
+            connection.commit()
+        return dict(counts)
+
+    def import_file(self, path, source=None):
+        reader = read_overpass_json if re.search(r'\.json(\.gz|\.bz2)?$', path) else read_osm_xml
+        return self.import_elements(reader(path), source or os.path.basename(path))
+
+    def has_data(self):
+        with self.lock:
+            return self._connect().execute('SELECT EXISTS (SELECT 1 FROM facility)').fetchone()[0] == 1
+
+    def search(self, lat, lon, radius):
+        """Elements within the bounding box of the search circle, Overpass-style"""
+        dlat, dlon = radius_degrees(lat, radius)
+        with self.lock:
+            rows = self._connect().execute(
+                'SELECT f.osm_type, f.osm_id, f.lat, f.lon, f.tags '
+                'FROM facility_rtree r JOIN facility f ON f.id = r.id '
+                'WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?',
+                (lat + dlat, lat - dlat, lon + dlon, lon - dlon)
+            ).fetchall()
+        return [
+            {'type': osm_type, 'id': osm_id, 'lat': element_lat, 'lon': element_lon, 'tags': json.loads(tags)}
+            for osm_type, osm_id, element_lat, element_lon, tags in rows
+        ]
+
+
+facility_index = FacilityIndex(
+    os.getenv('FACILITY_INDEX_PATH', os.path.join(app.instance_path, 'facilities.db'))
+)
+app.config['THERAPIST_FINDER_SOURCE'] = os.getenv('THERAPIST_FINDER_SOURCE', 'overpass')
+
+
+@app.cli.command('import-facilities')
+@click.argument('path')
+@click.option('--source', help='Name for this extract; defaults to the file name.')
+def import_facilities_command(path, source):
+    """Import healthcare POIs from an OSM extract into the local facility index.
+
+    PATH is an OSM XML file (.osm, .osm.gz, .osm.bz2) or a saved Overpass
+    JSON response (.json). Convert .pbf extracts first, e.g. with
+    `osmium cat extract.osm.pbf -o extract.osm`.
+    """
+    counts = facility_index.import_file(path, source)
+    click.echo(', '.join(f'{name}: {counts.get(name, 0)}'
+                         for name in ('inserted', 'updated', 'unchanged', 'removed')))
+
+
+@app.cli.command('revoke-sessions')
+@click.argument('email')
+def revoke_sessions_command(email):
+    """Log EMAIL out everywhere by deleting their server-side sessions."""
+    if not isinstance(app.session_interface, ServerSessionInterface):
+        raise click.ClickException('SESSION_STORE=cookie sessions cannot be revoked server-side')
+    user_id = db.session.query(User.id).filter_by(email=email).scalar()
+    if user_id is None:
+        raise click.ClickException(f'No user with email {email}')
+    click.echo(f'Revoked {app.session_interface.revoke_user(user_id)} session(s)')
+
+
+@app.cli.command('backfill-sentiment')
+def backfill_sentiment_command():
+    """Analyze every gratitude entry not yet stored under the current analyzer version."""
+    sentiment_backfill.pause = 0
+    click.echo(f'Analyzed {sentiment_backfill.run()} entries ({ANALYZER_VERSION})')
+
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from (lat, lon) to arrays of points"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def nearest_elements(elements, lat, lon, radius, limit=20):
+    """The limit closest elements within radius metres, nearest first.
+
+    Distances are computed for all elements in one NumPy pass and only the
+    closest limit are selected (argpartition) and sorted. Returns a list of
+    (element, lat, lon, distance_km) and the number of elements in range.
+    """
+    located = []
+    coordinates = []
+    for element in elements:
+        point = element_coordinates(element)
+        if point is not None:
+            located.append(element)
+            coordinates.append(point)
+    if not located:
+        return [], 0
+
+    points = np.array(coordinates, dtype=float)
+    distances = haversine_km(lat, lon, points[:, 0], points[:, 1])
+
+    # Cached tiles and index boxes extend past the search circle
+    in_range = np.flatnonzero(distances * 1000 <= radius)
+    if len(in_range) > limit:
+        nearest = in_range[np.argpartition(distances[in_range], limit - 1)[:limit]]
+    else:
+        nearest = in_range
+    order = nearest[np.argsort(distances[nearest], kind='stable')]
+
+    return [
+        (located[i], coordinates[i][0], coordinates[i][1], float(distances[i]))
+        for i in order
+    ], len(in_range)
+
+
 @app.route('/api/find_therapists', methods=['POST'])
 def find_therapists():
     """Find nearby therapists using Overpass API (OpenStreetMap data)"""
@@ -1015,54 +4417,22 @@ def find_therapists():
         if not lat or not lon:
             return jsonify({'error': 'Coordinates are required'}), 400
         
-        # Use Overpass API to find healthcare facilities
-        import urllib.request
-        import json
-        
-        # Query for doctors, clinics, hospitals, and psychologists
-        overpass_query = f"""
-        [out:json][timeout:25];
-        (
-          node["amenity"="doctors"](around:{radius},{lat},{lon});
-          node["amenity"="clinic"](around:{radius},{lat},{lon});
-          node["amenity"="hospital"](around:{radius},{lat},{lon});
-          node["healthcare"="psychologist"](around:{radius},{lat},{lon});
-          node["healthcare"="therapist"](around:{radius},{lat},{lon});
-          node["healthcare"="counselling"](around:{radius},{lat},{lon});
-          way["amenity"="doctors"](around:{radius},{lat},{lon});
-          way["amenity"="clinic"](around:{radius},{lat},{lon});
-          way["healthcare"="psychologist"](around:{radius},{lat},{lon});
-          way["healthcare"="therapist"](around:{radius},{lat},{lon});
-        );
-        out center;
-        """
-        
-        url = 'https://overpass-api.de/api/interpreter'
-        data_encoded = overpass_query.encode('utf-8')
+        lat, lon, radius = float(lat), float(lon), float(radius)
         
-        req = urllib.request.Request(
-            url,
-            data=data_encoded,
-            headers={'User-Agent': 'MindCare-TherapistFinder/1.0'}
-        )
+        # Healthcare facilities from OpenStreetMap: the local index if
+        # configured, otherwise Overpass via the tile cache
+        source = app.config['THERAPIST_FINDER_SOURCE']
+        if source == 'local' or (source == 'auto' and facility_index.has_data()):
+            elements = facility_index.search(lat, lon, radius)
+        else:
+            elements = overpass_tiles.search(lat, lon, radius)
         
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = json.loads(response.read())
+        nearest, count = nearest_elements(elements, lat, lon, radius)
         
         therapists = []
-        for element in result.get('elements', []):
+        for element, element_lat, element_lon, distance in nearest:
             tags = element.get('tags', {})
             
-            # Get coordinates
-            if 'lat' in element and 'lon' in element:
-                element_lat = element['lat']
-                element_lon = element['lon']
-            elif 'center' in element:
-                element_lat = element['center']['lat']
-                element_lon = element['center']['lon']
-            else:
-                continue
-            
             # Extract relevant information
             name = tags.get('name', 'Unnamed Healthcare Facility')
             amenity = tags.get('amenity', tags.get('healthcare', 'healthcare'))
@@ -1071,20 +4441,6 @@ def find_therapists():
             phone = tags.get('phone', tags.get('contact:phone', 'N/A'))
             website = tags.get('website', tags.get('contact:website', ''))
             
-            # Calculate distance
-            from math import radians, sin, cos, sqrt, atan2
-            R = 6371  # Earth's radius in km
-            
-            lat1, lon1 = radians(lat), radians(lon)
-            lat2, lon2 = radians(element_lat), radians(element_lon)
-            
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-            c = 2 * atan2(sqrt(a), sqrt(1-a))
-            distance = R * c
-            
             therapists.append({
                 'name': name,
                 'type': amenity.replace('_', ' ').title(),
@@ -1096,12 +4452,9 @@ def find_therapists():
                 'distance': round(distance, 2)
             })
         
-        # Sort by distance
-        therapists.sort(key=lambda x: x['distance'])
-        
         return jsonify({
-            'therapists': therapists[:20],  # Limit to 20 results
-            'count': len(therapists)
+            'therapists': therapists,
+            'count': count
         })
     
     except Exception as e:
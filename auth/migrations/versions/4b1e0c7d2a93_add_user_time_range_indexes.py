@@ -0,0 +1,51 @@
+"""add per-user time range indexes
+
+Revision ID: 4b1e0c7d2a93
+Revises: 
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1e0c7d2a93'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('gratitude_entry', 'ix_gratitude_entry_user_id_date_created', ['user_id', 'date_created']),
+    ('gratitude_entry', 'ix_gratitude_entry_user_id_mood_date_created', ['user_id', 'mood', 'date_created']),
+    ('mood_entry', 'ix_mood_entry_user_id_date_created', ['user_id', 'date_created']),
+    ('room', 'ix_room_user_id_created_at', ['user_id', 'created_at']),
+]
+
+
+def _existing_indexes():
+    # This is the first tracked revision, and databases in the wild were
+    # created with db.create_all(), so only touch tables and indexes that
+    # are actually there.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    return tables, {
+        (table, index['name'])
+        for table in tables
+        for index in inspector.get_indexes(table)
+    }
+
+
+def upgrade():
+    tables, indexes = _existing_indexes()
+    for table, name, columns in INDEXES:
+        if table in tables and (table, name) not in indexes:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    tables, indexes = _existing_indexes()
+    for table, name, columns in reversed(INDEXES):
+        if (table, name) in indexes:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,58 @@
+"""store sentiment analysis on gratitude_entry
+
+Revision ID: 5e7b1d94a2c8
+Revises: c4a8e2f71b06
+Create Date: 2026-10-18 21:03:17.640592
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7b1d94a2c8'
+down_revision = 'c4a8e2f71b06'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    sa.Column('sentiment', sa.String(length=3), nullable=True),
+    sa.Column('stress_level', sa.String(length=10), nullable=True),
+    sa.Column('positive_score', sa.Float(), nullable=True),
+    sa.Column('negative_score', sa.Float(), nullable=True),
+    sa.Column('stress_score', sa.Float(), nullable=True),
+    sa.Column('analyzer_version', sa.String(length=32), nullable=True),
+]
+
+
+def _existing_columns():
+    inspector = sa.inspect(op.get_bind())
+    if 'gratitude_entry' not in inspector.get_table_names():
+        return None
+    return {column['name'] for column in inspector.get_columns('gratitude_entry')}
+
+
+def upgrade():
+    # Existing rows are left NULL; the app's sentiment backfill (or
+    # `flask backfill-sentiment`) analyzes them
+    existing = _existing_columns()
+    if existing is None:
+        return
+    for column in COLUMNS:
+        if column.name not in existing:
+            op.add_column('gratitude_entry', column)
+
+
+def downgrade():
+    # Plain DROP COLUMN (SQLite 3.35+) rather than a batch table rebuild,
+    # which would lose the full-text search triggers and break its view
+    existing = _existing_columns()
+    if existing is None:
+        return
+    for column in reversed(COLUMNS):
+        if column.name in existing:
+            if op.get_bind().dialect.name == 'sqlite':
+                op.execute(f'ALTER TABLE gratitude_entry DROP COLUMN {column.name}')
+            else:
+                op.drop_column('gratitude_entry', column.name)
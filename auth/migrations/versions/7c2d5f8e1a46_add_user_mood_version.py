@@ -0,0 +1,40 @@
+"""add user.mood_version for the mood aggregate cache
+
+Revision ID: 7c2d5f8e1a46
+Revises: 5e7b1d94a2c8
+Create Date: 2026-10-18 23:12:48.207315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d5f8e1a46'
+down_revision = '5e7b1d94a2c8'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns():
+    inspector = sa.inspect(op.get_bind())
+    if 'user' not in inspector.get_table_names():
+        return None
+    return {column['name'] for column in inspector.get_columns('user')}
+
+
+def upgrade():
+    existing = _existing_columns()
+    if existing is None or 'mood_version' in existing:
+        return
+    op.add_column('user', sa.Column('mood_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    existing = _existing_columns()
+    if existing is None or 'mood_version' not in existing:
+        return
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('ALTER TABLE user DROP COLUMN mood_version')
+    else:
+        op.drop_column('user', 'mood_version')
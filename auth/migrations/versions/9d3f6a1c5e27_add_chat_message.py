@@ -0,0 +1,37 @@
+"""add chat_message for room history
+
+Revision ID: 9d3f6a1c5e27
+Revises: 4b1e0c7d2a93
+Create Date: 2026-10-18 14:37:05.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f6a1c5e27'
+down_revision = '4b1e0c7d2a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() may already have created it
+    if 'chat_message' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'chat_message',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('room', sa.String(length=100), nullable=False),
+        sa.Column('username', sa.String(length=100), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_chat_message_room_created_at', 'chat_message', ['room', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_chat_message_room_created_at', table_name='chat_message')
+    op.drop_table('chat_message')
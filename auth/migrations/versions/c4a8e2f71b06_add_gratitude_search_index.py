@@ -0,0 +1,69 @@
+"""add full-text search index over gratitude_entry.content
+
+Revision ID: c4a8e2f71b06
+Revises: 9d3f6a1c5e27
+Create Date: 2026-10-18 19:12:44.318206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f71b06'
+down_revision = '9d3f6a1c5e27'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_DDL = [
+    "CREATE VIEW IF NOT EXISTS gratitude_fts_source AS "
+    "SELECT id, content, 'u' || user_id AS owner FROM gratitude_entry",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS gratitude_fts USING fts5("
+    "content, owner, content='gratitude_fts_source', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS gratitude_fts_ai AFTER INSERT ON gratitude_entry BEGIN "
+    "INSERT INTO gratitude_fts(rowid, content, owner) VALUES (new.id, new.content, 'u' || new.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS gratitude_fts_ad AFTER DELETE ON gratitude_entry BEGIN "
+    "INSERT INTO gratitude_fts(gratitude_fts, rowid, content, owner) "
+    "VALUES ('delete', old.id, old.content, 'u' || old.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS gratitude_fts_au AFTER UPDATE OF content, user_id ON gratitude_entry BEGIN "
+    "INSERT INTO gratitude_fts(gratitude_fts, rowid, content, owner) "
+    "VALUES ('delete', old.id, old.content, 'u' || old.user_id); "
+    "INSERT INTO gratitude_fts(rowid, content, owner) VALUES (new.id, new.content, 'u' || new.user_id); END",
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = sa.inspect(bind).get_table_names()
+    # Like the earlier revisions, only touch gratitude_entry if db.create_all()
+    # has made it; the app builds the index on first search otherwise
+    if 'gratitude_entry' not in tables:
+        return
+    if bind.dialect.name == 'mysql':
+        indexes = sa.inspect(bind).get_indexes('gratitude_entry')
+        if not any(index['name'] == 'ft_gratitude_entry_content' for index in indexes):
+            op.create_index('ft_gratitude_entry_content', 'gratitude_entry', ['content'],
+                            unique=False, mysql_prefix='FULLTEXT')
+    elif bind.dialect.name == 'sqlite':
+        # The app may already have created it on first search
+        exists = 'gratitude_fts' in tables
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+        if not exists:
+            op.execute("INSERT INTO gratitude_fts(gratitude_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'mysql':
+        if not any(index['name'] == 'ft_gratitude_entry_content'
+                   for index in sa.inspect(bind).get_indexes('gratitude_entry')):
+            return
+        op.drop_index('ft_gratitude_entry_content', table_name='gratitude_entry')
+    elif bind.dialect.name == 'sqlite':
+        for trigger in ('gratitude_fts_ai', 'gratitude_fts_ad', 'gratitude_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS gratitude_fts')
+        op.execute('DROP VIEW IF EXISTS gratitude_fts_source')
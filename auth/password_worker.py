@@ -0,0 +1,26 @@
+"""Start-up for the password hashing pool's worker processes.
+
+Kept out of app.py so the workers can import it without importing the app.
+"""
+import os
+import threading
+
+
+def init_worker(nice, parent_alive):
+    """Lower the worker's priority and exit once the app is gone.
+
+    parent_alive is the read end of a pipe whose write end only the app
+    holds, so it reads EOF when the app exits, however it exits.
+    """
+    # os.nice doesn't exist on Windows
+    if hasattr(os, 'nice'):
+        os.nice(nice)
+    threading.Thread(target=exit_on_eof, args=(parent_alive,), daemon=True).start()
+
+
+def exit_on_eof(connection):
+    try:
+        connection.recv_bytes()
+    except (EOFError, OSError):
+        pass
+    os._exit(0)
@@ -0,0 +1,73 @@
+"""Chat history persistence: a commit per message vs ChatHistory's
+write-behind batches.
+
+The baseline stores each message with db.session.add + commit, as a naive
+handle_message would. ChatHistory.add queues the message and writes it in
+executemany batches of --flush-size from a background task. The timing
+covers every message reaching the table. Also reports how long a join's
+history replay takes from a warm ring buffer and from a cold room, which
+reads the table.
+
+    python scripts/bench_chat_history.py --messages 20000
+"""
+import argparse
+import time
+from datetime import datetime
+
+from bench_common import load_app, timed
+
+
+def payload(i):
+    return {'username': f'user-{i % 7}', 'message': f'message number {i}',
+            'timestamp': datetime.utcnow().isoformat()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--baseline-messages', type=int, default=1000)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--flush-size', type=int, default=200)
+    args = parser.parse_args()
+
+    app = load_app()
+    with app.app.app_context():
+        started = time.perf_counter()
+        for i in range(args.baseline_messages):
+            message = payload(i)
+            app.db.session.add(app.ChatMessage(room=f'room-{i % args.rooms}', username=message['username'],
+                                               message=message['message'], created_at=datetime.utcnow()))
+            app.db.session.commit()
+        baseline_rate = args.baseline_messages / (time.perf_counter() - started)
+        app.ChatMessage.query.delete()
+        app.db.session.commit()
+
+    history = app.ChatHistory(capacity=50, max_rooms=1000, flush_interval=2,
+                              flush_size=args.flush_size, max_pending=args.messages)
+    started = time.perf_counter()
+    for i in range(args.messages):
+        history.add(f'room-{i % args.rooms}', payload(i))
+    while history.counters['written'] < args.messages:
+        history.flush()
+    write_behind_rate = args.messages / (time.perf_counter() - started)
+    with app.app.app_context():
+        stored = app.ChatMessage.query.count()
+    assert stored == args.messages, (stored, args.messages)
+
+    print(f'commit per message: {baseline_rate:10,.0f} msg/s')
+    print(f'write-behind:       {write_behind_rate:10,.0f} msg/s '
+          f'({args.messages:,} messages in {history.counters["flushes"]} commits)')
+
+    history.recent('room-0')
+    warm, replay = timed(lambda: history.recent('room-0'), 50)
+
+    def cold_replay():
+        history.rooms.clear()
+        return history.recent('room-0')
+
+    cold, _ = timed(cold_replay, 50)
+    print(f'join replay of {len(replay)} messages: {warm * 1e6:.0f} us warm, {cold * 1000:.2f} ms cold')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Setup shared by the bench_*.py scripts.
+
+app.py reads its configuration from the environment at import time, so
+load_app() points the database and on-disk caches at a scratch directory
+before importing it, and start_server() does the same for an app run in its
+own process. Run the scripts from auth/, e.g.
+
+    python scripts/bench_history.py --rows 100000
+"""
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACCOUNT = {'username': 'bench', 'email': 'bench@example.com', 'password': 'bench-password',
+           'name': 'Bench', 'age': '30', 'gender': 'other', 'residence': 'Here', 'field': 'Testing'}
+SERVER = (
+    'import sys; sys.path.insert(0, sys.argv[1]); import app; '
+    'kwargs = {"allow_unsafe_werkzeug": True} if app.ASYNC_MODE == "threading" else {}; '
+    'app.socketio.run(app.app, host="127.0.0.1", port=int(sys.argv[2]), log_output=False, **kwargs)'
+)
+
+
+def scratch_env(workdir, **env):
+    """Environment for an app whose database and caches live in workdir"""
+    return {
+        'DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'app.db'),
+        'SESSION_STORE': 'cookie',
+        'BCRYPT_ROUNDS': '4',
+        'GEOCODE_CACHE_PATH': os.path.join(workdir, 'geocode_cache.db'),
+        'FACILITY_INDEX_PATH': os.path.join(workdir, 'facilities.db'),
+        **env
+    }
+
+
+def load_app(**env):
+    """Import app.py against a fresh scratch directory; returns the module"""
+    workdir = tempfile.mkdtemp(prefix='mindcare-bench-')
+    os.environ.update(scratch_env(workdir, **env))
+    sys.path.insert(0, AUTH_DIR)
+    import app
+    with app.app.app_context():
+        app.db.create_all()
+    app.bench_workdir = workdir
+    return app
+
+
+def logged_in_client(app):
+    """Test client with a registered, logged-in user"""
+    client = app.app.test_client()
+    client.post('/register', data=ACCOUNT)
+    response = client.post('/login', data={'email': ACCOUNT['email'], 'password': ACCOUNT['password']})
+    if response.status_code != 302:
+        raise SystemExit(f'login failed ({response.status_code})')
+    return client
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(**env):
+    """Run the app with socketio.run in its own process on a scratch
+    directory; returns (process, base_url) once it answers"""
+    workdir = tempfile.mkdtemp(prefix='mindcare-bench-')
+    port = free_port()
+    with open(os.path.join(workdir, 'server.log'), 'w') as log:
+        # Own process group, so stop_server() also reaches the password hash workers
+        process = subprocess.Popen([sys.executable, '-c', SERVER, AUTH_DIR, str(port)],
+                                   cwd=AUTH_DIR, env={**os.environ, **scratch_env(workdir, **env)},
+                                   stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'server exited, see {log.name}')
+        try:
+            requests.get(base + '/login', timeout=1)
+            return process, base
+        except requests.RequestException:
+            time.sleep(0.2)
+    stop_server(process)
+    raise SystemExit(f'server did not start, see {log.name}')
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def register(base):
+    """Register ACCOUNT on a running server"""
+    requests.post(base + '/register', data=ACCOUNT, allow_redirects=False)
+
+
+def login_cookies(base):
+    """Session cookies for ACCOUNT on a running server"""
+    session = requests.Session()
+    session.post(base + '/login', data={'email': ACCOUNT['email'], 'password': ACCOUNT['password']},
+                 allow_redirects=False)
+    if not session.cookies:
+        raise SystemExit('login failed')
+    return session.cookies.get_dict()
+
+
+def timed(fn, repeat=5):
+    """Median wall time of fn() over repeat runs, and its last result"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
@@ -0,0 +1,145 @@
+"""Therapist search from the offline facility index vs Overpass.
+
+Writes a synthetic OSM XML extract around Berlin: --nodes nodes, every
+fifth tagged healthcare=psychologist, plus clinic ways built from untagged
+nodes. Imports it with FacilityIndex.import_file, then edits the extract
+(drops every tenth POI, the rest unchanged) and re-imports to time the
+incremental path.
+
+Searches then go through /api/find_therapists with
+THERAPIST_FINDER_SOURCE=local, and again with Overpass stubbed out:
+overpass_client.post sleeps --overpass-latency seconds and answers from
+the same elements. The Overpass path is timed cold (empty tile cache) and
+warm (every tile cached). Both sources must return the same counts.
+
+    python scripts/bench_facility_index.py --nodes 50000
+"""
+import argparse
+import gzip
+import os
+import random
+import re
+import time
+
+from bench_common import load_app, logged_in_client, timed
+
+
+def write_extract(path, nodes, seed, drop_every=0):
+    """Every fifth node is a facility; each of nodes // 50 clinic ways spans
+    three untagged nodes. With drop_every, every drop_every-th facility node
+    is written untagged, so a re-import removes it."""
+    rng = random.Random(seed)
+    with gzip.open(path, 'wt') as extract:
+        extract.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for i in range(1, nodes + 1):
+            lat, lon = 52.35 + rng.random() * 0.3, 13.1 + rng.random() * 0.6
+            facility = i % 5 == 0 and not (drop_every and i % (5 * drop_every) == 0)
+            if facility:
+                extract.write(f'<node id="{i}" lat="{lat:.7f}" lon="{lon:.7f}">'
+                              f'<tag k="healthcare" v="psychologist"/><tag k="name" v="Practice {i}"/></node>\n')
+            else:
+                extract.write(f'<node id="{i}" lat="{lat:.7f}" lon="{lon:.7f}"/>\n')
+        for way in range(nodes // 50):
+            first = way * 50 + 1
+            refs = ''.join(f'<nd ref="{ref}"/>' for ref in (first, first + 1, first + 2))
+            extract.write(f'<way id="{way + 1}">{refs}<tag k="amenity" v="clinic"/>'
+                          f'<tag k="name" v="Clinic {way + 1}"/></way>\n')
+        extract.write('</osm>\n')
+
+
+class StubOverpass:
+    """Answers Overpass bbox queries from a fixed element list after a delay"""
+
+    def __init__(self, elements, latency):
+        self.elements = elements
+        self.latency = latency
+        self.calls = 0
+
+    def post(self, url, data=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        bbox = re.search(rb'\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)', data)
+        if bbox is None:
+            return StubResponse(self.elements)
+        south, west, north, east = map(float, bbox.groups())
+        return StubResponse([
+            element for element in self.elements
+            if south <= element_point(element)[0] <= north and west <= element_point(element)[1] <= east
+        ])
+
+
+class StubResponse:
+    def __init__(self, elements):
+        self.elements = elements
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'elements': self.elements}
+
+
+def element_point(element):
+    if 'center' in element:
+        return element['center']['lat'], element['center']['lon']
+    return element['lat'], element['lon']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=50000)
+    parser.add_argument('--searches', type=int, default=20)
+    parser.add_argument('--radius', type=int, default=3000)
+    parser.add_argument('--overpass-latency', type=float, default=0.8)
+    args = parser.parse_args()
+
+    app = load_app()
+    client = logged_in_client(app)
+    extract = os.path.join(app.bench_workdir, 'berlin.osm.gz')
+
+    write_extract(extract, args.nodes, seed=7)
+    started = time.perf_counter()
+    counts = app.facility_index.import_file(extract, 'berlin')
+    print(f'import:    {time.perf_counter() - started:6.2f}s {counts}')
+    write_extract(extract, args.nodes, seed=7, drop_every=10)
+    started = time.perf_counter()
+    counts = app.facility_index.import_file(extract, 'berlin')
+    print(f're-import: {time.perf_counter() - started:6.2f}s {counts}')
+
+    rng = random.Random(11)
+    points = [(52.4 + rng.random() * 0.2, 13.2 + rng.random() * 0.4) for _ in range(args.searches)]
+
+    def search(point):
+        response = client.post('/api/find_therapists',
+                               json={'lat': point[0], 'lon': point[1], 'radius': args.radius})
+        assert response.status_code == 200, response.status_code
+        return response.get_json()['count']
+
+    def search_all():
+        return [search(point) for point in points]
+
+    app.app.config['THERAPIST_FINDER_SOURCE'] = 'local'
+    local_time, local_counts = timed(search_all, 3)
+
+    stub = StubOverpass(list(app.read_osm_xml(extract)), args.overpass_latency)
+    app.overpass_client.post = stub.post
+    app.app.config['THERAPIST_FINDER_SOURCE'] = 'overpass'
+    cold = []
+    for point in points:
+        app.overpass_tiles.tiles.clear()
+        started = time.perf_counter()
+        search(point)
+        cold.append(time.perf_counter() - started)
+    warm_time, overpass_counts = timed(search_all, 3)
+    assert local_counts == overpass_counts, (local_counts, overpass_counts)
+
+    print(f'{args.searches} searches, radius {args.radius} m, '
+          f'{sum(local_counts) / len(local_counts):.0f} facilities in range on average')
+    print(f'local index:            {local_time / args.searches * 1000:8.2f} ms per search')
+    print(f'overpass, cold tiles:   {sum(cold) / len(cold) * 1000:8.2f} ms per search '
+          f'(stub latency {args.overpass_latency * 1000:.0f} ms)')
+    print(f'overpass, cached tiles: {warm_time / args.searches * 1000:8.2f} ms per search')
+
+
+if __name__ == '__main__':
+    main()
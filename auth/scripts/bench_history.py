@@ -0,0 +1,105 @@
+"""Mood and gratitude history: whole-history loads vs SQL aggregates and
+keyset pages.
+
+Seeds --rows mood entries and --rows gratitude entries for one user into a
+scratch SQLite database. The "old" columns reproduce what the endpoints did
+before: load every ORM row, average in Python and serialize the lot. The
+"new" columns call the current endpoints.
+
+    python scripts/bench_history.py --rows 100000
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from bench_common import load_app, logged_in_client, timed
+
+
+def seed(app, user_id, rows):
+    rng = random.Random(4)
+    now = datetime.utcnow()
+    moods = ['happy', 'calm', 'grateful', 'tired', 'anxious']
+    with app.app.app_context():
+        for start in range(0, rows, 10000):
+            count = min(10000, rows - start)
+            app.db.session.execute(app.MoodEntry.__table__.insert(), [{
+                'user_id': user_id, 'mood_score': rng.randint(1, 10), 'energy_level': rng.randint(1, 10),
+                'sleep_quality': rng.randint(1, 10), 'stress_level': rng.randint(1, 10),
+                'date_created': now - timedelta(minutes=5 * (start + i))
+            } for i in range(count)])
+            # Stored as already analyzed so the sentiment backfill stays idle
+            app.db.session.execute(app.GratitudeEntry.__table__.insert(), [{
+                'user_id': user_id, 'content': f'Grateful for small thing number {start + i}',
+                'mood': rng.choice(moods), 'date_created': now - timedelta(minutes=5 * (start + i)),
+                'sentiment': 'POS', 'stress_level': 'Low', 'positive_score': 1.0, 'negative_score': 0.0,
+                'stress_score': 0.0, 'analyzer_version': app.ANALYZER_VERSION
+            } for i in range(count)])
+        app.db.session.commit()
+
+
+def old_progress_data(app, user_id, days):
+    """The original get_progress_data body, minus the request plumbing"""
+    with app.app.app_context():
+        return _old_progress_data(app, user_id, days)
+
+
+def _old_progress_data(app, user_id, days):
+    start_date = datetime.utcnow() - timedelta(days=days)
+    entries = app.MoodEntry.query.filter(
+        app.MoodEntry.user_id == user_id,
+        app.MoodEntry.date_created >= start_date
+    ).order_by(app.MoodEntry.date_created.asc()).all()
+    averages = {
+        name: round(sum(getattr(e, column) for e in entries) / len(entries), 1)
+        for name, column in (('mood', 'mood_score'), ('energy', 'energy_level'),
+                             ('sleep', 'sleep_quality'), ('stress', 'stress_level'))
+    }
+    return json.dumps({'entries': [e.to_dict() for e in entries],
+                       'insights': {'averages': averages, 'total_entries': len(entries)}})
+
+
+def old_gratitude(app, user_id):
+    """The original gratitude() query: every entry, newest first"""
+    with app.app.app_context():
+        entries = app.GratitudeEntry.query.filter_by(user_id=user_id) \
+            .order_by(app.GratitudeEntry.date_created.desc()).all()
+        return json.dumps([e.to_dict() for e in entries])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=3650)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = load_app()
+    client = logged_in_client(app)
+    with app.app.app_context():
+        user_id = app.User.query.one().id
+    seed(app, user_id, args.rows)
+    print(f'seeded {args.rows} mood and {args.rows} gratitude rows into {app.bench_workdir}')
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+        return response.data
+
+    # First call builds the per-user mood aggregates; time the warm path
+    get(f'/progress_tracker/data?days={args.days}')
+    cases = [
+        ('progress data', lambda: old_progress_data(app, user_id, args.days),
+         lambda: get(f'/progress_tracker/data?days={args.days}')),
+        ('gratitude history', lambda: old_gratitude(app, user_id),
+         lambda: get('/gratitude?format=json')),
+    ]
+    print(f'{"":20} {"old s":>8} {"old bytes":>12} {"new s":>8} {"new bytes":>10}')
+    for name, old, new in cases:
+        old_time, old_body = timed(old, args.repeat)
+        new_time, new_body = timed(new, args.repeat)
+        print(f'{name:20} {old_time:8.3f} {len(old_body):12,} {new_time:8.3f} {len(new_body):10,}')
+
+
+if __name__ == '__main__':
+    main()
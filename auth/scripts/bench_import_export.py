@@ -0,0 +1,78 @@
+"""Bulk journal import and streaming export at scale.
+
+Imports --rows gratitude entries through import_records (the batched
+executemany path behind /gratitude/import), then streams them back out of
+/gratitude/export as NDJSON and CSV. The baseline is the per-row
+db.session.add + commit the app used before, measured on --baseline-rows
+and extrapolated. Peak memory is what tracemalloc saw while each step ran.
+
+    python scripts/bench_import_export.py --rows 1000000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bench_common import load_app, logged_in_client
+
+
+def traced(fn):
+    """(seconds, peak traced bytes, result) of fn()"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn()
+        return time.perf_counter() - started, tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+
+def records(count):
+    base = datetime(2020, 1, 1)
+    for i in range(count):
+        yield {'content': f'Grateful for thing number {i} today', 'mood': 'happy' if i % 3 else 'calm',
+               'date_created': (base + timedelta(minutes=i)).isoformat()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--baseline-rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = load_app()
+    client = logged_in_client(app)
+    with app.app.app_context():
+        user_id = app.User.query.one().id
+
+        started = time.perf_counter()
+        for record in records(args.baseline_rows):
+            app.db.session.add(app.GratitudeEntry(user_id=user_id, content=record['content'], mood=record['mood']))
+            app.db.session.commit()
+        baseline_rate = args.baseline_rows / (time.perf_counter() - started)
+        app.GratitudeEntry.query.delete()
+        app.db.session.commit()
+
+        elapsed, peak, imported = traced(lambda: app.import_records(
+            app.GratitudeEntry, app.gratitude_import_row, user_id, records(args.rows)))
+    print(f'per-row add+commit: {baseline_rate:,.0f} rows/s '
+          f'(~{args.rows / baseline_rate / 3600:.1f} h for {args.rows:,})')
+    print(f'import_records:     {imported:,} rows in {elapsed:.1f}s '
+          f'({imported / elapsed:,.0f} rows/s), peak {peak / 1e6:.1f} MB')
+
+    for fmt in ('ndjson', 'csv'):
+        def export():
+            response = client.get(f'/gratitude/export?format={fmt}', buffered=False)
+            assert response.status_code == 200, response.status_code
+            size = 0
+            for chunk in response.response:
+                size += len(chunk)
+            response.close()
+            return size
+
+        elapsed, peak, size = traced(export)
+        print(f'export {fmt:6}:      {size / 1e6:,.0f} MB in {elapsed:.1f}s, peak {peak / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
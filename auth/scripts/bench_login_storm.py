@@ -0,0 +1,116 @@
+"""Chat latency while the server is busy hashing passwords.
+
+Runs the app in a separate process at the production BCRYPT_ROUNDS, measures
+the round trip of a chat message echoed back to its sender while idle, then
+again while --threads clients hammer /login for --seconds from another
+process. Compare hashing inline in the request (PASSWORD_HASH_WORKERS=0)
+against the process pool:
+
+    python scripts/bench_login_storm.py --workers 0
+    python scripts/bench_login_storm.py --mode gevent
+"""
+import argparse
+import multiprocessing
+import statistics
+import sys
+import threading
+import time
+
+import requests
+import socketio
+
+from bench_common import ACCOUNT, register, start_server, stop_server
+
+
+def login_storm(base, threads, seconds, results):
+    """POST /login from `threads` threads until `seconds` have passed"""
+    deadline = time.monotonic() + seconds
+    latencies = []
+    logins = [0]
+
+    def worker():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = requests.post(base + '/login', allow_redirects=False, data={
+                'email': ACCOUNT['email'], 'password': ACCOUNT['password']
+            })
+            latencies.append(time.perf_counter() - started)
+            if response.status_code == 302:
+                logins[0] += 1
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    results.put((logins[0], statistics.median(latencies)))
+
+
+def chat_latency(base, seconds, interval=0.05):
+    """Round trip times of messages sent to a room this client has joined"""
+    client = socketio.Client()
+    echoed = threading.Event()
+    client.on('message', lambda data: echoed.set())
+    client.connect(base, transports=['polling'])
+    client.emit('join', {'room': 'bench', 'username': 'bench'})
+    time.sleep(0.3)
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        echoed.clear()
+        started = time.perf_counter()
+        client.emit('message', {'room': 'bench', 'message': 'ping'})
+        if not echoed.wait(5):
+            raise SystemExit('no echo within 5s')
+        latencies.append(time.perf_counter() - started)
+        time.sleep(interval)
+    client.disconnect()
+    return latencies
+
+
+def percentile(values, fraction):
+    return sorted(values)[max(0, int(len(values) * fraction) - 1)] * 1000
+
+
+def summary(latencies):
+    return (f'p50 {percentile(latencies, 0.5):.0f}ms p95 {percentile(latencies, 0.95):.0f}ms '
+            f'max {max(latencies) * 1000:.0f}ms')
+
+
+def run(args):
+    env = {'SOCKETIO_ASYNC_MODE': args.mode, 'BCRYPT_ROUNDS': str(args.rounds),
+           # One sender pinging every 50ms would trip the per-connection limits
+           'CHAT_SID_RATE': '1000', 'CHAT_SID_BURST': '1000'}
+    if args.workers is not None:
+        env['PASSWORD_HASH_WORKERS'] = str(args.workers)
+    process, base = start_server(**env)
+    try:
+        register(base)
+        idle = chat_latency(base, 3)
+        results = multiprocessing.Queue()
+        storm = multiprocessing.Process(target=login_storm,
+                                        args=(base, args.threads, args.seconds, results))
+        storm.start()
+        time.sleep(1)
+        busy = chat_latency(base, max(1, args.seconds - 2))
+        logins, login_p50 = results.get()
+        storm.join()
+    finally:
+        stop_server(process)
+
+    workers = 'default' if args.workers is None else args.workers
+    print(f'mode={args.mode} workers={workers} rounds={args.rounds}')
+    print(f'  chat idle:   {summary(idle)}')
+    print(f'  chat busy:   {summary(busy)}  ({args.threads} login threads)')
+    print(f'  logins:      {logins} in {args.seconds}s, p50 {login_p50 * 1000:.0f}ms')
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['threading', 'gevent', 'eventlet'], default='threading')
+    parser.add_argument('--workers', type=int, help='PASSWORD_HASH_WORKERS (0 hashes inline)')
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_ROUNDS')
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--seconds', type=int, default=8)
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,105 @@
+"""Chat presence under a mass disconnect.
+
+Fills a presence store with --rooms private rooms (one per user, as
+/join_room creates them), with every fifth user also in a shared lobby. It
+then disconnects --disconnects random users. Compares the original
+handle_disconnect scan over every live room with MemoryPresence's reverse
+sid -> rooms index and with SQLitePresence.
+
+The scan is too slow to run in full at 50k rooms. It runs
+--scan-disconnects of them, and the total is extrapolated. All stores
+are checked against each other on a smaller run first.
+
+    python scripts/bench_presence.py --rooms 50000 --disconnects 10000
+"""
+import argparse
+import os
+import random
+import time
+from collections import defaultdict
+
+from bench_common import load_app
+
+
+class ScanPresence:
+    """The original active_users dict and disconnect loop"""
+
+    def __init__(self):
+        self.rooms = defaultdict(dict)
+
+    def join(self, room, sid, username):
+        self.rooms[room][sid] = username
+        return len(self.rooms[room])
+
+    def count(self, room):
+        return len(self.rooms.get(room, ()))
+
+    def leave_all(self, sid):
+        left = []
+        for room, users in list(self.rooms.items()):
+            username = users.pop(sid, None)
+            if username:
+                left.append((room, username, len(users)))
+            if not users:
+                self.rooms.pop(room, None)
+        return left
+
+
+def populate(presence, rooms):
+    sids = []
+    for i in range(rooms):
+        sid = f'sid-{i}'
+        presence.join(f'room-{i}', sid, f'user-{i}')
+        if i % 5 == 0:
+            presence.join('lobby', sid, f'user-{i}')
+        sids.append(sid)
+    return sids
+
+
+def disconnect(presence, sids):
+    started = time.perf_counter()
+    departures = [sorted(presence.leave_all(sid)) for sid in sids]
+    return time.perf_counter() - started, departures
+
+
+def check_equivalent(app, workdir, rooms=2000, disconnects=500):
+    stores = [ScanPresence(), app.MemoryPresence(), app.SQLitePresence(os.path.join(workdir, 'check.db'))]
+    results = []
+    for presence in stores:
+        sids = populate(presence, rooms)
+        victims = random.Random(2).sample(sids, disconnects)
+        _, departures = disconnect(presence, victims)
+        counts = [presence.count(f'room-{i}') for i in range(rooms)] + [presence.count('lobby')]
+        results.append((departures, counts))
+    assert all(result == results[0] for result in results[1:]), 'presence stores disagree'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rooms', type=int, default=50000)
+    parser.add_argument('--disconnects', type=int, default=10000)
+    parser.add_argument('--scan-disconnects', type=int, default=200)
+    args = parser.parse_args()
+
+    app = load_app()
+    check_equivalent(app, app.bench_workdir)
+    print('scan, memory and sqlite presence agree on 2,000 rooms / 500 disconnects')
+    print(f'{args.rooms:,} rooms, {args.disconnects:,} disconnects')
+
+    stores = [
+        ('scan all rooms', ScanPresence(), args.scan_disconnects),
+        ('memory, reverse index', app.MemoryPresence(), args.disconnects),
+        ('sqlite, reverse index', app.SQLitePresence(os.path.join(app.bench_workdir, 'presence.db')), args.disconnects),
+    ]
+    for name, presence, count in stores:
+        sids = populate(presence, args.rooms)
+        victims = random.Random(2).sample(sids, count)
+        elapsed, _ = disconnect(presence, victims)
+        per_disconnect = elapsed / count
+        note = f' (extrapolated from {count:,})' if count < args.disconnects else ''
+        print(f'{name:22} {per_disconnect * args.disconnects:9.3f} s total, '
+              f'{per_disconnect * 1e6:10.1f} us per disconnect{note}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Gratitude search: LIKE scans vs the FTS5 index.
+
+Generates a synthetic journal corpus with a Zipfian vocabulary: one heavy
+user with --heavy-rows entries and --users typical users with
+--rows-per-user each. A few common words and one rare word are mixed in so
+there are queries of every selectivity. The corpus is loaded into a
+scratch SQLite database. Each query is then timed (median, first page)
+three ways:
+- an ILIKE scan
+- an FTS5 MATCH joined back and filtered on user_id
+- the owner-token MATCH that /gratitude/search uses
+
+It also reports the index build time and what the sync triggers add to a
+bulk import.
+
+    python scripts/bench_search.py
+    python scripts/bench_search.py --ndjson corpus.ndjson   # just write the corpus
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from bench_common import load_app, timed
+
+COMMON_WORDS = ['walk', 'family', 'coffee', 'sunshine', 'friends', 'music', 'garden', 'dinner']
+RARE_WORD = 'zeppelin'
+QUERIES = [
+    ('heavy', 'walk'), ('heavy', RARE_WORD), ('heavy', 'coffee garden'), ('heavy', 'wal*'),
+    ('typical', 'walk'), ('typical', RARE_WORD), ('typical', 'w5 sunshine'),
+]
+
+
+class Corpus:
+    """Reproducible synthetic entries; the same seed gives the same corpus"""
+
+    def __init__(self, seed=23, vocabulary=20000):
+        self.rng = random.Random(seed)
+        self.vocab = [f'w{i}' for i in range(vocabulary)]
+        self.cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(vocabulary)))
+
+    def sentence(self):
+        words = self.rng.choices(self.vocab, cum_weights=self.cum_weights, k=self.rng.randint(8, 30))
+        if self.rng.random() < 0.3:
+            words[self.rng.randrange(len(words))] = self.rng.choice(COMMON_WORDS)
+        if self.rng.random() < 0.0005:
+            words.append(RARE_WORD)
+        return ' '.join(words)
+
+    def entries(self, owners, start=datetime(2020, 1, 1)):
+        for i, user_id in enumerate(owners):
+            yield {'user_id': user_id, 'content': self.sentence(), 'mood': 'happy',
+                   'date_created': start + timedelta(minutes=i)}
+
+    def owners(self, heavy_rows, users, rows_per_user):
+        """User 1 is the heavy user; typical users are 2..users+1, interleaved"""
+        owners = [1] * heavy_rows + [u for u in range(2, users + 2) for _ in range(rows_per_user)]
+        self.rng.shuffle(owners)
+        return owners
+
+
+def write_ndjson(path, corpus, owners):
+    with open(path, 'w') as out:
+        for entry in corpus.entries(owners):
+            out.write(json.dumps({**entry, 'date_created': entry['date_created'].isoformat()}) + '\n')
+
+
+def load(app, corpus, owners, batch_size=20000):
+    table = app.GratitudeEntry.__table__
+    batch = []
+    for entry in corpus.entries(owners):
+        batch.append(entry)
+        if len(batch) == batch_size:
+            app.db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        app.db.session.execute(table.insert(), batch)
+    app.db.session.commit()
+
+
+def searches(app):
+    def like(user_id, terms, limit):
+        query = app.GratitudeEntry.query.filter_by(user_id=user_id)
+        for word, _ in terms:
+            query = query.filter(app.GratitudeEntry.content.ilike(f'%{word}%'))
+        return query.order_by(app.GratitudeEntry.date_created.desc()).limit(limit).all()
+
+    def join_filter(user_id, terms, limit):
+        match = ' '.join(f'"{word}"' + ('*' if prefix else '') for word, prefix in terms)
+        return app.db.session.execute(app.text(
+            'SELECT e.id, bm25(gratitude_fts) AS rank FROM gratitude_fts '
+            'JOIN gratitude_entry e ON e.id = gratitude_fts.rowid '
+            'WHERE gratitude_fts MATCH :q AND e.user_id = :u ORDER BY rank LIMIT :l'
+        ), {'q': match, 'u': user_id, 'l': limit}).all()
+
+    def owner_token(user_id, terms, limit):
+        return app.gratitude_search.search(user_id, terms, 0, limit)
+
+    return [('LIKE scan', like), ('FTS + user_id', join_filter), ('FTS owner token', owner_token)]
+
+
+def import_seconds(app, corpus, user_id, rows):
+    records = [{'content': corpus.sentence(), 'mood': 'happy'} for _ in range(rows)]
+    started = time.perf_counter()
+    app.import_records(app.GratitudeEntry, app.gratitude_import_row, user_id, iter(records))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--heavy-rows', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=800)
+    parser.add_argument('--rows-per-user', type=int, default=1000)
+    parser.add_argument('--import-rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--ndjson', help='write the corpus to this file and exit')
+    args = parser.parse_args()
+
+    corpus = Corpus()
+    owners = corpus.owners(args.heavy_rows, args.users, args.rows_per_user)
+    if args.ndjson:
+        write_ndjson(args.ndjson, corpus, owners)
+        print(f'wrote {len(owners):,} entries to {args.ndjson}')
+        return
+
+    app = load_app()
+    with app.app.app_context():
+        started = time.perf_counter()
+        load(app, corpus, owners)
+        print(f'loaded {len(owners):,} entries in {time.perf_counter() - started:.1f}s')
+        started = time.perf_counter()
+        app.gratitude_search.ensure()
+        print(f'FTS5 index build: {time.perf_counter() - started:.1f}s')
+
+        with_triggers = import_seconds(app, corpus, args.users + 2, args.import_rows)
+        trigger = next(ddl for ddl in app.SQLiteGratitudeSearch.DDL if 'gratitude_fts_ai ' in ddl)
+        app.db.session.execute(app.text('DROP TRIGGER gratitude_fts_ai'))
+        app.db.session.commit()
+        without_triggers = import_seconds(app, corpus, args.users + 3, args.import_rows)
+        app.db.session.execute(app.text(trigger))
+        app.db.session.commit()
+        print(f'import {args.import_rows:,} rows: {with_triggers:.2f}s with index triggers, '
+              f'{without_triggers:.2f}s without')
+
+        methods = searches(app)
+        print(f'{"query":24}' + ''.join(f'{name:>22}' for name, _ in methods))
+        for who, query in QUERIES:
+            user_id = 1 if who == 'heavy' else 2 + args.users // 2
+            terms = app.parse_search_terms(query)
+            cells = []
+            for _, search in methods:
+                search(user_id, terms, 21)
+                seconds, rows = timed(lambda: search(user_id, terms, 21), args.repeat)
+                cells.append(f'{seconds * 1000:9.2f} ms ({len(rows):2})')
+            print(f'{who + ": " + query:24}' + ''.join(f'{cell:>22}' for cell in cells))
+    print(f'database size: {os.path.getsize(os.path.join(app.bench_workdir, "app.db")) / 1e6:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
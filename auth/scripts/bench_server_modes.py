@@ -0,0 +1,105 @@
+"""Load test for the server modes selected by SOCKETIO_ASYNC_MODE.
+
+Starts a stub VoiceFlow that answers after --upstream-delay seconds, runs
+the app against it in a separate process, and fires --concurrency
+simultaneous /mood_journal/interact calls. Reports how many succeeded, the
+wall time and the server's peak RSS against --rss-budget-mb.
+
+    python scripts/bench_server_modes.py --mode gevent --concurrency 500
+    python scripts/bench_server_modes.py --mode threading --concurrency 500
+
+Needs gevent for the client side, whatever mode the server runs in.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import sys
+import time
+
+import gevent
+import requests
+from gevent.pywsgi import WSGIServer
+
+from bench_common import free_port, login_cookies, register, start_server, stop_server
+
+
+def start_stub_upstream(port, delay):
+    """Fake VoiceFlow interact endpoint, served from this process"""
+    body = json.dumps([{'type': 'text', 'payload': {'message': 'hi'}}]).encode()
+
+    def application(environ, start_response):
+        gevent.sleep(delay)
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [body]
+
+    server = WSGIServer(('127.0.0.1', port), application, log=None, backlog=4096)
+    server.start()
+    return server
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS'):
+                return int(line.split()[1])
+    return 0
+
+
+def run(args):
+    upstream_port = free_port()
+    upstream = start_stub_upstream(upstream_port, args.upstream_delay)
+    process, base = start_server(SOCKETIO_ASYNC_MODE=args.mode,
+                                 VOICEFLOW_BASE_URL=f'http://127.0.0.1:{upstream_port}/state/user')
+    try:
+        register(base)
+        cookies = login_cookies(base)
+        peak = [rss_kb(process.pid)]
+
+        def monitor():
+            while True:
+                peak[0] = max(peak[0], rss_kb(process.pid))
+                gevent.sleep(0.1)
+
+        results = {'ok': 0, 'failed': 0}
+
+        def call():
+            try:
+                response = requests.post(base + '/mood_journal/interact', json={'message': 'hello'},
+                                         cookies=cookies, timeout=args.timeout)
+                ok = response.ok and response.json().get('response') == 'hi'
+            except requests.RequestException:
+                ok = False
+            results['ok' if ok else 'failed'] += 1
+
+        watcher = gevent.spawn(monitor)
+        started = time.perf_counter()
+        gevent.joinall([gevent.spawn(call) for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+        watcher.kill()
+    finally:
+        stop_server(process)
+        upstream.stop()
+
+    peak_mb = peak[0] / 1024
+    within = peak_mb <= args.rss_budget_mb
+    print(f'mode={args.mode} concurrency={args.concurrency} upstream_delay={args.upstream_delay}s')
+    print(f'ok={results["ok"]} failed={results["failed"]} wall={elapsed:.1f}s '
+          f'peak_rss={peak_mb:.0f}MB budget={args.rss_budget_mb}MB '
+          f'{"within" if within else "OVER"} budget')
+    return 0 if within and not results['failed'] else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--mode', default='gevent', choices=['threading', 'gevent', 'eventlet'])
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--upstream-delay', type=float, default=2.0, help='seconds the stub VoiceFlow waits')
+    parser.add_argument('--rss-budget-mb', type=int, default=256)
+    parser.add_argument('--timeout', type=float, default=120)
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Therapist result ranking: the original per-element loop vs
+nearest_elements().
+
+Builds --elements synthetic Overpass elements (nodes, plus ways that only
+carry a center) scattered around Berlin. It ranks them for one search with
+the loop find_therapists used to run: scalar haversine, a dict for every
+element and a full sort. It then ranks them with the NumPy pipeline plus the
+dicts for the 20 results. Both must agree on the count and the distances.
+
+    python scripts/bench_therapist_ranking.py --elements 10000
+"""
+import argparse
+import random
+from math import atan2, cos, radians, sin, sqrt
+
+from bench_common import load_app, timed
+
+
+def synthetic_elements(count, seed=9):
+    rng = random.Random(seed)
+    elements = []
+    for i in range(count):
+        lat, lon = 52.3 + rng.random() * 0.4, 13.1 + rng.random() * 0.6
+        tags = {'name': f'Practice {i}', 'amenity': rng.choice(['clinic', 'doctors', 'hospital']),
+                'addr:street': f'Street {i}', 'addr:city': 'Berlin', 'phone': '+49 30 000000'}
+        if i % 5:
+            elements.append({'type': 'node', 'id': i, 'lat': lat, 'lon': lon, 'tags': tags})
+        else:
+            elements.append({'type': 'way', 'id': i, 'center': {'lat': lat, 'lon': lon}, 'tags': tags})
+    return elements
+
+
+def therapist(tags, element_lat, element_lon, distance):
+    address, city = tags.get('addr:street', ''), tags.get('addr:city', '')
+    return {
+        'name': tags.get('name', 'Unnamed Healthcare Facility'),
+        'type': tags.get('amenity', tags.get('healthcare', 'healthcare')).replace('_', ' ').title(),
+        'address': f"{address}, {city}" if address and city else address or city or 'Address not available',
+        'phone': tags.get('phone', tags.get('contact:phone', 'N/A')),
+        'website': tags.get('website', tags.get('contact:website', '')),
+        'lat': element_lat,
+        'lon': element_lon,
+        'distance': round(distance, 2)
+    }
+
+
+def old_ranking(elements, lat, lon, radius):
+    """The original loop; the radius check stands in for Overpass' around filter"""
+    therapists = []
+    for element in elements:
+        if 'lat' in element and 'lon' in element:
+            element_lat, element_lon = element['lat'], element['lon']
+        elif 'center' in element:
+            element_lat, element_lon = element['center']['lat'], element['center']['lon']
+        else:
+            continue
+        lat1, lon1 = radians(lat), radians(lon)
+        lat2, lon2 = radians(element_lat), radians(element_lon)
+        a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        distance = 6371 * 2 * atan2(sqrt(a), sqrt(1 - a))
+        if distance * 1000 > radius:
+            continue
+        therapists.append(therapist(element.get('tags', {}), element_lat, element_lon, distance))
+    therapists.sort(key=lambda x: x['distance'])
+    return therapists[:20], len(therapists)
+
+
+def new_ranking(app, elements, lat, lon, radius):
+    nearest, count = app.nearest_elements(elements, lat, lon, radius)
+    return [therapist(element.get('tags', {}), element_lat, element_lon, distance)
+            for element, element_lat, element_lon, distance in nearest], count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--elements', type=int, default=10000)
+    parser.add_argument('--radius', type=int, default=20000, help='metres')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = load_app()
+    elements = synthetic_elements(args.elements)
+    lat, lon = 52.5, 13.4
+
+    old_time, (old_results, old_count) = timed(lambda: old_ranking(elements, lat, lon, args.radius), args.repeat)
+    new_time, (new_results, new_count) = timed(lambda: new_ranking(app, elements, lat, lon, args.radius), args.repeat)
+    assert old_count == new_count, (old_count, new_count)
+    assert [t['distance'] for t in old_results] == [t['distance'] for t in new_results]
+
+    print(f'{args.elements:,} elements, {new_count:,} within {args.radius} m')
+    print(f'original loop:      {old_time * 1000:7.2f} ms')
+    print(f'nearest_elements(): {new_time * 1000:7.2f} ms ({old_time / new_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
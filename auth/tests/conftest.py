@@ -0,0 +1,58 @@
+"""Shared fixtures. app.py reads its configuration from the environment at
+import time, so the test environment is set up before it is imported."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix='mindcare-tests-')
+
+os.environ.update({
+    'DATABASE_URI': 'sqlite:///' + os.path.join(TEST_DIR, 'app.db'),
+    'SESSION_STORE': 'cookie',
+    'BCRYPT_ROUNDS': '4',
+    'PASSWORD_HASH_WORKERS': '0',
+    'GEOCODE_CACHE_PATH': os.path.join(TEST_DIR, 'geocode_cache.db'),
+    'FACILITY_INDEX_PATH': os.path.join(TEST_DIR, 'facilities.db'),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as mindcare  # noqa: E402
+
+
+@pytest.fixture
+def app_module():
+    return mindcare
+
+
+@pytest.fixture
+def fresh_db(app_module):
+    """Empty database. Ids restart from 1, so the per-process caches keyed
+    by user id are emptied too. No app context stays pushed: requests from
+    the test client must each get their own, as they would in production."""
+    with app_module.app.app_context():
+        app_module.db.drop_all()
+        app_module.db.create_all()
+    app_module.identity_cache.entries.clear()
+    app_module.mood_aggregates.users.clear()
+
+
+@pytest.fixture
+def engine(app_module, fresh_db):
+    with app_module.app.app_context():
+        return app_module.db.engine
+
+
+@pytest.fixture
+def client(app_module, fresh_db):
+    return app_module.app.test_client()
+
+
+def register_and_login(client, email='nina@example.com', password='secret'):
+    client.post('/register', data={
+        'username': email.split('@')[0], 'email': email, 'password': password,
+        'name': 'Nina', 'age': '30', 'gender': 'female', 'residence': 'Oslo',
+        'field': 'Design'
+    })
+    client.post('/login', data={'email': email, 'password': password})
@@ -0,0 +1,110 @@
+"""The analysis cache: identical (normalized) texts hit, the byte bound
+evicts least recently used entries first, and /analyze_text goes through it."""
+import pytest
+
+from conftest import register_and_login
+
+TEXTS = ['I feel calm and grateful today', 'Work has me stressed and anxious',
+         'A long walk in the rain with friends', 'Tired, hopeless and overwhelmed']
+
+
+@pytest.fixture
+def analyzed(app_module, monkeypatch):
+    """Texts passed to analyze_entry_text(), i.e. cache misses that did the work"""
+    monkeypatch.setattr(app_module, 'sentiment_analyzer', None)
+    analyze = app_module.analyze_entry_text
+    calls = []
+
+    def counting(text):
+        calls.append(text)
+        return analyze(text)
+
+    monkeypatch.setattr(app_module, 'analyze_entry_text', counting)
+    return calls
+
+
+def entry_sizes(app_module, texts):
+    cache = app_module.AnalysisCache()
+    for text in texts:
+        cache.analyze(text)
+    return [size for _, size in cache.entries.values()]
+
+
+def test_identical_text_is_analyzed_once(app_module, analyzed):
+    cache = app_module.AnalysisCache()
+    first = cache.analyze(TEXTS[0])
+    assert cache.analyze(TEXTS[0]) is first
+    assert first == app_module.analyze_entry_text(TEXTS[0])
+    assert analyzed == [TEXTS[0]] * 2  # the cache's miss and the comparison above
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_case_and_surrounding_whitespace_share_an_entry(app_module, analyzed):
+    cache = app_module.AnalysisCache()
+    cache.analyze(TEXTS[1])
+    cache.analyze('  ' + TEXTS[1].upper() + '\n')
+    assert cache.counters['hits'] == 1
+    cache.analyze(TEXTS[1] + ' really')
+    assert cache.counters['misses'] == 2
+    assert len(analyzed) == 2
+
+
+def test_analyzer_version_is_part_of_the_key(app_module, analyzed, monkeypatch):
+    cache = app_module.AnalysisCache()
+    cache.analyze(TEXTS[0])
+    monkeypatch.setattr(app_module, 'ANALYZER_VERSION', app_module.ANALYZER_VERSION + '-next')
+    cache.analyze(TEXTS[0])
+    assert cache.counters['misses'] == 2
+    assert cache.counters.get('hits', 0) == 0
+
+
+def test_byte_bound_evicts_least_recently_used(app_module, analyzed):
+    sizes = entry_sizes(app_module, TEXTS)
+    cache = app_module.AnalysisCache(max_bytes=sum(sizes[:3]))
+    for text in TEXTS[:3]:
+        cache.analyze(text)
+    assert cache.bytes == sum(sizes[:3])
+    assert 'evictions' not in cache.counters
+
+    cache.analyze(TEXTS[0])  # now the most recently used
+    cache.analyze(TEXTS[3])
+    assert cache.counters['evictions'] >= 1
+    assert cache.bytes <= cache.max_bytes
+    assert cache.bytes == sum(size for _, size in cache.entries.values())
+    kept = list(cache.entries)
+    assert kept[-2:] == [app_module.analysis_key(TEXTS[0]), app_module.analysis_key(TEXTS[3])]
+    assert app_module.analysis_key(TEXTS[1]) not in kept
+
+    del analyzed[:]
+    cache.analyze(TEXTS[1])
+    assert analyzed == [TEXTS[1]]
+
+
+def test_entry_larger_than_the_bound_is_not_cached(app_module, analyzed):
+    cache = app_module.AnalysisCache(max_bytes=entry_sizes(app_module, TEXTS[:1])[0] - 1)
+    assert cache.analyze(TEXTS[0]) == app_module.analyze_entry_text(TEXTS[0])
+    assert cache.entries == {} and cache.bytes == 0
+    cache.analyze(TEXTS[0])
+    assert cache.counters['misses'] == 2
+
+
+def test_clear_resets_size_but_keeps_counters(app_module, analyzed):
+    cache = app_module.AnalysisCache()
+    for text in TEXTS:
+        cache.analyze(text)
+    cache.clear()
+    stats = cache.stats()
+    assert (stats['size'], stats['bytes'], stats['misses']) == (0, 0, 4)
+
+
+def test_analyze_text_route_uses_the_cache(app_module, client, analyzed, monkeypatch):
+    monkeypatch.setattr(app_module, 'analysis_cache', app_module.AnalysisCache())
+    register_and_login(client)
+    for text in (TEXTS[2], TEXTS[2].lower(), TEXTS[3]):
+        response = client.post('/analyze_text', json={'text': text})
+        assert response.status_code == 200
+    stats = client.get('/analyze_text/cache_stats').get_json()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
+    assert analyzed == [TEXTS[2], TEXTS[3]]
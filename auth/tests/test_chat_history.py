@@ -0,0 +1,78 @@
+"""Write-behind chat history: database outages and rows the database rejects"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+
+class Outage:
+    """Fails every chat_message insert while `down` is set"""
+
+    def __init__(self):
+        self.down = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.down and statement.startswith('INSERT INTO chat_message'):
+            raise OperationalError(statement, parameters, Exception('database is unavailable'))
+
+
+@pytest.fixture
+def outage(engine):
+    listener = Outage()
+    event.listen(engine, 'before_cursor_execute', listener)
+    yield listener
+    event.remove(engine, 'before_cursor_execute', listener)
+
+
+@pytest.fixture
+def history(app_module, fresh_db):
+    return app_module.ChatHistory(capacity=50, max_rooms=10, flush_interval=2, flush_size=1000,
+                                  max_pending=1000)
+
+
+def payload(message, username='nina'):
+    return {'username': username, 'message': message, 'timestamp': datetime.utcnow().isoformat()}
+
+
+def stored(app_module):
+    with app_module.app.app_context():
+        return [row.message for row in app_module.ChatMessage.query.order_by(app_module.ChatMessage.id)]
+
+
+def test_messages_survive_an_outage(app_module, history, outage):
+    outage.down = True
+    for i in range(5):
+        history.add('lobby', payload(f'm{i}'))
+    for _ in range(10):
+        assert history.flush() == 0
+    assert len(history.pending) == 5
+    assert history.counters['failed'] == 0
+
+    history.add('lobby', payload('m5'))
+    outage.down = False
+    assert history.flush() == 6
+    assert stored(app_module) == [f'm{i}' for i in range(6)]
+    assert history.pending == []
+
+
+def test_outage_queue_is_bounded_by_max_pending(app_module, history, outage):
+    history.max_pending = 3
+    outage.down = True
+    for i in range(5):
+        history.add('lobby', payload(f'm{i}'))
+        history.flush()
+    outage.down = False
+    history.flush()
+    assert stored(app_module) == ['m2', 'm3', 'm4']
+    assert history.counters['dropped'] == 2
+
+
+def test_a_rejected_row_does_not_hold_up_the_rest(app_module, history):
+    history.add('lobby', payload('before'))
+    history.add('lobby', payload('bad', username=None))
+    history.add('lobby', payload('after'))
+    assert history.flush() == 2
+    assert stored(app_module) == ['before', 'after']
+    assert history.counters['failed'] == 1
+    assert history.pending == []
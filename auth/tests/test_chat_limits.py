@@ -0,0 +1,139 @@
+"""Inbound chat limits and the outbound queue cap. The outbound tests run
+the app behind a real server in this process, so they go through the
+python-engineio / python-socketio emit path that OutboundLimiter hooks."""
+import json
+import threading
+import time
+
+import pytest
+import requests
+from werkzeug.serving import make_server
+
+socketio = pytest.importorskip('socketio')
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_bucket_allows_a_burst_then_refuses(app_module):
+    buckets = app_module.TokenBuckets(rate=0.001, burst=3)
+    assert [buckets.allow('a') for _ in range(4)] == [True, True, True, False]
+    # Keys don't share tokens
+    assert buckets.allow('b')
+
+
+def test_bucket_refills_at_its_rate_up_to_the_burst(app_module):
+    buckets = app_module.TokenBuckets(rate=10, burst=2)
+    assert buckets.allow('a') and buckets.allow('a')
+    assert not buckets.allow('a')
+    time.sleep(0.15)  # 1.5 tokens
+    assert buckets.allow('a')
+    assert not buckets.allow('a')
+    time.sleep(0.5)  # capped at the burst of 2
+    assert buckets.allow('a') and buckets.allow('a')
+    assert not buckets.allow('a')
+
+
+def test_bucket_evicts_least_recently_used_keys(app_module):
+    buckets = app_module.TokenBuckets(rate=0.001, burst=1, max_keys=2)
+    assert buckets.allow('a') and buckets.allow('b')
+    assert buckets.allow('c')  # evicts 'a'
+    assert list(buckets.buckets) == ['b', 'c']
+    assert buckets.allow('a')  # a fresh, full bucket
+    buckets.discard('c')
+    assert buckets.allow('c')
+
+
+def test_chat_limits_reasons_and_counters(app_module):
+    limits = app_module.ChatLimits(max_length=10, sid_rate=0.001, sid_burst=2, room_rate=0.001, room_burst=3)
+    assert limits.check('s1', 'r', 'x' * 11) == 'too_long'
+    assert limits.check('s1', 'r', 'hi') is None
+    assert limits.check('s1', 'r', 'hi') is None
+    assert limits.check('s1', 'r', 'hi') == 'rate_limited'
+    assert limits.check('s2', 'r', 'hi') is None
+    assert limits.check('s3', 'r', 'hi') == 'room_busy'
+    assert limits.check('s3', 'other', 'hi') is None
+    limits.forget('s1')
+    assert limits.check('s1', 'other', 'hi') is None
+    assert dict(limits.counters) == {'too_long': 1, 'rate_limited': 1, 'room_busy': 1}
+
+
+@pytest.fixture
+def server(app_module, fresh_db, monkeypatch):
+    """The app on a real threaded server; yields its base URL"""
+    monkeypatch.setattr(app_module.outbound_limiter, 'max_queue', 5)
+    monkeypatch.setattr(app_module.outbound_limiter, 'counters', {'outbound_dropped': 0,
+                                                                  'slow_consumers_disconnected': 0})
+    http = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    thread = threading.Thread(target=http.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{http.server_port}'
+    http.shutdown()
+
+
+class StalledClient:
+    """A polling client that joins a room and then never polls again, so
+    everything sent to it piles up in its server-side queue"""
+
+    def __init__(self, base, room):
+        self.url = base + '/socket.io/?EIO=4&transport=polling'
+        handshake = requests.get(self.url).text
+        self.sid = json.loads(handshake[handshake.index('{'):])['sid']
+        self.url += '&sid=' + self.sid
+        self.post('40')
+        self.post('42' + json.dumps(['join', {'room': room, 'username': 'stalled'}]))
+
+    def post(self, body):
+        assert requests.post(self.url, data=body).ok
+
+    def poll_status(self):
+        return requests.get(self.url, timeout=5).status_code
+
+
+def broadcast(app_module, room, count):
+    for i in range(count):
+        app_module.socketio.emit('message', {'username': 'server', 'message': f'm{i}'}, to=room)
+        time.sleep(0.02)
+
+
+def test_stalled_client_is_cut_off_and_others_keep_receiving(app_module, server):
+    eio = app_module.socketio.server.eio
+    stalled = StalledClient(server, 'busy')
+    healthy = socketio.Client()
+    received = []
+    healthy.on('message', lambda data: received.append(data['message']))
+    healthy.connect(server, transports=['polling'])
+    try:
+        healthy.emit('join', {'room': 'busy', 'username': 'healthy'})
+        assert wait_for(lambda: app_module.presence.count('busy') == 2)
+
+        broadcast(app_module, 'busy', 20)
+        counters = app_module.outbound_limiter.counters
+        assert wait_for(lambda: stalled.sid not in eio.sockets)
+        assert counters['slow_consumers_disconnected'] == 1
+        assert counters['outbound_dropped'] >= 1
+        assert stalled.poll_status() == 400
+        assert wait_for(lambda: len(received) == 20)
+        assert received == [f'm{i}' for i in range(20)]
+    finally:
+        healthy.disconnect()
+
+
+def test_drop_policy_keeps_the_stalled_client(app_module, server, monkeypatch):
+    monkeypatch.setattr(app_module.outbound_limiter, 'policy', 'drop')
+    eio = app_module.socketio.server.eio
+    stalled = StalledClient(server, 'quiet')
+    assert wait_for(lambda: app_module.presence.count('quiet') == 1)
+
+    broadcast(app_module, 'quiet', 20)
+    counters = app_module.outbound_limiter.counters
+    assert counters['slow_consumers_disconnected'] == 0
+    assert counters['outbound_dropped'] >= 10
+    assert eio.sockets[stalled.sid].queue.qsize() <= 5
+    assert stalled.poll_status() == 200
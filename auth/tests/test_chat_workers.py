@@ -0,0 +1,121 @@
+"""Acceptance test for multi-worker chat: two server processes share the
+sqlite:/// message queue and presence store, and clients connected to
+different workers must see each other's joins, messages and user counts."""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+socketio = pytest.importorskip('socketio')
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = (
+    'import sys; sys.path.insert(0, sys.argv[1]); import app; '
+    'app.socketio.run(app.app, host="127.0.0.1", port=int(sys.argv[2]), '
+    'allow_unsafe_werkzeug=True, log_output=False)'
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def server_is_up(port):
+    try:
+        return requests.get(f'http://127.0.0.1:{port}/socket.io/?EIO=4&transport=polling', timeout=1).ok
+    except requests.RequestException:
+        return False
+
+
+@pytest.fixture
+def workers(tmp_path):
+    env = dict(
+        os.environ,
+        DATABASE_URI='sqlite:///' + str(tmp_path / 'app.db'),
+        SESSION_STORE='cookie',
+        SOCKETIO_ASYNC_MODE='threading',
+        SOCKETIO_MESSAGE_QUEUE='sqlite:///' + str(tmp_path / 'queue.db'),
+        GEOCODE_CACHE_PATH=str(tmp_path / 'geocode_cache.db'),
+        FACILITY_INDEX_PATH=str(tmp_path / 'facilities.db'),
+    )
+    env.pop('CHAT_PRESENCE_URL', None)
+    ports = [free_port(), free_port()]
+    processes = []
+    try:
+        # One at a time, so only the first worker creates the fresh schema
+        for i, port in enumerate(ports):
+            with open(tmp_path / f'worker{i}.log', 'w') as log:
+                processes.append(subprocess.Popen(
+                    [sys.executable, '-c', SERVER, AUTH_DIR, str(port)],
+                    cwd=AUTH_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+                ))
+            assert wait_for(lambda: server_is_up(port), timeout=30), f'worker on {port} did not start'
+        yield ports
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class ChatClient:
+    def __init__(self, port):
+        self.events = []
+        self.sio = socketio.Client()
+        for name in ('user_joined', 'user_left', 'user_count', 'message'):
+            self.sio.on(name, self._recorder(name))
+        self.sio.connect(f'http://127.0.0.1:{port}', transports=['polling'])
+
+    def _recorder(self, name):
+        return lambda data: self.events.append((name, data))
+
+    def received(self, name):
+        return [data for event, data in self.events if event == name]
+
+    def messages(self):
+        return [(data['username'], data['message']) for data in self.received('message')]
+
+
+def test_clients_on_different_workers_share_a_room(workers):
+    alice = ChatClient(workers[0])
+    bob = ChatClient(workers[1])
+    try:
+        alice.sio.emit('join', {'room': 'r1', 'username': 'alice'})
+        assert wait_for(lambda: alice.received('user_count') == [1])
+
+        bob.sio.emit('join', {'room': 'r1', 'username': 'bob'})
+        assert wait_for(lambda: bob.received('user_count') == [2])
+        assert wait_for(lambda: alice.received('user_joined') == [{'username': 'bob', 'user_count': 2}])
+
+        alice.sio.emit('message', {'room': 'r1', 'message': 'hi from alice'})
+        bob.sio.emit('message', {'room': 'r1', 'message': 'hi from bob'})
+        expected = {('alice', 'hi from alice'), ('bob', 'hi from bob')}
+        for client in (alice, bob):
+            assert wait_for(lambda: set(client.messages()) == expected), client.events
+            assert len(client.messages()) == 2
+
+        bob.sio.disconnect()
+        assert wait_for(lambda: alice.received('user_left') == [{'username': 'bob', 'user_count': 1}])
+        assert wait_for(lambda: alice.received('user_count')[-1:] == [1])
+    finally:
+        for client in (alice, bob):
+            if client.sio.connected:
+                client.sio.disconnect()
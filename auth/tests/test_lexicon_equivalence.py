@@ -0,0 +1,157 @@
+"""The lexicon scan must classify exactly like the keyword loops it replaced.
+The reference functions below are the original implementations, kept
+verbatim; the corpus is fixed by its seed."""
+import random
+
+import pytest
+
+
+def reference_sentiment(text):
+    text_lower = text.lower()
+
+    positive_words = ['happy', 'joy', 'joyful', 'great', 'excellent', 'wonderful', 'amazing', 'good',
+                     'blessed', 'grateful', 'love', 'loving', 'excited', 'pleased', 'delighted',
+                     'content', 'peaceful', 'calm', 'relaxed', 'fantastic', 'awesome', 'brilliant',
+                     'perfect', 'beautiful', 'lovely', 'cheerful', 'optimistic', 'hopeful', 'proud']
+
+    negative_words = ['sad', 'angry', 'terrible', 'horrible', 'awful', 'depressed', 'depression',
+                     'anxious', 'anxiety', 'worried', 'worry', 'stressed', 'stress', 'upset',
+                     'frustrated', 'frustration', 'overwhelmed', 'hopeless', 'afraid', 'fearful',
+                     'panic', 'exhausted', 'tired', 'bad', 'worst', 'miserable', 'lonely', 'alone',
+                     'crying', 'hurt', 'pain', 'suffering', 'scared', 'fear', 'nervous', 'down',
+                     'unhappy', 'disappointed', 'failure', 'failed', 'worthless', 'helpless']
+
+    negations = ['not', 'no', 'never', 'neither', "n't", 'hardly', 'barely', 'cannot', "can't",
+                 "won't", "wouldn't", "shouldn't", "couldn't", "don't", "doesn't", "didn't"]
+
+    words = text_lower.split()
+
+    positive_score = 0
+    negative_score = 0
+
+    for i, word in enumerate(words):
+        has_negation = i > 0 and any(neg in words[i-1] for neg in negations)
+
+        if any(pos_word in word for pos_word in positive_words):
+            if has_negation:
+                negative_score += 2
+            else:
+                positive_score += 1
+
+        if any(neg_word in word for neg_word in negative_words):
+            if has_negation:
+                positive_score += 0.5
+            else:
+                negative_score += 1
+
+    negation_phrases = ['not feeling good', 'not feeling well', 'not doing well', 'not okay',
+                       'not fine', 'not great', 'not happy', 'not feeling happy', 'feeling down',
+                       'feel bad', 'feeling bad', 'not good', 'not well', "don't feel okay"]
+    for phrase in negation_phrases:
+        if phrase in text_lower:
+            negative_score += 2
+
+    if negative_score > positive_score:
+        return 'NEG'
+    elif positive_score > negative_score:
+        return 'POS'
+    else:
+        return 'NEU'
+
+
+def reference_stress(text):
+    stress_indicators = {
+        'high': ['anxiety', 'panic', 'overwhelmed', 'depressed', 'depression', 'stressed',
+                'worried', 'worry', 'fear', 'terrible', 'horrible', 'awful', 'sad', 'angry',
+                'upset', 'exhausted', 'hopeless', 'crying', 'suffering', 'miserable',
+                'desperate', 'scared', 'help me', 'can\'t cope', 'breakdown', 'crisis',
+                'suicidal', 'worthless', 'pain', 'hurt', 'alone', 'isolated', 'failing'],
+        'moderate': ['concerned', 'uneasy', 'nervous', 'tired', 'frustrated', 'uncertain',
+                    'busy', 'confused', 'bothered', 'unsure', 'annoyed', 'restless',
+                    'uncomfortable', 'difficult', 'challenging', 'tough', 'hard', 'struggle'],
+        'low': ['calm', 'happy', 'peaceful', 'relaxed', 'good', 'great', 'blessed', 'grateful',
+                'content', 'joy', 'joyful', 'excited', 'pleased', 'delighted', 'wonderful',
+                'amazing', 'fantastic', 'excellent', 'perfect', 'beautiful', 'cheerful']
+    }
+
+    text_lower = text.lower()
+    words = text_lower.split()
+
+    if len(words) == 0:
+        return 'Low'
+
+    distress_phrases = ['not feeling good', 'not feeling well', 'not okay', 'not fine',
+                       'feeling bad', 'feeling down', 'not doing well', 'feel terrible',
+                       'feel awful', 'feel sad', 'feel depressed']
+
+    negation_boost = sum(2 for phrase in distress_phrases if phrase in text_lower)
+
+    high_count = sum(1 for word in words if any(indicator in word for indicator in stress_indicators['high']))
+    moderate_count = sum(1 for word in words if any(indicator in word for indicator in stress_indicators['moderate']))
+    low_count = sum(1 for word in words if any(indicator in word for indicator in stress_indicators['low']))
+
+    high_count += negation_boost
+
+    total_score = (high_count * 3) + (moderate_count * 1.5) - (low_count * 2)
+    normalized_score = total_score / len(words)
+
+    if high_count >= 2 or normalized_score > 0.4:
+        return 'High'
+    elif high_count >= 1 or moderate_count >= 2 or normalized_score > 0.15:
+        return 'Moderate'
+    elif low_count >= 1 and high_count == 0:
+        return 'Low'
+    elif high_count == 0 and moderate_count == 0 and low_count == 0:
+        return 'Moderate'
+    else:
+        return 'Moderate'
+
+
+VOCAB = (
+    "i am not happy feeling down today unhappy know nothing can't cope help me stressed stress "
+    "great good goodness calm calmly don't feel okay not okay not fine not feeling good well doing sad "
+    "terribly awful pain painful alone lonely tired hard harder busy content contented joyful joy love "
+    "hopeless hopeful won't didn't never neither barely the a and work family friends NOT Happy! sad, "
+    "feel bad feeling bad feel depressed not feeling happy worries anxiety panic overwhelmed failure "
+    "painfully unhappiness Sadness NOTHING no-one couldn't hardly shouldn't cannot"
+).split()
+
+EDGE_CASES = [
+    '', '   ', '\n\t', 'not feeling good', "I don't feel okay", 'feel sad and feel awful',
+    'not happy', 'not sad', 'NOT HAPPY AT ALL', "can't cope", 'help me', 'happy' * 50,
+    'unhappy but hopeful', 'nothing is fine, not fine', 'feeling\tbad', 'x' * 200 + 'sad',
+]
+
+
+def build_corpus(size=5000, seed=20240601):
+    rng = random.Random(seed)
+    corpus = list(EDGE_CASES)
+    for _ in range(size):
+        n = rng.randint(1, 40)
+        corpus.append(rng.choice([' ', '  ', '\n']).join(rng.choice(VOCAB) for _ in range(n)))
+    return corpus
+
+
+CORPUS = build_corpus()
+
+
+def test_single_text_path_matches_reference(app_module):
+    for text in CORPUS:
+        scan = app_module.scan_lexicon(text)
+        assert app_module.perform_basic_sentiment_analysis(text, scan) == reference_sentiment(text), text
+        assert app_module.calculate_stress_level(text, scan) == reference_stress(text), text
+
+
+def test_unscanned_calls_match_reference(app_module):
+    for text in CORPUS[:500]:
+        assert app_module.perform_basic_sentiment_analysis(text) == reference_sentiment(text), text
+        assert app_module.calculate_stress_level(text) == reference_stress(text), text
+
+
+@pytest.mark.parametrize('max_tokens', [None, 7])
+def test_batch_path_matches_reference(app_module, max_tokens):
+    results = app_module.analyze_texts(CORPUS, max_tokens=max_tokens)
+    assert len(results) == len(CORPUS)
+    for text, result in zip(CORPUS, results):
+        assert result['sentiment'] == reference_sentiment(text), text
+        assert result['stress_level'] == reference_stress(text), text
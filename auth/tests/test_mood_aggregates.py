@@ -0,0 +1,190 @@
+"""Cached mood aggregates: insights must match the per-request computation
+they replaced, cache hits must not read the user's entries, and writes from
+other workers must be picked up."""
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from conftest import register_and_login
+
+NOW = datetime.utcnow()
+
+
+def reference_insights(entries, start_date):
+    """get_progress_data's insights before the cache: entries are
+    (date_created, mood, energy, sleep, stress)"""
+    entries = sorted(entry for entry in entries if entry[0] >= start_date)
+    if not entries:
+        return {'averages': {'mood': 0, 'energy': 0, 'sleep': 0, 'stress': 0},
+                'trend': 'none', 'total_entries': 0, 'streak': 0}
+    recent = entries[-7:]
+    streak = 1
+    newest_first = entries[::-1]
+    for current, previous in zip(newest_first, newest_first[1:]):
+        if (current[0].date() - previous[0].date()).days != 1:
+            break
+        streak += 1
+    return {
+        'averages': {
+            name: round(sum(entry[i] for entry in entries) / len(entries), 1)
+            for i, name in enumerate(['mood', 'energy', 'sleep', 'stress'], 1)
+        },
+        'trend': 'improving' if recent[-1][1] > recent[0][1] else 'declining',
+        'total_entries': len(entries),
+        'streak': streak
+    }
+
+
+def add_entries(app_module, user_id, entries):
+    """Insert MoodEntry rows the way another worker would: directly, with
+    the version bump, leaving this worker's cache alone"""
+    with app_module.app.app_context():
+        for date_created, mood, energy, sleep, stress in entries:
+            app_module.db.session.add(app_module.MoodEntry(
+                user_id=user_id, date_created=date_created, mood_score=mood, energy_level=energy,
+                sleep_quality=sleep, stress_level=stress
+            ))
+        app_module.mood_aggregates.bump(user_id)
+        app_module.db.session.commit()
+
+
+def insights(app_module, user_id, days):
+    with app_module.app.app_context():
+        return app_module.mood_aggregates.insights(user_id, NOW - timedelta(days=days))
+
+
+@pytest.fixture
+def user_id(app_module, client):
+    register_and_login(client)
+    return 1
+
+
+def test_insights_match_reference(app_module, user_id):
+    rng = random.Random(3)
+    entries = []
+    day = NOW - timedelta(days=120)
+    while day < NOW:
+        entries.append((day + timedelta(minutes=rng.randrange(600)),) + tuple(rng.randint(1, 10) for _ in range(4)))
+        # Mostly daily, with gaps and same-day repeats
+        day += timedelta(days=rng.choice([0, 1, 1, 1, 2, 5]))
+    add_entries(app_module, user_id, entries)
+    for days in (1, 3, 7, 30, 90, 365):
+        assert insights(app_module, user_id, days) == reference_insights(entries, NOW - timedelta(days=days))
+
+
+def test_streak_counts_consecutive_days_up_to_the_newest(app_module, user_id):
+    entries = [(NOW - timedelta(days=days), 5, 5, 5, 5) for days in (0, 1, 2, 3, 5, 6)]
+    add_entries(app_module, user_id, entries)
+    assert insights(app_module, user_id, 30)['streak'] == 4
+    # The window caps the streak
+    assert insights(app_module, user_id, 1.5)['streak'] == 2
+    add_entries(app_module, user_id, [(NOW - timedelta(days=4), 5, 5, 5, 5)])
+    assert insights(app_module, user_id, 30)['streak'] == 7
+
+
+def test_second_entry_on_a_day_ends_the_streak_as_before(app_module, user_id):
+    entries = [(NOW - timedelta(days=days), 5, 5, 5, 5) for days in (0, 1, 1, 2, 3)]
+    add_entries(app_module, user_id, entries)
+    assert insights(app_module, user_id, 30) == reference_insights(entries, NOW - timedelta(days=30))
+    assert insights(app_module, user_id, 30)['streak'] == 2
+
+
+def test_routes_keep_the_cache_in_step(app_module, client, user_id):
+    for mood in (3, 6, 8):
+        client.post('/progress_tracker', data={'mood_score': mood, 'energy_level': 5,
+                                               'sleep_quality': 5, 'stress_level': 5})
+    data = client.get('/progress_tracker/data').get_json()
+    assert data['insights']['total_entries'] == 3
+    assert data['insights']['averages']['mood'] == 5.7
+
+    client.post('/progress_tracker/delete/1')
+    client.post('/progress_tracker', data={'mood_score': 1, 'energy_level': 5,
+                                           'sleep_quality': 5, 'stress_level': 5})
+    data = client.get('/progress_tracker/data').get_json()
+    assert data['insights']['total_entries'] == 3
+    assert data['insights']['averages']['mood'] == 5.0
+    assert client.post('/progress_tracker/data/verify').get_json()['consistent']
+
+
+def test_cache_hit_reads_only_the_version(app_module, engine, user_id):
+    add_entries(app_module, user_id, [(NOW - timedelta(days=days, hours=1), 5, 5, 5, 5) for days in range(50)])
+    insights(app_module, user_id, 30)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    thread = threading.get_ident()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        assert insights(app_module, user_id, 30)['total_entries'] == 30
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert len(statements) == 1, statements
+    assert 'mood_entry' not in statements[0]
+
+
+def test_write_by_another_worker_is_picked_up(app_module, user_id):
+    add_entries(app_module, user_id, [(NOW - timedelta(days=1), 4, 5, 5, 5)])
+    assert insights(app_module, user_id, 30)['total_entries'] == 1
+    add_entries(app_module, user_id, [(NOW, 8, 5, 5, 5)])
+    result = insights(app_module, user_id, 30)
+    assert result['total_entries'] == 2
+    assert result['averages']['mood'] == 6.0
+
+
+def test_delete_by_another_worker_is_picked_up(app_module, user_id):
+    add_entries(app_module, user_id, [(NOW - timedelta(days=1), 4, 5, 5, 5), (NOW, 8, 5, 5, 5)])
+    assert insights(app_module, user_id, 30)['total_entries'] == 2
+    with app_module.app.app_context():
+        app_module.MoodEntry.query.filter_by(id=2).delete()
+        app_module.mood_aggregates.bump(user_id)
+        app_module.db.session.commit()
+    assert insights(app_module, user_id, 30)['total_entries'] == 1
+
+
+def test_verify_reports_and_repairs_drift(app_module, user_id):
+    add_entries(app_module, user_id, [(NOW - timedelta(days=days), 5, 5, 5, 5) for days in range(3)])
+    with app_module.app.app_context():
+        assert app_module.mood_aggregates.verify(user_id)['consistent']
+        # Corrupt the cached copy without changing its version
+        cached = app_module.mood_aggregates.users[user_id]
+        cached.remove(cached.keys[-1][1], cached.keys[-1][0])
+        report = app_module.mood_aggregates.verify(user_id)
+        assert not report['consistent']
+        assert report['cached']['count'] == 2
+        assert report['rebuilt']['count'] == 3
+        assert app_module.mood_aggregates.verify(user_id)['consistent']
+    assert insights(app_module, user_id, 30)['total_entries'] == 3
+
+
+def test_adding_an_entry_twice_counts_it_once(app_module):
+    class Entry:
+        id = 7
+        date_created = NOW
+        mood_score, energy_level, sleep_quality, stress_level = 6, 5, 4, 3
+
+    aggregates = app_module.UserMoodAggregates([])
+    aggregates.add(Entry)
+    aggregates.add(Entry)
+    assert aggregates.summary()['count'] == 1
+    assert aggregates.summary()['sums'] == [6, 5, 4, 3]
+
+
+def test_write_that_skips_a_version_drops_the_cached_copy(app_module, user_id):
+    add_entries(app_module, user_id, [(NOW, 5, 5, 5, 5)])
+    insights(app_module, user_id, 30)
+    version = app_module.mood_aggregates.users[user_id].version
+
+    class Entry:
+        id = 99
+        date_created = NOW
+        mood_score, energy_level, sleep_quality, stress_level = 1, 1, 1, 1
+
+    Entry.user_id = user_id
+    app_module.mood_aggregates.add(Entry, version + 2)
+    assert user_id not in app_module.mood_aggregates.users
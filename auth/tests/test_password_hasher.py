@@ -0,0 +1,62 @@
+"""The password hashing pool's worker processes must not outlive the app,
+however it exits."""
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Hashes once, prints the pool worker's pid, then waits to be signalled
+APP = (
+    'import os, sys, time; sys.path.insert(0, sys.argv[1]); import app; '
+    'assert app.password_hasher.verify("pw", app.password_hasher.hash("pw")); '
+    'print("worker", app.password_hasher._run(os.getpid), flush=True); time.sleep(60)'
+)
+
+
+def worker_pid(stdout):
+    # app.py prints its own start-up notes first
+    for line in stdout:
+        if line.startswith('worker '):
+            return int(line.split()[1])
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize('signum', [signal.SIGTERM, signal.SIGKILL])
+def test_workers_exit_with_the_app(tmp_path, signum):
+    env = dict(
+        os.environ,
+        DATABASE_URI='sqlite:///' + str(tmp_path / 'app.db'),
+        SESSION_STORE='cookie',
+        BCRYPT_ROUNDS='4',
+        PASSWORD_HASH_WORKERS='1',
+        GEOCODE_CACHE_PATH=str(tmp_path / 'geocode_cache.db'),
+        FACILITY_INDEX_PATH=str(tmp_path / 'facilities.db'),
+    )
+    process = subprocess.Popen([sys.executable, '-c', APP, AUTH_DIR], cwd=AUTH_DIR, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                               start_new_session=True)
+    try:
+        worker = worker_pid(process.stdout)
+        assert worker != process.pid and is_running(worker)
+        process.send_signal(signum)
+        process.wait(10)
+        deadline = time.monotonic() + 10
+        while is_running(worker) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not is_running(worker)
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,79 @@
+"""Shared chat presence: entries left behind by workers that died or were
+restarted must not count towards room sizes."""
+import sqlite3
+import time
+
+import pytest
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'presence.db')
+
+
+def test_dead_worker_entries_expire(app_module, path):
+    alive = app_module.SQLitePresence(path, worker_id='alive', ttl=0.2)
+    dead = app_module.SQLitePresence(path, worker_id='dead', ttl=0.2)
+    alive.heartbeat()
+    dead.heartbeat()
+    assert dead.join('lobby', 'sid-1', 'ann') == 1
+    assert dead.join('private', 'sid-1', 'ann') == 1
+    assert alive.join('lobby', 'sid-2', 'bob') == 2
+
+    # 'dead' stops beating; 'alive' keeps going
+    time.sleep(0.3)
+    alive.heartbeat()
+
+    assert alive.count('lobby') == 1
+    assert alive.count('private') == 0
+    assert alive.username('lobby', 'sid-1') == 'Anonymous'
+    assert alive.username('lobby', 'sid-2') == 'bob'
+    assert alive.join('lobby', 'sid-3', 'cy') == 2
+
+
+def test_live_workers_are_kept(app_module, path):
+    first = app_module.SQLitePresence(path, worker_id='first', ttl=60)
+    second = app_module.SQLitePresence(path, worker_id='second', ttl=60)
+    first.heartbeat()
+    first.join('lobby', 'sid-1', 'ann')
+    second.heartbeat()
+    assert second.count('lobby') == 1
+
+
+def test_restarted_worker_clears_its_old_entries(app_module, path):
+    before = app_module.SQLitePresence(path, worker_id='web-1', ttl=60)
+    before.heartbeat()
+    before.join('lobby', 'sid-1', 'ann')
+    before.join('lobby', 'sid-2', 'bob')
+
+    after = app_module.SQLitePresence(path, worker_id='web-1', ttl=60)
+    after.ensure_heartbeat()
+    assert after.count('lobby') == 0
+    assert after.join('lobby', 'sid-3', 'cy') == 1
+
+
+def test_close_removes_own_entries_only(app_module, path):
+    leaving = app_module.SQLitePresence(path, worker_id='leaving', ttl=60)
+    staying = app_module.SQLitePresence(path, worker_id='staying', ttl=60)
+    leaving.ensure_heartbeat()
+    staying.heartbeat()
+    leaving.join('lobby', 'sid-1', 'ann')
+    staying.join('lobby', 'sid-2', 'bob')
+    leaving.close()
+    assert staying.count('lobby') == 1
+    assert staying.username('lobby', 'sid-2') == 'bob'
+
+
+def test_entries_without_an_owner_are_dropped(app_module, path):
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE chat_presence (room TEXT NOT NULL, sid TEXT NOT NULL, '
+                       'username TEXT NOT NULL, PRIMARY KEY (room, sid))')
+    connection.execute('CREATE TABLE chat_room (room TEXT PRIMARY KEY, user_count INTEGER NOT NULL)')
+    connection.execute("INSERT INTO chat_presence VALUES ('lobby', 'sid-1', 'ann')")
+    connection.execute("INSERT INTO chat_room VALUES ('lobby', 1)")
+    connection.commit()
+    connection.close()
+
+    presence = app_module.SQLitePresence(path, worker_id='web-1', ttl=60)
+    assert presence.count('lobby') == 0
+    assert presence.join('lobby', 'sid-2', 'bob') == 1
@@ -0,0 +1,85 @@
+"""Statements per request on the endpoints that load the current user.
+Counted with a before_cursor_execute listener on the engine; only
+statements from the request's own thread count, so the background
+backfill and flushers don't skew the numbers."""
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from conftest import register_and_login
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.thread = threading.get_ident()
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self)
+
+
+@pytest.fixture
+def logged_in(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.VoiceFlowAgent, 'interact', staticmethod(lambda user_id, data: 'ok'))
+    register_and_login(client)
+    client.post('/gratitude', data={'content': 'grateful for tea', 'mood': 'happy'})
+    client.post('/progress_tracker', data={'mood_score': 5, 'energy_level': 6, 'sleep_quality': 7, 'stress_level': 3})
+    # Warm the identity cache and the mood aggregates
+    client.get('/dashboard')
+    client.get('/progress_tracker/data')
+    return client
+
+
+def count_queries(engine, client, method, url, json=None, data=None):
+    with QueryCounter(engine) as counter:
+        response = client.open(url, method=method, json=json, data=data)
+    assert response.status_code in (200, 302), (url, response.status_code)
+    return len(counter.statements), counter.statements
+
+
+@pytest.mark.parametrize('method, url, body, budget', [
+    ('GET', '/dashboard', None, 1),
+    ('GET', '/gratitude', None, 1),
+    ('GET', '/gratitude?format=json', None, 2),
+    ('GET', '/progress_tracker', None, 0),
+    ('GET', '/progress_tracker/data', None, 3),
+    ('POST', '/mood_journal/interact', {'message': 'hello'}, 0),
+    ('POST', '/analyze_text', {'text': 'I feel good today'}, 0),
+])
+def test_read_endpoints_stay_within_budget(engine, logged_in, method, url, body, budget):
+    count, statements = count_queries(engine, logged_in, method, url, json=body)
+    assert count <= budget, statements
+
+
+def test_gratitude_edit_and_delete_stay_within_budget(engine, logged_in):
+    count, statements = count_queries(engine, logged_in, 'POST', '/gratitude/edit/1',
+                                      json={'content': 'grateful for coffee', 'mood': 'calm'})
+    assert count <= 3, statements
+    count, statements = count_queries(engine, logged_in, 'POST', '/gratitude/delete/1')
+    assert count <= 2, statements
+
+
+def test_user_row_is_loaded_once_per_request(app_module, engine, logged_in):
+    app_module.identity_cache.invalidate(1)
+    count, statements = count_queries(engine, logged_in, 'GET', '/dashboard')
+    assert sum('FROM user' in statement for statement in statements) == 1, statements
+    count, statements = count_queries(engine, logged_in, 'GET', '/dashboard')
+    assert not any('FROM user' in statement for statement in statements), statements
+
+
+def test_renamed_user_is_not_served_stale(app_module, logged_in):
+    with app_module.app.app_context():
+        user = app_module.db.session.get(app_module.User, 1)
+        user.name = 'Nora'
+        app_module.db.session.commit()
+    assert b'Nora' in logged_in.get('/dashboard').data
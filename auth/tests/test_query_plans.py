@@ -0,0 +1,90 @@
+"""The per-user history, mood-filter and daily-bucket queries must be served
+by the ix_*_user_id_* indexes. The SQL is captured from the real endpoints
+and run through EXPLAIN QUERY PLAN on SQLite."""
+import re
+
+import pytest
+from sqlalchemy import event
+
+from conftest import register_and_login
+
+
+@pytest.fixture
+def seeded_client(client):
+    register_and_login(client)
+    for i in range(30):
+        client.post('/gratitude', data={'content': f'thankful for day {i}', 'mood': 'happy' if i % 2 else 'calm'})
+        client.post('/progress_tracker', data={'mood_score': 5, 'energy_level': 6, 'sleep_quality': 7, 'stress_level': 3})
+    return client
+
+
+def query_plans(engine, client, url):
+    """(sql, plan lines) for every per-user SELECT the request issued"""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'user_id = ?' in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert response.status_code == 200, url
+
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+            plans.append((' '.join(statement.split()), [row[-1] for row in rows]))
+    return response, plans
+
+
+def plan_for(plans, pattern):
+    matching = [plan for sql, plan in plans if re.search(pattern, sql)]
+    assert matching, f'no query matching {pattern!r}'
+    return matching[0]
+
+
+def uses_index(plan, table, index):
+    return any(re.match(rf'SEARCH {table} USING (COVERING )?INDEX {index} ', line) for line in plan)
+
+
+def test_no_per_user_query_scans_a_table(engine, seeded_client):
+    for url in ('/gratitude?format=json', '/gratitude?format=json&mood=happy',
+                '/progress_tracker/data', '/gratitude/trends'):
+        _, plans = query_plans(engine, seeded_client, url)
+        for sql, plan in plans:
+            assert not any(line.startswith('SCAN') for line in plan), (sql, plan)
+
+
+def test_history_pages_use_user_date_index(engine, seeded_client):
+    response, plans = query_plans(engine, seeded_client, '/gratitude?format=json&limit=5')
+    page = plan_for(plans, r'ORDER BY gratitude_entry\.date_created DESC')
+    assert uses_index(page, 'gratitude_entry', 'ix_gratitude_entry_user_id_date_created'), page
+    assert 'USE TEMP B-TREE FOR ORDER BY' not in page
+
+    cursor = response.get_json()['next_cursor']
+    _, plans = query_plans(engine, seeded_client, f'/gratitude?format=json&limit=5&cursor={cursor}')
+    page = plan_for(plans, r'ORDER BY gratitude_entry\.date_created DESC')
+    assert uses_index(page, 'gratitude_entry', 'ix_gratitude_entry_user_id_date_created'), page
+    assert 'USE TEMP B-TREE FOR ORDER BY' not in page
+
+
+def test_mood_filter_uses_user_mood_date_index(engine, seeded_client):
+    _, plans = query_plans(engine, seeded_client, '/gratitude?format=json&mood=happy&limit=5')
+    page = plan_for(plans, r'ORDER BY gratitude_entry\.date_created DESC')
+    assert uses_index(page, 'gratitude_entry', 'ix_gratitude_entry_user_id_mood_date_created'), page
+    assert 'USE TEMP B-TREE FOR ORDER BY' not in page
+
+
+@pytest.mark.parametrize('url, table', [
+    ('/progress_tracker/data', 'mood_entry'),
+    ('/gratitude/trends', 'gratitude_entry'),
+])
+def test_daily_buckets_use_user_date_index(engine, seeded_client, url, table):
+    _, plans = query_plans(engine, seeded_client, url)
+    buckets = plan_for(plans, rf'^SELECT date\({table}\.date_created\)')
+    assert uses_index(buckets, table, f'ix_{table}_user_id_date_created'), buckets
+    assert any('date_created>?' in line for line in buckets), buckets
@@ -0,0 +1,152 @@
+"""The gratitude sentiment backfill: interrupted runs resume where they
+stopped, rows written during a run are handled, and stored results match
+the single-text analyzer."""
+import random
+from datetime import datetime
+
+import pytest
+
+WORDS = ['grateful', 'happy', 'tired', 'anxious', 'calm', 'walk', 'family', 'sad', 'hopeless',
+         'excited', 'work', 'stressed', 'coffee', 'friends', 'overwhelmed', 'rain']
+ANALYSIS_COLUMNS = ['sentiment', 'stress_level', 'positive_score', 'negative_score', 'stress_score',
+                    'analyzer_version']
+EDITED_AT = datetime(2024, 1, 2, 3, 4, 5)
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def entries(app_module, client):
+    """60 gratitude entries stored without analysis, as before the upgrade"""
+    rng = random.Random(5)
+    client.post('/register', data={
+        'username': 'nina', 'email': 'nina@example.com', 'password': 'secret', 'name': 'Nina',
+        'age': '30', 'gender': 'female', 'residence': 'Oslo', 'field': 'Design'
+    })
+    rows = [{'user_id': 1, 'content': ' '.join(rng.choices(WORDS, k=rng.randint(1, 12))),
+             'date_created': datetime(2024, 1, 1), 'last_modified': EDITED_AT}
+            for _ in range(60)]
+    insert(app_module, rows)
+    return rows
+
+
+def insert(app_module, rows):
+    with app_module.app.app_context():
+        app_module.db.session.execute(app_module.GratitudeEntry.__table__.insert(), rows)
+        app_module.db.session.commit()
+
+
+def stored(app_module):
+    with app_module.app.app_context():
+        return {entry.id: entry for entry in app_module.GratitudeEntry.query.order_by(app_module.GratitudeEntry.id)}
+
+
+def run(app_module, backfill):
+    with app_module.app.app_context():
+        return backfill.run()
+
+
+def assert_matches_single_text_analyzer(app_module, rows):
+    for entry in rows.values():
+        expected = app_module.analyze_entry_text(entry.content)
+        assert {column: getattr(entry, column) for column in ANALYSIS_COLUMNS} == expected, entry.content
+        assert entry.last_modified == EDITED_AT
+
+
+def interrupt_after(backfill, batches):
+    """Make backfill.run() stop with Interrupted after `batches` batches"""
+    run_batch = backfill.run_batch
+    done = []
+
+    def interrupting(after_id=0):
+        if len(done) == batches:
+            raise Interrupted()
+        done.append(after_id)
+        return run_batch(after_id)
+
+    backfill.run_batch = interrupting
+
+
+def test_backfill_matches_single_text_analyzer(app_module, entries):
+    backfill = app_module.SentimentBackfill(batch_size=16, pause=0)
+    assert run(app_module, backfill) == 60
+    assert backfill.counters['batches'] == 4
+    assert_matches_single_text_analyzer(app_module, stored(app_module))
+    # Nothing left to do
+    assert run(app_module, backfill) == 0
+
+
+def test_interrupted_run_resumes_where_it_stopped(app_module, entries):
+    backfill = app_module.SentimentBackfill(batch_size=16, pause=0)
+    interrupt_after(backfill, 2)
+    with pytest.raises(Interrupted):
+        run(app_module, backfill)
+    rows = stored(app_module)
+    assert sum(entry.analyzer_version is not None for entry in rows.values()) == 32
+
+    # A fresh instance, as after a restart: only the remaining rows are analyzed
+    resumed = app_module.SentimentBackfill(batch_size=16, pause=0)
+    assert run(app_module, resumed) == 28
+    assert resumed.counters['batches'] == 2
+    assert_matches_single_text_analyzer(app_module, stored(app_module))
+
+
+def test_rows_written_during_a_run(app_module, entries):
+    backfill = app_module.SentimentBackfill(batch_size=16, pause=0)
+    write = backfill._write
+    writes = []
+
+    def concurrent_writes(updates):
+        if not writes:
+            with app_module.app.app_context():
+                # A user edits entry 2 after the batch was read: the edit's
+                # analysis must win over the backfill's
+                edited = app_module.db.session.get(app_module.GratitudeEntry, 2)
+                edited.content = 'hopeless and overwhelmed'
+                edited.analyze()
+                app_module.db.session.commit()
+            # An import lands behind the backfill's position
+            insert(app_module, [{'user_id': 1, 'content': 'grateful for the rain', 'last_modified': EDITED_AT,
+                                 'date_created': datetime(2024, 1, 1)}])
+        writes.append(len(updates))
+        return write(updates)
+
+    backfill._write = concurrent_writes
+    run(app_module, backfill)
+    rows = stored(app_module)
+    assert len(rows) == 61
+    assert all(entry.analyzer_version == app_module.ANALYZER_VERSION for entry in rows.values())
+    assert {column: getattr(rows[2], column) for column in ANALYSIS_COLUMNS} == \
+        app_module.analyze_entry_text('hopeless and overwhelmed')
+    assert rows[61].content == 'grateful for the rain'
+    del rows[2]
+    assert_matches_single_text_analyzer(app_module, rows)
+
+
+def test_failing_row_is_marked_and_skipped(app_module, entries, monkeypatch):
+    bad = entries[4]['content']
+
+    def scan_batch(texts, max_tokens=None):
+        raise RuntimeError('batch analyzer down')
+
+    analyze = app_module.analyze_entry_text
+
+    def analyze_one(text):
+        if text == bad:
+            raise ValueError('cannot analyze')
+        return analyze(text)
+
+    monkeypatch.setattr(app_module, 'iter_scan_texts', scan_batch)
+    monkeypatch.setattr(app_module, 'analyze_entry_text', analyze_one)
+    backfill = app_module.SentimentBackfill(batch_size=16, pause=0)
+    assert run(app_module, backfill) == 60 - sum(entry['content'] == bad for entry in entries)
+    rows = stored(app_module)
+    failed = [entry for entry in rows.values() if entry.content == bad]
+    assert failed and all(entry.analyzer_version == app_module.ANALYZER_VERSION + '!failed' for entry in failed)
+    assert backfill.counters['failed'] == len(failed)
+
+    # Marked rows are not retried under the same version
+    monkeypatch.setattr(app_module, 'analyze_entry_text', analyze)
+    assert run(app_module, backfill) == 0
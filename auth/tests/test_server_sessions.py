@@ -0,0 +1,132 @@
+"""Server-side sessions on the SQLite store. The rest of the suite runs with
+SESSION_STORE=cookie, so these tests swap the session interface in."""
+import time
+
+import pytest
+
+from conftest import register_and_login
+
+
+def make_interface(app_module, path, **options):
+    settings = dict(ttl=3600, local_ttl=5, local_max_entries=100, reap_interval=3600)
+    settings.update(options)
+    return app_module.ServerSessionInterface(app_module.SQLiteSessionStore(path), **settings)
+
+
+@pytest.fixture
+def sessions(app_module, fresh_db, tmp_path, monkeypatch):
+    interface = make_interface(app_module, str(tmp_path / 'sessions.db'))
+    monkeypatch.setattr(app_module.app, 'session_interface', interface)
+    return interface
+
+
+def stored(interface):
+    """{sid: (user_id, expires_at)} straight from the table"""
+    rows = interface.store._connect().execute('SELECT sid, user_id, expires_at FROM sessions')
+    return {sid: (user_id, expires_at) for sid, user_id, expires_at in rows}
+
+
+def session_id(app_module, client):
+    cookie = client.get_cookie('session')
+    return app_module.Signer(app_module.app.secret_key, salt='mindcare-session').unsign(cookie.value).decode()
+
+
+def test_login_keeps_the_data_server_side(app_module, client, sessions):
+    register_and_login(client)
+    sid = session_id(app_module, client)
+    assert 'nina@example.com' not in client.get_cookie('session').value
+    assert stored(sessions)[sid][0] == 1
+    assert client.get('/dashboard').status_code == 200
+
+
+def test_login_regenerates_the_session_id(app_module, client, sessions):
+    with client.session_transaction() as session:
+        session['next'] = '/dashboard'
+    planted = session_id(app_module, client)
+    assert planted in stored(sessions)
+
+    register_and_login(client)
+    sid = session_id(app_module, client)
+    assert sid != planted
+    assert planted not in stored(sessions)
+    assert sid in stored(sessions)
+
+
+def test_logout_deletes_the_session(app_module, client, sessions):
+    register_and_login(client)
+    sid = session_id(app_module, client)
+    client.get('/logout')
+    assert sid not in stored(sessions)
+    assert client.get_cookie('session') is None
+    assert client.get('/dashboard').status_code == 302
+
+
+def test_revoke_user_logs_out_every_session(app_module, client, sessions):
+    other = app_module.app.test_client()
+    register_and_login(client)
+    register_and_login(other)
+    bystander = app_module.app.test_client()
+    register_and_login(bystander, email='omar@example.com')
+    assert client.get('/dashboard').status_code == 200
+
+    assert sessions.revoke_user(1) == 2
+    assert client.get('/dashboard').status_code == 302
+    assert other.get('/dashboard').status_code == 302
+    assert bystander.get('/dashboard').status_code == 200
+
+
+def test_revoke_sessions_command(app_module, client, sessions):
+    register_and_login(client)
+    result = app_module.app.test_cli_runner().invoke(args=['revoke-sessions', 'nina@example.com'])
+    assert result.exit_code == 0, result.output
+    assert 'Revoked 1 session(s)' in result.output
+    assert client.get('/dashboard').status_code == 302
+
+
+def test_tampered_cookie_gets_a_fresh_session(app_module, client, sessions):
+    register_and_login(client)
+    client.set_cookie('session', client.get_cookie('session').value + 'x')
+    assert client.get('/dashboard').status_code == 302
+    assert sessions.counters['bad_cookies'] == 1
+
+
+def test_expired_sessions_are_refused_and_reaped(app_module, client, tmp_path, monkeypatch):
+    interface = make_interface(app_module, str(tmp_path / 'sessions.db'), ttl=0.5, local_ttl=0)
+    monkeypatch.setattr(app_module.app, 'session_interface', interface)
+    register_and_login(client)
+    expired = session_id(app_module, client)
+    time.sleep(0.6)
+    assert client.get('/dashboard').status_code == 302
+
+    fresh = app_module.app.test_client()
+    interface.ttl = 3600
+    register_and_login(fresh)
+    assert interface.store.reap() == 1
+    assert list(stored(interface)) == [session_id(app_module, fresh)]
+    assert expired not in stored(interface)
+
+
+def test_reaper_runs_in_the_background(app_module, client, tmp_path, monkeypatch):
+    interface = make_interface(app_module, str(tmp_path / 'sessions.db'), ttl=0.2, reap_interval=0.1)
+    monkeypatch.setattr(app_module.app, 'session_interface', interface)
+    register_and_login(client)
+    assert stored(interface)
+    deadline = time.monotonic() + 5
+    while stored(interface) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert stored(interface) == {}
+    assert interface.counters['reaped'] >= 1
+
+
+def test_expiry_slides_once_half_the_lifetime_is_used(app_module, client, tmp_path, monkeypatch):
+    interface = make_interface(app_module, str(tmp_path / 'sessions.db'), ttl=2, local_ttl=0)
+    monkeypatch.setattr(app_module.app, 'session_interface', interface)
+    register_and_login(client)
+    sid = session_id(app_module, client)
+    first = stored(interface)[sid][1]
+
+    client.get('/dashboard')
+    assert stored(interface)[sid][1] == first  # still in the first half
+    time.sleep(1.1)
+    assert client.get('/dashboard').status_code == 200
+    assert stored(interface)[sid][1] > first + 1
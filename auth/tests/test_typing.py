@@ -0,0 +1,91 @@
+"""Typing indicators: debounced snapshots, expiry, and room validation in
+the socket handlers"""
+import time
+
+import pytest
+
+
+@pytest.fixture
+def tracker(app_module):
+    return app_module.TypingTracker(interval=0.5, ttl=0.2)
+
+
+def test_keystrokes_produce_one_snapshot(tracker):
+    for _ in range(20):
+        tracker.start('lobby', 'sid-1', 'ann')
+    assert tracker.collect() == [('lobby', ['ann'])]
+    tracker.start('lobby', 'sid-1', 'ann')
+    assert tracker.collect() == []
+    assert tracker.counters['events'] == 21
+    assert tracker.counters['snapshots'] == 1
+
+
+def test_snapshot_lists_each_typist_once_sorted(tracker):
+    tracker.start('lobby', 'sid-2', 'bob')
+    tracker.start('lobby', 'sid-1', 'ann')
+    tracker.start('lobby', 'sid-3', 'ann')  # same name, second tab
+    tracker.start('other', 'sid-4', 'cy')
+    assert sorted(tracker.collect()) == [('lobby', ['ann', 'bob']), ('other', ['cy'])]
+
+
+def test_start_and_stop_within_an_interval_cancel_out(tracker):
+    tracker.start('lobby', 'sid-1', 'ann')
+    tracker.stop('lobby', 'sid-1')
+    assert tracker.collect() == []
+    assert 'lobby' not in tracker.typing
+
+
+def test_stop_is_reported_once(tracker):
+    tracker.start('lobby', 'sid-1', 'ann')
+    tracker.collect()
+    tracker.stop('lobby', 'sid-1')
+    tracker.stop('lobby', 'sid-1')
+    assert tracker.collect() == [('lobby', [])]
+    assert tracker.collect() == []
+
+
+def test_typists_expire_after_ttl(tracker):
+    tracker.start('lobby', 'sid-1', 'ann')
+    tracker.start('lobby', 'sid-2', 'bob')
+    assert tracker.collect() == [('lobby', ['ann', 'bob'])]
+    time.sleep(0.1)
+    tracker.start('lobby', 'sid-2', 'bob')  # refreshes bob's expiry only
+    time.sleep(0.15)
+    assert tracker.collect() == [('lobby', ['bob'])]
+    time.sleep(0.25)
+    assert tracker.collect() == [('lobby', [])]
+    assert tracker.typing == {}
+
+
+def test_rename_marks_the_room_changed(tracker):
+    tracker.start('lobby', 'sid-1', 'ann')
+    tracker.collect()
+    tracker.start('lobby', 'sid-1', 'anne')
+    assert tracker.collect() == [('lobby', ['anne'])]
+
+
+@pytest.fixture
+def typing_client(app_module, monkeypatch):
+    tracker = app_module.TypingTracker(interval=60, ttl=60)
+    monkeypatch.setattr(app_module, 'typing_tracker', tracker)
+    client = app_module.socketio.test_client(app_module.app)
+    yield client, tracker
+    client.disconnect()
+
+
+def test_typing_uses_the_chat_name_rules(app_module, typing_client):
+    client, tracker = typing_client
+    client.emit('typing', {'room': '  lobby ', 'username': ' ann '})
+    client.emit('typing', {'room': 'x' * (app_module.CHAT_NAME_MAX_LENGTH + 1), 'username': 'bob'})
+    client.emit('typing', {'room': {'not': 'a name'}, 'username': 'cy'})
+    client.emit('typing', {'room': 'long-name', 'username': 'd' * 500})
+    assert set(tracker.typing) == {'lobby', 'peer-support', 'long-name'}
+    assert [username for username, _ in tracker.typing['lobby'].values()] == ['ann']
+    assert [username for username, _ in tracker.typing['peer-support'].values()] == ['cy']
+    assert [len(username) for username, _ in tracker.typing['long-name'].values()] == [
+        app_module.CHAT_NAME_MAX_LENGTH
+    ]
+
+    client.emit('stop_typing', {'room': ' lobby'})
+    client.emit('stop_typing', {'room': 'x' * (app_module.CHAT_NAME_MAX_LENGTH + 1)})
+    assert 'lobby' not in tracker.typing
@@ -0,0 +1,126 @@
+"""Concurrency tests for the video cache, with the YouTube HTTP layer stubbed"""
+import threading
+import time
+
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, video_id):
+        self.video_id = video_id
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'items': [{'id': {'videoId': self.video_id}, 'snippet': {'title': self.video_id}}]}
+
+
+class FakeYouTube:
+    """Counts upstream calls; while `gate` is clear every call blocks on it"""
+
+    def __init__(self):
+        self.calls = 0
+        self.video_id = 'v1'
+        self.gate = threading.Event()
+        self.gate.set()
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.calls += 1
+        assert self.gate.wait(10)
+        return FakeResponse(self.video_id)
+
+
+@pytest.fixture
+def youtube(app_module, monkeypatch):
+    fake = FakeYouTube()
+    monkeypatch.setattr(app_module.youtube_client, 'get', fake.get)
+    monkeypatch.setattr(app_module, 'video_cache', app_module.TTLCache(max_entries=16, ttl=900, stale_ttl=3600))
+    return fake
+
+
+def run_concurrently(count, target):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        results[i] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(15)
+    return results
+
+
+def video_ids(videos):
+    return [video['video_id'] for video in videos]
+
+
+def test_concurrent_misses_make_one_upstream_call(app_module, youtube):
+    youtube.gate.clear()
+    threading.Timer(0.3, youtube.gate.set).start()
+    results = run_concurrently(200, lambda: app_module.get_recommended_videos('Mental  Health tips'))
+
+    assert youtube.calls == 1
+    assert all(video_ids(result) == ['v1'] for result in results)
+    stats = app_module.video_cache.stats()
+    assert stats['misses'] == 1
+    assert stats['coalesced'] == 199
+
+
+def test_stale_value_served_while_refresh_is_in_flight(app_module, youtube):
+    assert video_ids(app_module.get_recommended_videos('sleep')) == ['v1']
+    app_module.video_cache.ttl = 0.05
+    time.sleep(0.1)
+
+    youtube.video_id = 'v2'
+    youtube.gate.clear()
+    try:
+        started = time.monotonic()
+        assert video_ids(app_module.get_recommended_videos('sleep')) == ['v1']
+        # Blocking and non-blocking callers alike get the stale value
+        # immediately instead of waiting on the refresh
+        results = run_concurrently(50, lambda: app_module.get_recommended_videos('sleep'))
+        assert video_ids(app_module.get_recommended_videos('sleep', block=False)) == ['v1']
+        assert time.monotonic() - started < 2
+        assert all(video_ids(result) == ['v1'] for result in results)
+        assert youtube.calls == 2
+    finally:
+        youtube.gate.set()
+
+    app_module.video_cache.ttl = 900
+    deadline = time.monotonic() + 5
+    while video_ids(app_module.get_recommended_videos('sleep')) != ['v2']:
+        assert time.monotonic() < deadline, 'refresh never landed'
+        time.sleep(0.01)
+    assert youtube.calls == 2
+
+
+def test_non_blocking_miss_loads_in_background(app_module, youtube):
+    youtube.gate.clear()
+    try:
+        assert app_module.get_recommended_videos('focus', block=False) is None
+        assert app_module.get_recommended_videos('focus', block=False) is None
+    finally:
+        youtube.gate.set()
+    assert video_ids(app_module.get_recommended_videos('focus')) == ['v1']
+    assert youtube.calls == 1
+
+
+def test_errors_are_not_cached(app_module, youtube, monkeypatch):
+    def down(url, **kwargs):
+        youtube.calls += 1
+        raise app_module.requests.exceptions.ConnectionError('down')
+
+    monkeypatch.setattr(app_module.youtube_client, 'get', down)
+    assert app_module.get_recommended_videos('calm') == []
+    assert app_module.get_recommended_videos('calm') == []
+    assert youtube.calls == 2
+
+    monkeypatch.setattr(app_module.youtube_client, 'get', youtube.get)
+    assert video_ids(app_module.get_recommended_videos('calm')) == ['v1']